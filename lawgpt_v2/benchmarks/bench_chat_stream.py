@@ -0,0 +1,206 @@
+# benchmarks/bench_chat_stream.py
+#
+# Сквозной нагрузочный тест POST /chat/stream: параллельные клиенты SSE против
+# приложения на локальных Postgres+pgvector и Redis (Redis Stack — для чекпоинтов).
+# Приложение запускается в этом же процессе (uvicorn). Ответы OpenAI и Tavily
+# один раз записываются в кассеты и дальше воспроизводятся (src/core/replay.py),
+# поэтому прогоны бесплатны и воспроизводимы.
+#
+#   cd lawgpt_v2
+#   # 1. Запись кассет: настоящие API, последовательно
+#   python -m benchmarks.bench_chat_stream --db-url postgresql+asyncpg://... --mode record --concurrency 1
+#   # 2. Прогоны по кассетам
+#   python -m benchmarks.bench_chat_stream --db-url postgresql+asyncpg://... --concurrency 1,8,32 --queries 200
+#
+# Метрики: время до первого события SSE (TTFE) и первого токена ответа (TTFT),
+# полное время ответа, задержка каждого узла графа (события node_end),
+# пропускная способность и память процесса. --json сохраняет результаты для
+# сравнения прогонов.
+
+import asyncio
+import json
+import resource
+import time
+from collections import defaultdict
+
+import httpx
+
+from benchmarks.common import (
+    benchmark_arg_parser, init_benchmark_db, print_table, reset_schema, seed_knowledge_base, summarize,
+)
+from src.core.config import settings
+from src.db.knowledge_base import KnowledgeBase
+
+OWNER_ID = 1
+
+# Типовые вопросы: попадают в разные ветви плана (правила, координатор, анализ)
+DEFAULT_QUERIES = (
+    "Что такое исковая давность?",
+    "Статья 333 ГК РФ: когда суд может снизить неустойку?",
+    "Последние изменения в трудовом законодательстве",
+    "Какая судебная практика по взысканию неустойки по договору поставки?",
+    "Проанализируй мои документы по договору аренды и найди риски для арендатора",
+    "Можно ли расторгнуть договор аренды досрочно, если арендодатель не делает ремонт?",
+    "Как оспорить увольнение по сокращению штата?",
+    "Какие сроки подачи апелляционной жалобы в арбитражном процессе?",
+)
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+
+
+def _peak_rss_mb() -> float:
+    # В Linux ru_maxrss — в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def chat(client: httpx.AsyncClient, path: str, token: str, query: str) -> dict:
+    """Один запрос: времена первого события, первого токена и узлов графа."""
+    started = time.perf_counter()
+    first_event = first_token = None
+    nodes = defaultdict(list)
+    async with client.stream(
+        "POST", path, json={"query": query, "timings": True}, headers={"Authorization": f"Bearer {token}"},
+    ) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            now = time.perf_counter()
+            first_event = first_event or now
+            event = json.loads(line[len("data: "):])
+            if event["type"] == "llm_chunk" and first_token is None:
+                first_token = now
+            elif event["type"] == "node_end":
+                nodes[event["node"]].append(event["duration_ms"])
+    finished = time.perf_counter()
+    return {
+        "ttfe": (first_event - started) * 1000 if first_event else None,
+        "ttft": (first_token - started) * 1000 if first_token else None,
+        "total": (finished - started) * 1000,
+        "nodes": nodes,
+    }
+
+
+async def run_level(client, path: str, token: str, queries: list[str], concurrency: int, requests: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    results, errors = [], []
+
+    async def one(i: int):
+        async with semaphore:
+            try:
+                results.append(await chat(client, path, token, queries[i % len(queries)]))
+            except (httpx.HTTPError, json.JSONDecodeError) as exc:
+                errors.append(repr(exc))
+
+    rss_before = _rss_mb()
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    wall = time.perf_counter() - started
+
+    nodes = defaultdict(list)
+    for result in results:
+        for node, durations in result["nodes"].items():
+            nodes[node].extend(durations)
+
+    def metric(name: str) -> dict | None:
+        samples = [result[name] for result in results if result[name] is not None]
+        return summarize(samples) if samples else None
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": len(errors),
+        "throughput_rps": len(results) / wall,
+        "ttfe": metric("ttfe"),
+        "ttft": metric("ttft"),
+        "total": metric("total"),
+        "nodes": {node: summarize(durations) for node, durations in sorted(nodes.items())},
+        "rss_mb": _rss_mb(),
+        "rss_growth_mb": _rss_mb() - rss_before,
+        "peak_rss_mb": _peak_rss_mb(),
+        "first_errors": errors[:3],
+    }
+
+
+def print_level(level: dict):
+    print(f"\nКонкурентность {level['concurrency']}: {level['requests']} запросов, ошибок {level['errors']}, "
+          f"{level['throughput_rps']:.2f} запр/с, RSS {level['rss_mb']:.0f} МБ "
+          f"(+{level['rss_growth_mb']:.0f}, пик {level['peak_rss_mb']:.0f})")
+    rows = [("TTFE", level["ttfe"]), ("TTFT", level["ttft"]), ("ответ целиком", level["total"])]
+    rows += [(f"узел {node}", stats) for node, stats in level["nodes"].items()]
+    print_table("Задержки", [(name, stats) for name, stats in rows if stats])
+    for error in level["first_errors"]:
+        print(f"  ошибка: {error}")
+
+
+async def main():
+    parser = benchmark_arg_parser("Сквозной нагрузочный тест /chat/stream")
+    parser.add_argument("--mode", choices=("record", "replay"), default="replay")
+    parser.add_argument("--cassettes", default=settings.REPLAY_CASSETTE_DIR)
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Множитель записанных задержек API")
+    parser.add_argument("--latency-ms", type=float, default=None, help="Фиксированная задержка API вместо записанной")
+    parser.add_argument("--concurrency", default="1,8,32", help="Уровни конкурентности через запятую")
+    parser.add_argument("--queries-file", help="Файл с вопросами, по одному в строке")
+    parser.add_argument("--rows", type=int, default=5000, help="Документов в базе знаний")
+    parser.add_argument("--path", default="/api/chat/stream")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--answer-cache", action="store_true", help="Не отключать семантический кэш ответов")
+    parser.add_argument("--json", help="Сохранить результаты в файл")
+    args = parser.parse_args()
+
+    # Клиенты LLM, эмбеддингов и поиска читают режим при импорте графа,
+    # поэтому настройки меняются до импорта приложения
+    settings.REPLAY_MODE = args.mode
+    settings.REPLAY_CASSETTE_DIR = args.cassettes
+    settings.REPLAY_LATENCY_SCALE = args.latency_scale
+    settings.REPLAY_LATENCY_MS = args.latency_ms
+    settings.ANSWER_CACHE_ENABLED = args.answer_cache
+    settings.DATABASE_URL = args.db_url or settings.DATABASE_URL
+    import uvicorn
+    from src.auth.security import create_access_token
+    from src.main import app
+
+    manager = init_benchmark_db(args.db_url)
+    await reset_schema(manager)
+    await seed_knowledge_base(manager, {OWNER_ID: args.rows}, KnowledgeBase.embedding.type.dim, seed=args.seed)
+    # Пул создаст заново приложение при запуске
+    await manager.close()
+
+    if args.queries_file:
+        with open(args.queries_file, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = list(DEFAULT_QUERIES)
+    token = create_access_token({"sub": f"bench_{OWNER_ID}"})
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        if serving.done():
+            serving.result()
+        await asyncio.sleep(0.05)
+
+    levels = []
+    try:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=None, limits=limits) as client:
+            for concurrency in (int(value) for value in args.concurrency.split(",")):
+                # При записи каждый вопрос задается один раз: повторы дали бы лишние строки кассеты
+                requests = len(queries) if args.mode == "record" else args.queries
+                level = await run_level(client, args.path, token, queries, concurrency, requests)
+                levels.append(level)
+                print_level(level)
+    finally:
+        server.should_exit = True
+        await serving
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"mode": args.mode, "queries": len(queries), "levels": levels}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
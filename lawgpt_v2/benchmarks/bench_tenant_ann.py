@@ -0,0 +1,83 @@
+# benchmarks/bench_tenant_ann.py
+#
+# Recall@10 и задержка векторного поиска для арендаторов разного размера:
+# глобальный HNSW без настройки, стратегия 'auto' и (опционально) та же
+# стратегия на HASH-секционированной таблице. Эталон — точный перебор.
+#
+#   cd lawgpt_v2
+#   python -m benchmarks.bench_tenant_ann --db-url postgresql+asyncpg://... \
+#       --tenants 200000,50000,10000,2000,300 --partitions 16
+
+import asyncio
+
+import numpy as np
+
+from benchmarks.common import (
+    benchmark_arg_parser, init_benchmark_db, random_unit_vectors, reset_schema,
+    seed_knowledge_base, summarize,
+)
+from src.core.config import settings
+from src.db.knowledge_base import KnowledgeBase
+from src.graph.tools.kb_search import _tenant_stats_cache, vector_search
+from src.utils.partition_knowledge_base import partition
+
+TOP_K = 10
+
+
+async def search_ids(manager, embedding, owner_id: int, strategy: str) -> tuple[list[int], float]:
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    async with manager.session() as session:
+        rows = await vector_search(session, "", embedding, owner_id, TOP_K, strategy=strategy)
+    return [row["id"] for row in rows], (loop.time() - started) * 1000
+
+
+async def run_strategies(
+    manager, tenants: dict[int, int], queries: list, strategies: list[tuple[str, str]],
+) -> list[tuple]:
+    results = []
+    for owner_id, size in tenants.items():
+        truth = [(await search_ids(manager, q, owner_id, "exact"))[0] for q in queries]
+        for label, strategy in strategies:
+            recalls, latencies = [], []
+            for query, expected in zip(queries, truth):
+                found, elapsed = await search_ids(manager, query, owner_id, strategy)
+                recalls.append(len(set(found) & set(expected)) / max(1, len(expected)))
+                latencies.append(elapsed)
+            results.append((size, label, sum(recalls) / len(recalls), summarize(latencies)))
+    return results
+
+
+async def main():
+    parser = benchmark_arg_parser("Recall и задержка ANN-поиска по арендаторам")
+    parser.add_argument("--tenants", default="100000,20000,5000,1000,200",
+                        help="Размеры арендаторов через запятую")
+    parser.add_argument("--partitions", type=int, default=0, help="Дополнительно проверить секционирование")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.tenants.split(",")]
+    tenants = {owner_id: size for owner_id, size in enumerate(sizes, start=1)}
+    dim = KnowledgeBase.embedding.type.dim
+    queries = [v.tolist() for v in random_unit_vectors(np.random.default_rng(args.seed + 1), args.queries, dim)]
+
+    manager = init_benchmark_db(args.db_url)
+    try:
+        await reset_schema(manager)
+        await seed_knowledge_base(manager, tenants, dim, seed=args.seed)
+
+        results = await run_strategies(manager, tenants, queries, [("global hnsw", "hnsw"), ("auto", "auto")])
+        if args.partitions:
+            await partition(args.partitions)
+            settings.KB_PARTITIONS = args.partitions
+            _tenant_stats_cache.clear()
+            results += await run_strategies(manager, tenants, queries, [(f"auto, {args.partitions} секций", "auto")])
+
+        print(f"\n{'строк':>8}  {'стратегия':<22}{'recall@10':>10}{'p50, мс':>10}{'p99, мс':>10}")
+        for size, label, recall, stats in sorted(results, key=lambda r: -r[0]):
+            print(f"{size:>8}  {label:<22}{recall:>10.3f}{stats['p50']:>10.2f}{stats['p99']:>10.2f}")
+    finally:
+        await manager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
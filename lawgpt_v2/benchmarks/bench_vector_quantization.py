@@ -0,0 +1,87 @@
+# benchmarks/bench_vector_quantization.py
+#
+# Recall@10, задержка и размер HNSW-индекса для вариантов KB_VECTOR_INDEX
+# (vector / halfvec / binary) при разном запасе кандидатов под уточнение по
+# полным векторам. Эталон — точный перебор. Случайные векторы — худший случай
+# для бинарного квантования: на реальных эмбеддингах recall заметно выше.
+#
+#   cd lawgpt_v2
+#   python -m benchmarks.bench_vector_quantization --db-url postgresql+asyncpg://... \
+#       --rows 200000 --oversample 1,4,10
+
+import asyncio
+
+import numpy as np
+from sqlalchemy import text
+
+from benchmarks.common import (
+    benchmark_arg_parser, init_benchmark_db, random_unit_vectors, reset_schema,
+    seed_knowledge_base, summarize,
+)
+from src.core.config import settings
+from src.db.knowledge_base import KnowledgeBase, VECTOR_INDEX_KINDS, embedding_index_sql
+from src.graph.tools.kb_search import vector_search
+
+OWNER_ID = 1
+TOP_K = 10
+
+
+async def build_index(manager, kind: str, dim: int) -> int:
+    """Пересобирает HNSW-индекс и возвращает его размер в байтах."""
+    async with manager.session() as session:
+        await session.execute(text("DROP INDEX IF EXISTS idx_knowledge_base_embedding"))
+        await session.execute(text(embedding_index_sql(kind, dim)))
+        await session.commit()
+        await session.execute(text("ANALYZE knowledge_base"))
+        return (await session.execute(text("SELECT pg_relation_size('idx_knowledge_base_embedding')"))).scalar_one()
+
+
+async def search_ids(manager, embedding, strategy: str) -> tuple[list[int], float]:
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    async with manager.session() as session:
+        rows = await vector_search(session, "", embedding, OWNER_ID, TOP_K, strategy=strategy)
+    return [row["id"] for row in rows], (loop.time() - started) * 1000
+
+
+async def main():
+    parser = benchmark_arg_parser("Recall и память квантованных HNSW-индексов")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--oversample", default="1,4,10", help="Значения KB_RERANK_OVERSAMPLE через запятую")
+    args = parser.parse_args()
+
+    dim = KnowledgeBase.embedding.type.dim
+    oversamples = [int(value) for value in args.oversample.split(",")]
+    queries = [v.tolist() for v in random_unit_vectors(np.random.default_rng(args.seed + 1), args.queries, dim)]
+
+    manager = init_benchmark_db(args.db_url)
+    try:
+        await reset_schema(manager)
+        await seed_knowledge_base(manager, {OWNER_ID: args.rows}, dim, seed=args.seed)
+        async with manager.session() as session:
+            heap = (await session.execute(text("SELECT pg_table_size('knowledge_base')"))).scalar_one()
+        truth = [(await search_ids(manager, q, "exact"))[0] for q in queries]
+
+        results = []
+        for kind in VECTOR_INDEX_KINDS:
+            index_bytes = await build_index(manager, kind, dim)
+            settings.KB_VECTOR_INDEX = kind
+            for oversample in oversamples if kind != "vector" else [1]:
+                settings.KB_RERANK_OVERSAMPLE = oversample
+                recalls, latencies = [], []
+                for query, expected in zip(queries, truth):
+                    found, elapsed = await search_ids(manager, query, "hnsw")
+                    recalls.append(len(set(found) & set(expected)) / max(1, len(expected)))
+                    latencies.append(elapsed)
+                results.append((kind, oversample, index_bytes, sum(recalls) / len(recalls), summarize(latencies)))
+
+        print(f"\n{args.rows} строк, {dim} измерений, таблица {heap / 2**20:.1f} МБ")
+        print(f"{'индекс':<10}{'запас':>7}{'индекс, МБ':>12}{'recall@10':>11}{'p50, мс':>10}{'p99, мс':>10}")
+        for kind, oversample, index_bytes, recall, stats in results:
+            print(f"{kind:<10}{oversample:>7}{index_bytes / 2**20:>12.1f}{recall:>11.3f}"
+                  f"{stats['p50']:>10.2f}{stats['p99']:>10.2f}")
+    finally:
+        await manager.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
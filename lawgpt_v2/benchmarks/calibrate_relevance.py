@@ -0,0 +1,78 @@
+# benchmarks/calibrate_relevance.py
+#
+# Подбор порогов RELEVANCE_ACCEPT / RELEVANCE_REJECT по размеченным результатам
+# поиска. Каждая строка JSONL — один поиск:
+#
+#   {"query": "...", "documents": [{"vector_similarity": 0.41, "fts_rank": 0.05}, ...], "label": "Relevant"}
+#
+# (documents — metadata найденных документов, label — ручная разметка или вердикт
+# LLM-оценщика). Пороги выбираются так, чтобы решения без LLM имели точность не
+# ниже --precision, а доля пограничных случаев (вызовов LLM) была минимальной.
+#
+#   cd lawgpt_v2
+#   python -m benchmarks.calibrate_relevance labeled.jsonl --precision 0.95
+
+import argparse
+import json
+
+from src.core.config import settings
+from src.graph.relevance import RELEVANT, retrieval_score
+
+
+def load_samples(path: str) -> list[tuple[float, bool]]:
+    with open(path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [(retrieval_score(row["documents"]), row["label"] == RELEVANT) for row in rows]
+
+
+def _accept_threshold(samples, precision: float) -> float:
+    """Наименьший порог, выше которого доля релевантных не ниже precision."""
+    best = 1.0 + 1e-9
+    for threshold in sorted({score for score, _ in samples}, reverse=True):
+        accepted = [relevant for score, relevant in samples if score >= threshold]
+        if sum(accepted) / len(accepted) >= precision:
+            best = threshold
+    return best
+
+
+def _reject_threshold(samples, precision: float) -> float:
+    """Наибольший порог, ниже которого доля нерелевантных не ниже precision."""
+    best = -1e-9
+    for threshold in sorted({score for score, _ in samples}):
+        rejected = [not relevant for score, relevant in samples if score <= threshold]
+        if sum(rejected) / len(rejected) >= precision:
+            best = threshold
+    return best
+
+
+def calibrate(samples, precision: float) -> dict:
+    accept = _accept_threshold(samples, precision)
+    reject = min(_reject_threshold(samples, precision), accept)
+    decided = [(score, relevant) for score, relevant in samples if score >= accept or score <= reject]
+    correct = sum((score >= accept) == relevant for score, relevant in decided)
+    return {
+        "accept": round(accept, 4),
+        "reject": round(reject, 4),
+        "local_share": len(decided) / len(samples),
+        "local_accuracy": correct / len(decided) if decided else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Калибровка порогов локальной оценки релевантности")
+    parser.add_argument("path", help="JSONL с размеченными результатами поиска")
+    parser.add_argument("--precision", type=float, default=0.95,
+                        help="Минимальная точность решений, принятых без LLM")
+    args = parser.parse_args()
+
+    samples = load_samples(args.path)
+    current = {"accept": settings.RELEVANCE_ACCEPT, "reject": settings.RELEVANCE_REJECT}
+    result = calibrate(samples, args.precision)
+    print(f"Поисков: {len(samples)}, релевантных: {sum(relevant for _, relevant in samples)}")
+    print(f"Текущие пороги: {current}")
+    print(f"RELEVANCE_ACCEPT={result['accept']} RELEVANCE_REJECT={result['reject']}")
+    print(f"Решено без LLM: {result['local_share']:.1%}, точность: {result['local_accuracy']}")
+
+
+if __name__ == "__main__":
+    main()
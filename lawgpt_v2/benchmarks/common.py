@@ -0,0 +1,127 @@
+# benchmarks/common.py
+
+import argparse
+import os
+import random
+import statistics
+import time
+
+import numpy as np
+from sqlalchemy import text
+
+from src.db.base import Base
+from src.db.session import SessionManager, session_manager
+from src.auth.models import User  # noqa: F401 — регистрирует таблицу users в metadata
+from src.db.knowledge_base import KnowledgeBase  # noqa: F401
+
+# Словарь для синтетических «юридических» текстов
+VOCABULARY = (
+    "договор аренда поставка неустойка истец ответчик суд решение кодекс статья "
+    "обязательство ущерб возмещение залог ипотека наследство завещание трудовой "
+    "увольнение компенсация налог штраф лицензия регистрация собственность сделка "
+    "недействительность исковая давность банкротство кредитор должник арбитраж "
+    "апелляция кассация доверенность представитель претензия расторжение оферта"
+).split()
+
+
+def benchmark_arg_parser(description: str) -> argparse.ArgumentParser:
+    """Общие аргументы бенчмарков. БД указывается явно: таблицы пересоздаются."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--db-url",
+        default=os.environ.get("BENCH_DATABASE_URL"),
+        help="URL локального Postgres+pgvector (или BENCH_DATABASE_URL). Данные в нем будут удалены!",
+    )
+    parser.add_argument("--queries", type=int, default=200, help="Количество запросов на стратегию")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser
+
+
+def init_benchmark_db(db_url: str | None) -> SessionManager:
+    if not db_url:
+        raise SystemExit("Укажите --db-url или BENCH_DATABASE_URL (локальная тестовая БД).")
+    # Инициализируется глобальный менеджер: его используют инструменты поиска
+    session_manager.init(db_url)
+    return session_manager
+
+
+def percentile(samples: list[float], q: float) -> float:
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples_ms: list[float]) -> dict:
+    return {
+        "p50": percentile(samples_ms, 50),
+        "p99": percentile(samples_ms, 99),
+        "mean": statistics.fmean(samples_ms),
+    }
+
+
+async def measure(coro_factory, iterations: int) -> list[float]:
+    """Последовательно выполняет корутины и возвращает задержки в миллисекундах."""
+    samples = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        await coro_factory(i)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def random_text(rng: random.Random, words: int = 60) -> str:
+    return " ".join(rng.choice(VOCABULARY) for _ in range(words))
+
+
+def random_unit_vectors(rng: np.random.Generator, count: int, dim: int) -> np.ndarray:
+    vectors = rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+async def reset_schema(manager: SessionManager):
+    """Пересоздает схему приложения в тестовой БД."""
+    async with manager._engine.begin() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+    # Кодек pgvector регистрируется при подключении, поэтому пул сбрасывается
+    # после создания расширения.
+    await manager._engine.dispose()
+    async with manager._engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def seed_knowledge_base(
+    manager: SessionManager, tenant_sizes: dict[int, int], dim: int, seed: int = 42, batch: int = 1000,
+):
+    """Создает пользователей и заполняет knowledge_base синтетическими документами."""
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    insert_sql = text("""
+        INSERT INTO knowledge_base (owner_id, source_type, content, metadata, embedding)
+        VALUES (:owner_id, 'synthetic', :content, '{}'::jsonb, :embedding)
+    """)
+    async with manager.session() as session:
+        for owner_id in tenant_sizes:
+            await session.execute(
+                text("INSERT INTO users (id, username, email, hashed_password) VALUES (:id, :u, :e, 'x')"),
+                {"id": owner_id, "u": f"bench_{owner_id}", "e": f"bench_{owner_id}@example.com"},
+            )
+        for owner_id, size in tenant_sizes.items():
+            for start in range(0, size, batch):
+                count = min(batch, size - start)
+                vectors = random_unit_vectors(np_rng, count, dim)
+                await session.execute(insert_sql, [
+                    {"owner_id": owner_id, "content": random_text(rng), "embedding": vector}
+                    for vector in vectors
+                ])
+        await session.commit()
+        await session.execute(text("ANALYZE knowledge_base"))
+        await session.commit()
+
+
+def print_table(title: str, rows: list[tuple[str, dict]]):
+    print(f"\n{title}")
+    print(f"{'стратегия':<24}{'p50, мс':>10}{'p99, мс':>10}{'mean, мс':>10}")
+    for name, stats in rows:
+        print(f"{name:<24}{stats['p50']:>10.2f}{stats['p99']:>10.2f}{stats['mean']:>10.2f}")
@@ -0,0 +1,86 @@
+# benchmarks/explain_fts.py
+#
+# Проверка плана полнотекстовой ветки до и после перехода на индексируемый
+# запрос: EXPLAIN (ANALYZE, FORMAT JSON) на синтетических данных. Завершается
+# с ненулевым кодом, если новый запрос не использует idx_knowledge_base_tsv.
+#
+#   cd lawgpt_v2
+#   python -m benchmarks.explain_fts --db-url postgresql+asyncpg://...
+
+import asyncio
+import json
+import sys
+
+from sqlalchemy import text
+
+from benchmarks.common import benchmark_arg_parser, init_benchmark_db, reset_schema, seed_knowledge_base
+from src.db.knowledge_base import KnowledgeBase
+from src.graph.tools.kb_search import _document_params, _fts_branch
+
+OWNER_ID = 1
+TSV_INDEX = "idx_knowledge_base_tsv"
+
+# Запрос до исправления: ранг считается для каждой строки арендатора
+BEFORE_SQL = """
+    SELECT id, ts_rank(content_tsv, plainto_tsquery(:query)) AS rank
+    FROM knowledge_base
+    WHERE owner_id = :user_id
+    ORDER BY rank DESC
+    LIMIT :limit
+"""
+
+
+def plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+async def explain(session, sql: str, params: dict) -> tuple[dict, float]:
+    result = await session.execute(text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}"), params)
+    raw = result.scalar()
+    explained = (json.loads(raw) if isinstance(raw, str) else raw)[0]
+    return explained["Plan"], explained["Execution Time"]
+
+
+def describe(title: str, plan: dict, execution_ms: float) -> set[str]:
+    indexes = {node["Index Name"] for node in plan_nodes(plan) if "Index Name" in node}
+    scanned = sum(node.get("Actual Rows", 0) for node in plan_nodes(plan) if "Scan" in node["Node Type"])
+    print(f"\n{title}: {execution_ms:.2f} мс, строк прочитано сканированиями: {scanned}")
+    for node in plan_nodes(plan):
+        print(f"  {node['Node Type']}{' on ' + node['Index Name'] if 'Index Name' in node else ''}")
+    return indexes
+
+
+async def main():
+    parser = benchmark_arg_parser("EXPLAIN полнотекстовой ветки до/после")
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--query", default="неустойка по договору поставки")
+    args = parser.parse_args()
+
+    manager = init_benchmark_db(args.db_url)
+    try:
+        await reset_schema(manager)
+        await seed_knowledge_base(manager, {OWNER_ID: args.rows}, KnowledgeBase.embedding.type.dim, seed=args.seed)
+
+        params = {**_document_params(args.query), "user_id": OWNER_ID, "limit": 10}
+        async with manager.session() as session:
+            before = describe("До", *await explain(session, BEFORE_SQL, params))
+            after = describe("После", *await explain(session, _fts_branch(), params))
+
+        failures = []
+        if TSV_INDEX in before:
+            failures.append(f"старый запрос неожиданно использует {TSV_INDEX}")
+        if TSV_INDEX not in after:
+            failures.append(f"новый запрос не использует {TSV_INDEX}")
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        if failures:
+            sys.exit(1)
+        print("\nOK: полнотекстовая ветка использует GIN-индекс")
+    finally:
+        await manager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,18 @@
+-- migrations/001_fts_generated_tsvector.sql
+--
+-- content_tsv становится генерируемым столбцом, который поддерживает сам Postgres.
+-- Конфигурация ('russian') должна совпадать с настройкой FTS_CONFIG.
+--
+--   psql "$DATABASE_URL" -f migrations/001_fts_generated_tsvector.sql
+
+BEGIN;
+
+DROP INDEX IF EXISTS idx_knowledge_base_tsv;
+ALTER TABLE knowledge_base DROP COLUMN IF EXISTS content_tsv;
+ALTER TABLE knowledge_base
+    ADD COLUMN content_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('russian'::regconfig, content)) STORED;
+CREATE INDEX idx_knowledge_base_tsv ON knowledge_base USING gin (content_tsv);
+ANALYZE knowledge_base;
+
+COMMIT;
@@ -0,0 +1,26 @@
+-- migrations/002_ingestion_jobs.sql
+--
+-- Таблица прогресса загрузки документов (src/db/ingestion_job.py).
+--
+--   psql "$DATABASE_URL" -f migrations/002_ingestion_jobs.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS ingestion_jobs (
+    id varchar(64) NOT NULL,
+    owner_id integer NOT NULL,
+    source_path text NOT NULL,
+    source_type varchar(100) NOT NULL,
+    status varchar(20) NOT NULL,
+    total_pages integer,
+    next_page integer NOT NULL,
+    chunks_ingested integer NOT NULL,
+    error text,
+    created_at timestamptz DEFAULT now(),
+    updated_at timestamptz DEFAULT now(),
+    CONSTRAINT pk_ingestion_jobs PRIMARY KEY (id),
+    CONSTRAINT fk_ingestion_jobs_owner_id_users FOREIGN KEY (owner_id) REFERENCES users (id)
+);
+CREATE INDEX IF NOT EXISTS ix_ingestion_jobs_owner_id ON ingestion_jobs (owner_id);
+
+COMMIT;
@@ -0,0 +1,57 @@
+-- migrations/003_content_hash_dedup.sql
+--
+-- Хэш фрагмента в knowledge_base, общее хранилище эмбеддингов и счетчики
+-- дедупликации в ingestion_jobs. Хэш совпадает с chunking.content_hash:
+-- SHA-256 текста в UTF-8. Существующие векторы переносятся в embedding_store
+-- под ключом модели, которой они были получены. Ключ — embedding_namespace:
+-- "<EMBEDDING_MODEL>:<EMBEDDING_DIMENSIONS>", а без dimensions — "<модель>:native".
+-- Для настроек по умолчанию (text-embedding-3-large, 1536):
+--
+--   psql "$DATABASE_URL" -v model=text-embedding-3-large:1536 \
+--       -f migrations/003_content_hash_dedup.sql
+
+BEGIN;
+
+ALTER TABLE knowledge_base ADD COLUMN IF NOT EXISTS content_hash varchar(64);
+
+-- Повторы внутри арендатора остаются без хэша, иначе уникальный индекс не построить
+UPDATE knowledge_base AS kb
+SET content_hash = first.content_hash
+FROM (
+    SELECT DISTINCT ON (owner_id, hash) id, hash AS content_hash
+    FROM (
+        SELECT id, owner_id, encode(sha256(convert_to(content, 'UTF8')), 'hex') AS hash
+        FROM knowledge_base
+    ) hashed
+    ORDER BY owner_id, hash, id
+) AS first
+WHERE kb.id = first.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_knowledge_base_owner_content_hash
+    ON knowledge_base (owner_id, content_hash);
+
+CREATE TABLE IF NOT EXISTS embedding_store (
+    model varchar(100) NOT NULL,
+    content_hash varchar(64) NOT NULL,
+    embedding vector(1536) NOT NULL,
+    created_at timestamptz DEFAULT now(),
+    CONSTRAINT pk_embedding_store PRIMARY KEY (model, content_hash)
+);
+
+INSERT INTO embedding_store (model, content_hash, embedding)
+SELECT DISTINCT ON (content_hash) :'model', content_hash, embedding
+FROM knowledge_base
+WHERE content_hash IS NOT NULL
+ORDER BY content_hash, id
+ON CONFLICT DO NOTHING;
+
+ALTER TABLE ingestion_jobs
+    ADD COLUMN IF NOT EXISTS chunks_total integer NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS chunks_duplicate integer NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS embeddings_reused integer NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS tokens_embedded bigint NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS tokens_saved bigint NOT NULL DEFAULT 0;
+
+ANALYZE knowledge_base;
+
+COMMIT;
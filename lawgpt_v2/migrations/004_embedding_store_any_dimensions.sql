@@ -0,0 +1,12 @@
+-- migrations/004_embedding_store_any_dimensions.sql
+--
+-- embedding_store хранит векторы разных моделей и размерностей (ключ model
+-- включает размерность), поэтому столбец теряет фиксированную размерность.
+--
+--   psql "$DATABASE_URL" -f migrations/004_embedding_store_any_dimensions.sql
+
+BEGIN;
+
+ALTER TABLE embedding_store ALTER COLUMN embedding TYPE vector;
+
+COMMIT;
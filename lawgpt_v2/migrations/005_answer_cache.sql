@@ -0,0 +1,30 @@
+-- migrations/005_answer_cache.sql
+--
+-- Семантический кэш ответов графа и версии баз знаний пользователей
+-- (src/db/answer_cache.py).
+--
+--   psql "$DATABASE_URL" -f migrations/005_answer_cache.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS answer_cache (
+    id bigserial NOT NULL,
+    scope varchar(64) NOT NULL,
+    model varchar(100) NOT NULL,
+    kb_version bigint NOT NULL,
+    query text NOT NULL,
+    embedding vector NOT NULL,
+    answer text NOT NULL,
+    created_at timestamptz DEFAULT now(),
+    CONSTRAINT pk_answer_cache PRIMARY KEY (id)
+);
+CREATE INDEX IF NOT EXISTS idx_answer_cache_scope ON answer_cache (scope, model, created_at);
+
+CREATE TABLE IF NOT EXISTS knowledge_base_versions (
+    owner_id integer NOT NULL,
+    version bigint NOT NULL,
+    CONSTRAINT pk_knowledge_base_versions PRIMARY KEY (owner_id),
+    CONSTRAINT fk_knowledge_base_versions_owner_id_users FOREIGN KEY (owner_id) REFERENCES users (id)
+);
+
+COMMIT;
@@ -1,17 +1,110 @@
 # src/agents/coordinator.py
 
+import hashlib
+import logging
 from typing import List
 from pydantic import BaseModel, Field
-from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from redis.exceptions import RedisError
+
 from src.agents.llm_factory import get_smart_llm
+from src.agents.plan_rules import classify, normalize_query, search_query_for
+from src.core.config import settings
+from src.core.embedding_cache import LRUCache
+from src.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
 
 class PlanSchema(BaseModel):
     """Схема для плана выполнения, генерируемого координатором."""
-    plan: List[str] = Field(description="Список шагов (агентов) для выполнения задачи. Возможные значения: 'WebSearchAgent', 'LegalSearchAgent', 'DocumentAnalysisAgent', 'CaseLawSynthesisAgent', 'DocumentDrafterAgent', 'ResponseFinalizerAgent'.")
+    plan: List[str] = Field(description=(
+        "Список шагов (агентов) для выполнения задачи. Возможные значения: "
+        "'WebSearchAgent', 'LegalSearchAgent', 'DocumentAnalysisAgent', "
+        "'CaseLawSynthesisAgent', 'DocumentDrafterAgent', 'ResponseFinalizerAgent'."
+    ))
     search_query: str = Field(description="Оптимизированный поисковый запрос для следующего агента-исследователя.")
 
+
 # Промпт для агента-координатора
-coordinator_prompt_template = ChatPromptTemplate.from_messages()
+coordinator_prompt_template = ChatPromptTemplate.from_messages([
+    ("system",
+     "Ты — координатор юридического ассистента. Составь план из шагов (агентов) для ответа на запрос "
+     "пользователя и сформулируй оптимизированный поисковый запрос.\n"
+     "WebSearchAgent — поиск в интернете (законодательство, новости, практика); "
+     "LegalSearchAgent — поиск по документам пользователя и загруженным кодексам; "
+     "DocumentAnalysisAgent — извлечение фактов из найденных документов; "
+     "CaseLawSynthesisAgent — построение юридического аргумента; "
+     "ResponseFinalizerAgent — итоговый ответ, всегда последний шаг.\n"
+     "Шаги поиска указывай первыми."),
+    MessagesPlaceholder("messages"),
+    ("human", "Текущий запрос: {original_query}"),
+])
 
 # Цепочка для координатора
-coordinator_chain = coordinator_prompt_template | get_smart_llm().with_structured_output(PlanSchema)
\ No newline at end of file
+coordinator_chain = coordinator_prompt_template | get_smart_llm().with_structured_output(PlanSchema)
+
+# --- Быстрый путь и кэш планов ---
+# Для первого вопроса треда план зависит только от самого вопроса, поэтому
+# он строится правилами или берется из кэша по нормализованному намерению.
+# Вопросы с предысторией всегда планирует LLM.
+
+_local_plans = LRUCache(settings.PLAN_CACHE_LOCAL_SIZE, settings.PLAN_CACHE_TTL)
+plan_stats = {"rules": 0, "cache": 0, "llm": 0}
+
+
+def _plan_key(normalized: str) -> str:
+    return f"plan:{hashlib.sha256(normalized.encode('utf-8')).hexdigest()}"
+
+
+async def _cached_plan(key: str) -> PlanSchema | None:
+    plan = _local_plans.get(key)
+    if plan is not None:
+        return plan
+    try:
+        raw = await get_redis().get(key)
+    except RedisError as exc:
+        logger.warning("Кэш планов в Redis недоступен: %s", exc)
+        return None
+    if raw is None:
+        return None
+    plan = PlanSchema.model_validate_json(raw)
+    _local_plans.set(key, plan)
+    return plan
+
+
+async def _cache_plan(key: str, plan: PlanSchema):
+    _local_plans.set(key, plan)
+    try:
+        await get_redis().set(key, plan.model_dump_json(), ex=settings.PLAN_CACHE_TTL)
+    except RedisError as exc:
+        logger.warning("Не удалось записать план в Redis: %s", exc)
+
+
+async def plan_query(original_query: str, messages: list) -> PlanSchema:
+    """
+    План для запроса: правила (если уверенность не ниже PLAN_RULES_MIN_CONFIDENCE),
+    затем кэш планов, затем координатор-LLM.
+    """
+    # Последнее сообщение — сам запрос; более ранние означают уточняющий вопрос
+    if len(messages) > 1:
+        plan_stats["llm"] += 1
+        return await coordinator_chain.ainvoke({"messages": messages, "original_query": original_query})
+
+    normalized = normalize_query(original_query)
+    if settings.PLAN_RULES_ENABLED:
+        rule, confidence = classify(normalized)
+        if rule is not None and confidence >= settings.PLAN_RULES_MIN_CONFIDENCE:
+            plan_stats["rules"] += 1
+            return PlanSchema(plan=list(rule.plan), search_query=search_query_for(normalized))
+
+    key = _plan_key(normalized)
+    plan = await _cached_plan(key)
+    if plan is not None:
+        plan_stats["cache"] += 1
+        return plan
+
+    plan_stats["llm"] += 1
+    plan = await coordinator_chain.ainvoke({"messages": messages, "original_query": original_query})
+    await _cache_plan(key, plan)
+    return plan
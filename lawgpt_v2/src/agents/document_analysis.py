@@ -1,9 +1,11 @@
 # src/agents/document_analysis.py
 
-from typing import List
+from typing import Iterable, List
 from pydantic import BaseModel, Field
 from langchain_core.prompts import ChatPromptTemplate
 from src.agents.llm_factory import get_fast_llm
+from src.core.tokens import count_tokens, split_by_tokens
+
 
 class ExtractedFact(BaseModel):
     """Структурированная информация, извлеченная из юридического документа."""
@@ -11,13 +13,16 @@ class ExtractedFact(BaseModel):
     source_document_id: str = Field(description="ID документа, из которого извлечен факт (если известен).")
     direct_quote: str = Field(description="Точная цитата из документа, подтверждающая факт.")
 
+
 class AnalysisResult(BaseModel):
     """Контейнер для всех фактов, извлеченных из одного фрагмента текста."""
     facts: List[ExtractedFact]
 
+
 # Промпт для анализатора документов
 analysis_prompt_template = ChatPromptTemplate.from_template(
-"""Твоя задача — внимательно проанализировать предоставленный юридический текст и извлечь из него все значимые факты, аргументы, определения и положения.
+    """Твоя задача — внимательно проанализировать предоставленный юридический текст и извлечь из него
+все значимые факты, аргументы, определения и положения.
 
 Для каждого найденного значимого элемента используй инструмент `ExtractedFact`. Не упускай ничего важного.
 
@@ -32,4 +37,47 @@ analysis_prompt_template = ChatPromptTemplate.from_template(
 analysis_llm = get_fast_llm().with_structured_output(AnalysisResult)
 
 # Цепочка для анализа
-analysis_chain = analysis_prompt_template | analysis_llm
\ No newline at end of file
+analysis_chain = analysis_prompt_template | analysis_llm
+
+# --- Map-reduce анализ больших наборов документов ---
+
+
+def _split_document(text: str, max_tokens: int) -> List[str]:
+    """
+    Делит текст документа на части не длиннее max_tokens токенов. Заголовок
+    [Документ id] повторяется в каждой части, чтобы факты из продолжения
+    ссылались на свой документ.
+    """
+    header, _, body = text.partition("\n")
+    if not header.startswith("[Документ ") or count_tokens(text) <= max_tokens:
+        return split_by_tokens(text, max_tokens)
+    body_tokens = max(max_tokens - count_tokens(header + "\n"), 1)
+    return [f"{header}\n{piece}" for piece in split_by_tokens(body, body_tokens)]
+
+
+def batch_documents(texts: List[str], max_tokens: int) -> List[str]:
+    """
+    Группирует тексты документов в пачки не длиннее max_tokens токенов.
+    Документ, который сам не помещается в бюджет, делится на части.
+    """
+    batches, current, current_tokens = [], [], 0
+    for text in texts:
+        for piece in _split_document(text, max_tokens):
+            tokens = count_tokens(piece)
+            if current and current_tokens + tokens > max_tokens:
+                batches.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += tokens
+    if current:
+        batches.append("\n\n".join(current))
+    return batches
+
+
+def merge_facts(facts: Iterable[ExtractedFact]) -> List[ExtractedFact]:
+    """Объединяет факты из разных пачек, убирая повторы по документу и цитате."""
+    merged = {}
+    for fact in facts:
+        key = (fact.source_document_id.strip(), " ".join(fact.direct_quote.lower().split()))
+        merged.setdefault(key, fact)
+    return list(merged.values())
@@ -0,0 +1,97 @@
+# src/agents/history.py
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, RemoveMessage, SystemMessage, ToolMessage
+from langchain_core.prompts import ChatPromptTemplate
+
+from src.agents.llm_factory import get_fast_llm
+from src.core.config import settings
+from src.core.tokens import count_tokens, truncate_to_tokens
+
+# Управление историей длинных тредов. Координатор и финализатор видят краткое
+# содержание ранних ходов и последние сообщения в пределах HISTORY_WINDOW_TOKENS.
+# Когда история в чекпоинте превышает HISTORY_MAX_TOKENS, сообщения вне окна
+# сворачиваются в краткое содержание и удаляются из состояния. Сворачиваются
+# только вытесненные сообщения: прежнее краткое содержание дополняется, а не
+# пересчитывается.
+
+summary_chain = ChatPromptTemplate.from_template(
+    """Обнови краткое содержание юридической консультации, добавив в него новые сообщения.
+    Сохрани факты дела, стороны, даты, суммы, упомянутые нормы права, выводы и открытые вопросы.
+    Не более {max_words} слов. Верни только текст краткого содержания.
+
+    Текущее краткое содержание:
+    {summary}
+
+    Новые сообщения:
+    {messages}
+    """
+) | get_fast_llm()
+
+# Служебные токены разметки сообщения в чате OpenAI
+_MESSAGE_OVERHEAD = 4
+
+_ROLES = {HumanMessage: "Пользователь", AIMessage: "Ассистент", SystemMessage: "Система"}
+
+
+def message_tokens(message: BaseMessage) -> int:
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    if isinstance(message, AIMessage) and message.tool_calls:
+        # Аргументы вызовов инструментов тоже уходят в промпт
+        content += str(message.tool_calls)
+    return count_tokens(content) + _MESSAGE_OVERHEAD
+
+
+def split_window(messages: list[BaseMessage], budget: int) -> tuple[list[BaseMessage], list[BaseMessage]]:
+    """
+    Делит историю на ранние сообщения и окно последних в пределах budget токенов.
+    Последнее сообщение (текущий запрос) попадает в окно всегда. Результаты
+    инструментов не отделяются от сообщения модели с их вызовами: без него
+    API отклоняет историю.
+    """
+    used, start = 0, len(messages)
+    for index in range(len(messages) - 1, -1, -1):
+        used += message_tokens(messages[index])
+        if used > budget and start < len(messages):
+            break
+        start = index
+    # Окно начинается с вопроса пользователя, а не с ответа без вопроса
+    while start < len(messages) - 1 and not isinstance(messages[start], HumanMessage):
+        start += 1
+    # Результаты инструментов — вместе с вызвавшим их сообщением модели
+    while start > 0 and isinstance(messages[start], ToolMessage):
+        start -= 1
+    return messages[:start], messages[start:]
+
+
+def history_messages(state: dict) -> list[BaseMessage]:
+    """Ограниченный контекст треда: краткое содержание и окно последних сообщений."""
+    _, window = split_window(state.get("messages") or [], settings.HISTORY_WINDOW_TOKENS)
+    if summary := state.get("history_summary"):
+        return [SystemMessage(content=f"Краткое содержание предыдущего разговора:\n{summary}")] + window
+    return window
+
+
+def format_history(messages: list[BaseMessage]) -> str:
+    return "\n".join(f"{_ROLES.get(type(message), message.type)}: {message.content}" for message in messages)
+
+
+async def compact_history(messages: list[BaseMessage], summary: str | None) -> dict:
+    """
+    Обновление состояния: краткое содержание с вытесненными сообщениями и их
+    удаление из messages. Пустое, пока история не превысила HISTORY_MAX_TOKENS.
+    """
+    if sum(message_tokens(message) for message in messages) <= settings.HISTORY_MAX_TOKENS:
+        return {}
+    older, _ = split_window(messages, settings.HISTORY_WINDOW_TOKENS)
+    if not older:
+        return {}
+    response = await summary_chain.ainvoke({
+        "summary": summary or "(пока нет)",
+        # Вытесненные сообщения ограничены порогом сжатия, но один ответ может быть огромным
+        "messages": truncate_to_tokens(format_history(older), settings.HISTORY_MAX_TOKENS),
+        "max_words": settings.HISTORY_SUMMARY_MAX_TOKENS * 2 // 3,
+    })
+    return {
+        "history_summary": truncate_to_tokens(response.content, settings.HISTORY_SUMMARY_MAX_TOKENS),
+        "messages": [RemoveMessage(id=message.id) for message in older],
+    }
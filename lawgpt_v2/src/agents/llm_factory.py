@@ -1,23 +1,159 @@
 # src/agents/llm_factory.py
 
+import asyncio
+import importlib.util
+from functools import lru_cache
+from typing import Callable
+
+import httpx
 from langchain_openai import ChatOpenAI
+from src.agents.llm_scheduler import LLMScheduler, estimate_tokens, get_scheduler
 from src.core.config import settings
+from src.core.metrics import llm_callbacks, llm_event_hooks
+from src.core.replay import replay_transport
 
 # Фабрика для создания экземпляров LLM
-# Это позволяет централизованно управлять настройками моделей
+# Это позволяет централизованно управлять настройками моделей.
+# Клиенты создаются один раз на модель и переиспользуются всеми узлами графа:
+# общий keep-alive пул соединений, HTTP/2 (если установлен пакет h2),
+# таймауты и ограничение числа одновременных запросов к каждой модели.
 
-def get_smart_llm():
-    """Возвращает мощную модель для сложных рассуждений."""
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Тело ответа, освобождающее слот конкурентности после чтения."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class _ConcurrencyLimitedTransport(httpx.AsyncBaseTransport):
+    """
+    Ограничивает число одновременных запросов к модели.
+    Слот занят до закрытия тела ответа, поэтому лимит работает и для стриминга,
+    и для HTTP/2, где все запросы идут через одно соединение.
+    Семафор и пул соединений привязаны к event loop: задачи Celery, скрипты и
+    бенчмарки запускают свой loop (asyncio.run), и в нем создаются новые.
+    """
+
+    def __init__(self, make_transport: Callable[[], httpx.AsyncBaseTransport], limit: int):
+        self._make_transport = make_transport
+        self._limit = limit
+        self._loop = None
+
+    def _bind(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Соединения прежнего loop закрыть уже нельзя — они уходят вместе с ним
+            self._loop = loop
+            self._transport = self._make_transport()
+            self._semaphore = asyncio.Semaphore(self._limit)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self._bind()
+        semaphore = self._semaphore
+        await semaphore.acquire()
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                semaphore.release()
+
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        if response.is_closed:
+            # Тело уже прочитано транспортом — держать слот незачем
+            release()
+        else:
+            response.stream = _ReleasingStream(response.stream, release)
+        return response
+
+    async def aclose(self):
+        if self._loop is not None:
+            await self._transport.aclose()
+
+
+class _AdmissionControlledTransport(httpx.AsyncBaseTransport):
+    """
+    Пропускает запрос к модели только в пределах бюджета RPM/TPM (llm_scheduler).
+    Стоит снаружи ограничителя конкурентности: ожидающий запрос не занимает слот.
+    Повторы клиента openai проходят через транспорт и тоже списывают бюджет.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, scheduler: LLMScheduler):
+        self._transport = transport
+        self._scheduler = scheduler
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await self._scheduler.acquire(estimate_tokens(await request.aread()))
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+def _http_settings() -> dict:
+    return {
+        "limits": httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+        ),
+        "http2": settings.LLM_HTTP2 and _HTTP2_AVAILABLE,
+    }
+
+
+@lru_cache(maxsize=None)
+def _get_llm(model: str, max_concurrency: int) -> ChatOpenAI:
+    """Создает (один раз на модель) клиента с общими HTTP-пулами (свой пул в каждом event loop)."""
+    timeout = httpx.Timeout(
+        settings.LLM_TIMEOUT,
+        connect=settings.LLM_CONNECT_TIMEOUT,
+        pool=settings.LLM_POOL_TIMEOUT,
+    )
+    # Запись/воспроизведение (REPLAY_MODE) — внутри ограничителя: в нагрузочных
+    # тестах лимиты конкурентности работают как с настоящим API
+    transport = _ConcurrencyLimitedTransport(
+        lambda: replay_transport(httpx.AsyncHTTPTransport(**_http_settings()), "openai"), max_concurrency,
+    )
+    if scheduler := get_scheduler(model):
+        transport = _AdmissionControlledTransport(transport, scheduler)
     return ChatOpenAI(
-        model=settings.SMART_LLM_MODEL, 
-        temperature=0, 
-        api_key=settings.OPENAI_API_KEY
+        model=model,
+        temperature=0,
+        api_key=settings.OPENAI_API_KEY,
+        timeout=timeout,
+        max_retries=settings.LLM_MAX_RETRIES,
+        # Usage в последнем чанке стрима: токены потоковых вызовов тоже учитываются
+        stream_usage=True,
+        callbacks=llm_callbacks(model),
+        http_client=httpx.Client(timeout=timeout, **_http_settings()),
+        http_async_client=httpx.AsyncClient(timeout=timeout, transport=transport, event_hooks=llm_event_hooks(model)),
     )
 
+
+def get_smart_llm():
+    """Возвращает мощную модель для сложных рассуждений."""
+    return _get_llm(settings.SMART_LLM_MODEL, settings.SMART_LLM_MAX_CONCURRENCY)
+
+
 def get_fast_llm():
     """Возвращает быструю и дешевую модель для простых, структурированных задач."""
-    return ChatOpenAI(
-        model=settings.FAST_LLM_MODEL, 
-        temperature=0, 
-        api_key=settings.OPENAI_API_KEY
-    )
\ No newline at end of file
+    return _get_llm(settings.FAST_LLM_MODEL, settings.FAST_LLM_MAX_CONCURRENCY)
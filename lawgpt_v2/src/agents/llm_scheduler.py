@@ -0,0 +1,291 @@
+# src/agents/llm_scheduler.py
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from enum import IntEnum
+
+from langchain_core.callbacks.manager import adispatch_custom_event
+from redis.exceptions import RedisError
+
+from src.core.config import settings
+from src.core.metrics import observe_llm_queue
+from src.core.redis_client import get_redis
+from src.core.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Допуск запросов к LLM. Бюджеты запросов и токенов в минуту (RPM/TPM) на модель
+# общие для всех воркеров: это корзины токенов в Redis, которые списываются
+# атомарным скриптом. Внутри процесса запросы ждут в очереди: сначала
+# интерактивные (чат), затем фоновые; внутри класса пользователи обслуживаются
+# по кругу, чтобы один тяжелый запрос с десятком вызовов LLM не занимал весь
+# бюджет. Ожидающий вызов сообщает свою позицию событием llm_queue, которое
+# /chat/stream передает клиенту. Если Redis недоступен, запросы пропускаются.
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+# Класс и пользователь текущего запроса. По умолчанию — фоновый: все, что не
+# помечено чатом (задачи Celery, скрипты), уступает интерактивным запросам
+_priority: ContextVar[Priority] = ContextVar("llm_priority", default=Priority.BACKGROUND)
+_user: ContextVar[int | None] = ContextVar("llm_user", default=None)
+
+
+def set_llm_request(priority: Priority, user_id: int | None = None):
+    """Помечает вызовы LLM текущей задачи asyncio (и порожденных ею) классом и пользователем."""
+    _priority.set(priority)
+    _user.set(user_id)
+
+
+# Корзины пополняются непрерывно: limit в минуту, не больше limit в запасе.
+# Возвращает 0, если запрос допущен, иначе — секунды до пополнения.
+_ACQUIRE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local rpm, tpm, tokens = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'requests', 'tokens', 'ts')
+local elapsed = math.max(0, now - (tonumber(state[3]) or now))
+local requests = math.min(rpm, (tonumber(state[1]) or rpm) + elapsed * rpm / 60)
+local budget = math.min(tpm, (tonumber(state[2]) or tpm) + elapsed * tpm / 60)
+-- Запрос больше всей корзины ждет ее заполнения, а не вечно
+tokens = math.min(tokens, tpm)
+local wait = 0
+if requests < 1 then wait = (1 - requests) * 60 / rpm end
+if budget < tokens then wait = math.max(wait, (tokens - budget) * 60 / tpm) end
+if wait == 0 then
+    requests = requests - 1
+    budget = budget - tokens
+end
+redis.call('HSET', KEYS[1], 'requests', requests, 'tokens', budget, 'ts', now)
+redis.call('EXPIRE', KEYS[1], 120)
+return tostring(wait)
+"""
+
+# Возвращает в корзины списанное для запроса, который так и не был отправлен
+_REFUND_SCRIPT = """
+local rpm, tpm, tokens = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'requests', 'tokens')
+if not state[1] then return 0 end
+redis.call('HSET', KEYS[1], 'requests', math.min(rpm, tonumber(state[1]) + 1),
+           'tokens', math.min(tpm, tonumber(state[2]) + math.min(tokens, tpm)))
+return 1
+"""
+
+
+def estimate_tokens(body: bytes) -> int:
+    """Оценка токенов запроса chat completions: промпт и максимум ответа."""
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return settings.LLM_ADMISSION_COMPLETION_TOKENS
+    texts = []
+    for message in payload.get("messages") or []:
+        content = message.get("content")
+        if isinstance(content, str):
+            texts.append(content)
+        elif isinstance(content, list):
+            texts.extend(part.get("text", "") for part in content if isinstance(part, dict))
+    completion = payload.get("max_completion_tokens") or payload.get("max_tokens")
+    return count_tokens("\n".join(texts)) + (completion or settings.LLM_ADMISSION_COMPLETION_TOKENS)
+
+
+class _Waiter:
+    __slots__ = ("priority", "user", "tokens", "changed", "admitted", "position")
+
+    def __init__(self, priority: Priority, user: int | None, tokens: int):
+        self.priority = priority
+        self.user = user
+        self.tokens = tokens
+        self.changed = asyncio.Event()
+        self.admitted = False
+        self.position = 0
+
+
+class LLMScheduler:
+    """Очередь допуска к одной модели в пределах процесса поверх общих корзин в Redis."""
+
+    def __init__(self, model: str, rpm: int, tpm: int):
+        self.model = model
+        self.rpm = rpm
+        self.tpm = tpm
+        self._key = f"llm_budget:{model}"
+        self._script = None
+        self._refund_script = None
+        self._loop = None
+
+    def _bind(self):
+        # Задачи Celery запускают свой event loop: очередь создается заново
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._queues: dict[Priority, OrderedDict[int | None, deque[_Waiter]]] = {
+                priority: OrderedDict() for priority in Priority
+            }
+            self._wakeup = asyncio.Event()
+            self._dispatcher: asyncio.Task | None = None
+
+    async def _try_acquire(self, tokens: int) -> float:
+        redis = get_redis()
+        if self._script is None or self._script.registered_client is not redis:
+            self._script = redis.register_script(_ACQUIRE_SCRIPT)
+        try:
+            return float(await self._script(keys=[self._key], args=[self.rpm, self.tpm, tokens]))
+        except RedisError as exc:
+            logger.warning("Бюджет LLM в Redis недоступен, запрос к %s допущен: %s", self.model, exc)
+            return 0.0
+
+    async def _refund(self, tokens: int):
+        redis = get_redis()
+        if self._refund_script is None or self._refund_script.registered_client is not redis:
+            self._refund_script = redis.register_script(_REFUND_SCRIPT)
+        try:
+            await self._refund_script(keys=[self._key], args=[self.rpm, self.tpm, tokens])
+        except RedisError as exc:
+            # Корзина пополнится сама
+            logger.warning("Не удалось вернуть бюджет LLM %s: %s", self.model, exc)
+
+    def _order(self) -> list[_Waiter]:
+        """Ожидающие в порядке обслуживания: по классу, внутри — по кругу пользователей."""
+        order = []
+        for users in self._queues.values():
+            queues = [iter(queue) for queue in users.values()]
+            while queues:
+                alive = []
+                for queue in queues:
+                    waiter = next(queue, None)
+                    if waiter is not None:
+                        order.append(waiter)
+                        alive.append(queue)
+                queues = alive
+        return order
+
+    def _publish_positions(self):
+        for position, waiter in enumerate(self._order(), start=1):
+            if waiter.position != position:
+                waiter.position = position
+                waiter.changed.set()
+
+    def _remove(self, waiter: _Waiter):
+        users = self._queues[waiter.priority]
+        queue = users.get(waiter.user)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del users[waiter.user]
+
+    def _next(self) -> _Waiter | None:
+        for users in self._queues.values():
+            if users:
+                return users[next(iter(users))][0]
+        return None
+
+    async def _dispatch(self):
+        try:
+            while (waiter := self._next()) is not None:
+                wait = await self._try_acquire(waiter.tokens)
+                if self._next() is not waiter:
+                    # Пока шел запрос к Redis, ожидающий отменен или вперед встал
+                    # более срочный запрос. Бюджет списан под размер ушедшего:
+                    # он возвращается, а новый первый списывает свой
+                    if wait == 0:
+                        await self._refund(waiter.tokens)
+                    continue
+                if wait == 0:
+                    self._admit(waiter)
+                    continue
+                # Ждем пополнения корзины или нового, более срочного запроса
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        except Exception:
+            # Без диспетчера очередь никто не разберет. Как и при недоступном
+            # Redis, ожидающие допускаются без бюджета, а следующий запрос
+            # в очередь запустит новый диспетчер
+            logger.exception("Диспетчер допуска LLM %s упал, очередь допущена без бюджета", self.model)
+            while (waiter := self._next()) is not None:
+                # Ничего не списано — при отмене нечего возвращать
+                waiter.tokens = 0
+                self._admit(waiter)
+        finally:
+            self._dispatcher = None
+
+    def _admit(self, waiter: _Waiter):
+        users = self._queues[waiter.priority]
+        users[waiter.user].popleft()
+        # Пользователь уходит в конец круга своего класса
+        users.move_to_end(waiter.user)
+        if not users[waiter.user]:
+            del users[waiter.user]
+        waiter.admitted = True
+        waiter.changed.set()
+        self._publish_positions()
+
+    async def acquire(self, tokens: int):
+        """Ждет допуска запроса на tokens токенов."""
+        self._bind()
+        priority, user = _priority.get(), _user.get()
+        if self._next() is None and await self._try_acquire(tokens) == 0:
+            observe_llm_queue(self.model, priority.name.lower(), 0.0)
+            return
+
+        started = time.perf_counter()
+        waiter = _Waiter(priority, user, tokens)
+        self._queues[priority].setdefault(user, deque()).append(waiter)
+        self._publish_positions()
+        self._wakeup.set()
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+        reported, reported_at = None, 0.0
+        try:
+            while True:
+                await waiter.changed.wait()
+                waiter.changed.clear()
+                if waiter.admitted:
+                    break
+                now = time.monotonic()
+                if waiter.position != reported and now - reported_at >= settings.LLM_ADMISSION_POSITION_INTERVAL:
+                    reported, reported_at = waiter.position, now
+                    await _report_position(self.model, priority, waiter.position)
+        except asyncio.CancelledError:
+            if waiter.admitted:
+                # Отмена пришла сразу после допуска: списанный бюджет не будет
+                # израсходован и возвращается в корзину
+                await asyncio.shield(self._refund(waiter.tokens))
+            else:
+                self._remove(waiter)
+                self._publish_positions()
+            raise
+        observe_llm_queue(self.model, priority.name.lower(), time.perf_counter() - started)
+        if reported is not None:
+            await _report_position(self.model, priority, 0)
+
+
+async def _report_position(model: str, priority: Priority, position: int):
+    try:
+        await adispatch_custom_event("llm_queue", {
+            "model": model, "priority": priority.name.lower(), "position": position,
+        })
+    except RuntimeError:
+        # Вызов вне запуска графа (задачи Celery, скрипты): слушателей нет
+        pass
+
+_schedulers: dict[str, LLMScheduler | None] = {}
+
+
+def get_scheduler(model: str) -> LLMScheduler | None:
+    """Очередь допуска модели; None, если допуск выключен или лимиты модели не заданы."""
+    if model not in _schedulers:
+        rpm, tpm = settings.LLM_RPM_LIMITS.get(model), settings.LLM_TPM_LIMITS.get(model)
+        enabled = settings.LLM_ADMISSION_ENABLED and rpm and tpm
+        _schedulers[model] = LLMScheduler(model, rpm, tpm) if enabled else None
+    return _schedulers[model]
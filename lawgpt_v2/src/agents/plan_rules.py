@@ -0,0 +1,101 @@
+# src/agents/plan_rules.py
+
+import re
+from dataclasses import dataclass
+
+# Правила для типовых формулировок запросов: план строится без вызова LLM.
+# Каждое правило дает уверенность; если сработали правила с разными планами
+# или запрос слишком длинный (вероятно, составной), уверенность снижается
+# и план строит координатор-LLM.
+
+_FILLERS = re.compile(
+    r"\b(пожалуйста|подскажите|подскажи|скажите|скажи|расскажите|расскажи|объясните|объясни|"
+    r"помогите|помоги|хочу узнать|интересует|можно|ли|а|и|же|вот)\b"
+)
+_PUNCTUATION = re.compile(r"[^\w\s.§-]")
+_SPACES = re.compile(r"\s+")
+# Сокращения ссылок на нормы приводятся к одному виду: «ст. 15» и «статья 15» — одно намерение
+_ABBREVIATIONS = (
+    (re.compile(r"\bст\.?\s*(?=\d)"), "статья "),
+    (re.compile(r"\bстатьи\b|\bстатье\b|\bстатью\b|\bстатьей\b"), "статья"),
+    (re.compile(r"\bп\.\s*(?=\d)"), "пункт "),
+    (re.compile(r"\bгк\s*рф\b|\bгражданского кодекса( рф)?\b|\bгражданский кодекс( рф)?\b"), "гк рф"),
+    (re.compile(r"\bук\s*рф\b|\bуголовного кодекса( рф)?\b|\bуголовный кодекс( рф)?\b"), "ук рф"),
+    (re.compile(r"\bтк\s*рф\b|\bтрудового кодекса( рф)?\b|\bтрудовой кодекс( рф)?\b"), "тк рф"),
+    (re.compile(r"\bнк\s*рф\b|\bналогового кодекса( рф)?\b|\bналоговый кодекс( рф)?\b"), "нк рф"),
+    (re.compile(r"\bкоап\s*(рф)?\b"), "коап рф"),
+)
+
+
+def normalize_query(query: str) -> str:
+    """
+    Нормализованное намерение запроса: регистр, ё, пунктуация, вежливые
+    слова и формы ссылок на нормы не влияют на план.
+    """
+    text = query.lower().replace("ё", "е")
+    for pattern, replacement in _ABBREVIATIONS:
+        text = pattern.sub(replacement, text)
+    text = _PUNCTUATION.sub(" ", text)
+    text = _FILLERS.sub(" ", text)
+    return _SPACES.sub(" ", text).strip(" .-")
+
+
+@dataclass(frozen=True)
+class PlanRule:
+    name: str
+    pattern: re.Pattern
+    plan: tuple[str, ...]
+    confidence: float
+
+
+_ANSWER = ("ResponseFinalizerAgent",)
+_BOTH_SEARCHES = ("LegalSearchAgent", "WebSearchAgent")
+
+RULES = (
+    # Текст или толкование конкретной нормы: база знаний (загруженные кодексы) и веб
+    PlanRule("statute", re.compile(r"\bстатья \d+(\.\d+)?\b.*\b(гк|ук|тк|нк|коап|апк|гпк|жк|ск|зк) рф\b|"
+                                   r"\b(гк|ук|тк|нк|коап|апк|гпк|жк|ск|зк) рф\b.*\bстатья \d+"),
+             _BOTH_SEARCHES + _ANSWER, 0.9),
+    # Определение термина
+    PlanRule("definition", re.compile(r"^(что такое|что означает|что значит|понятие|определение)\b"),
+             ("WebSearchAgent",) + _ANSWER, 0.85),
+    # Свежие изменения законодательства и новости
+    PlanRule("news", re.compile(r"\b(новост\w*|последние изменения|изменения в законодательстве|"
+                                r"вступ\w+ в силу|с \d{4} года|в \d{4} году)\b"),
+             ("WebSearchAgent",) + _ANSWER, 0.85),
+    # Вопросы по загруженным пользователем документам
+    PlanRule("own_documents", re.compile(r"\b(мо(ем|их|ему|и|й)|наш(ем|их|ему|и)?|загруженн\w+)\s+"
+                                         r"(документ\w*|договор\w*|дел\w*|файл\w*|материал\w*)"),
+             ("LegalSearchAgent", "DocumentAnalysisAgent") + _ANSWER, 0.9),
+    # Судебная практика: поиск, анализ и синтез позиции
+    PlanRule("case_law", re.compile(r"\b(судебн\w+ практик\w*|позици\w+ (верховного )?суда|прецедент\w*)\b"),
+             _BOTH_SEARCHES + ("DocumentAnalysisAgent", "CaseLawSynthesisAgent") + _ANSWER, 0.85),
+)
+
+_QUESTION_WORDS = re.compile(
+    r"^(что такое|что означает|что значит|что говорит|как|какой|какая|какие|каков\w*|почему|когда)\s+"
+)
+
+
+def search_query_for(normalized: str) -> str:
+    """Поисковый запрос для плана по правилу: нормализованный текст без вопросительных слов."""
+    return _QUESTION_WORDS.sub("", normalized) or normalized
+
+
+# Длинные запросы обычно составные — их план лучше строит LLM
+_MAX_WORDS = 25
+
+
+def classify(normalized: str) -> tuple[PlanRule | None, float]:
+    """Возвращает подходящее правило и уверенность в нем (0, если правил нет)."""
+    matched = [rule for rule in RULES if rule.pattern.search(normalized)]
+    if not matched:
+        return None, 0.0
+    # План, включающий шаги всех сработавших правил, покрывает их все
+    # («судебная практика по статье 333 ГК РФ»); иначе правила противоречат друг другу
+    covering = [rule for rule in matched if all(set(other.plan) <= set(rule.plan) for other in matched)]
+    best = max(covering or matched, key=lambda rule: rule.confidence)
+    confidence = best.confidence if covering else best.confidence / 2
+    if len(normalized.split()) > _MAX_WORDS:
+        confidence /= 2
+    return best, confidence
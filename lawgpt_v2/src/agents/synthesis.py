@@ -2,9 +2,11 @@ from pydantic import BaseModel, Field
 from langchain_core.prompts import ChatPromptTemplate
 from src.agents.llm_factory import get_smart_llm
 
+
 class SynthesizedArgument(BaseModel):
     synthesized_argument: str = Field(description="Связный юридический аргумент, основанный на анализе фактов.")
 
+
 synthesis_prompt = ChatPromptTemplate.from_template(
     """
     На основе следующих структурированных фактов и аргументов из документов:
@@ -1,5 +1,6 @@
 from src.graph.tools.web_search import web_search_tool
 
-def run_web_search(query: str) -> str:
-    """Выполняет поиск в интернете через TavilySearchResults."""
-    return web_search_tool.run(query)
+
+async def run_web_search(query: str) -> list[dict] | str:
+    """Выполняет поиск в интернете через кэшируемый инструмент Tavily."""
+    return await web_search_tool.ainvoke({"query": query})
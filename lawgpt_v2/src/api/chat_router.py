@@ -1,78 +1,265 @@
 # src/api/chat_router.py
 
-import json
+import logging
+import time
 import uuid
-from typing import Annotated
-from fastapi import APIRouter, Depends, Request
+from contextlib import aclosing
+from typing import Annotated, Awaitable, Callable
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import AIMessage, HumanMessage
 
+from src.agents.llm_scheduler import Priority, set_llm_request
+from src.api.streaming import (
+    IDLE, ChunkCoalescer, ClientDisconnected, DeadlineExceeded, guarded_stream, sse_event,
+)
+from src.core.answer_cache import AnswerLookup, lookup_answer, store_answer
+from src.core.config import settings
+from src.core.embedding_cache import embedding_namespace
 from src.graph.graph import graph_app
+from src.graph.tools.kb_search import embeddings_model
 from src.auth.security import get_current_user
 from src.auth.models import User
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
+
 class ChatRequest(BaseModel):
     query: str
     thread_id: str | None = None
+    # Продолжить прерванный запуск треда с последнего чекпоинта (query не используется)
+    resume: bool = False
+    # События node_end с длительностью каждого узла (нагрузочные тесты, отладка)
+    timings: bool = False
+
+
+async def _lookup_cached_answer(query: str, user_id: int) -> AnswerLookup | None:
+    # Эмбеддинг вопроса попадает в кэш эмбеддингов и при промахе
+    # переиспользуется поиском по базе знаний. Кэш необязателен: любой сбой
+    # (модель эмбеддингов, Redis, база) означает промах, а не ошибку чата
+    try:
+        embedding = await embeddings_model.aembed_query(query)
+        return await lookup_answer(embedding, embedding_namespace(embeddings_model.underlying), user_id)
+    except Exception as exc:
+        logger.warning("Кэш ответов недоступен: %s", exc, exc_info=True)
+        return None
+
+
+async def _store_cached_answer(lookup: AnswerLookup, query: str, user_id: int, used_kb: bool, answer: str):
+    try:
+        await store_answer(lookup, query, user_id, used_kb, answer)
+    except Exception as exc:
+        logger.warning("Не удалось сохранить ответ в кэш: %s", exc, exc_info=True)
+
+
+async def _never_disconnected() -> bool:
+    return False
+
 
-async def event_stream_generator(thread_id: str, user_id: int, query: str):
-    """Генератор для потоковой передачи событий SSE на фронтенд."""
+async def _check_thread_owner(thread_id: str, user_id: int):
+    # thread_id приходит от клиента: чужой тред нельзя ни продолжить, ни
+    # дописать (resume запускает граф с сохраненным user_id владельца).
+    # 404, а не 403, чтобы не раскрывать, что такой тред существует
+    values = (await graph_app.aget_state({"configurable": {"thread_id": thread_id}})).values
+    owner_id = values.get("user_id")
+    if owner_id is not None and owner_id != user_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Тред не найден")
+
+
+async def _partial_answer(config: dict, chunks: ChunkCoalescer) -> str:
+    """Лучший ответ, который удалось получить до истечения срока запроса."""
+    if streamed := chunks.streamed("ResponseFinalizerAgent"):
+        return streamed
+    values = (await graph_app.aget_state(config)).values
+    if argument := values.get("synthesized_argument") or chunks.streamed("CaseLawSynthesisAgent"):
+        return argument
+    if facts := values.get("analyzed_facts"):
+        return "Найденные положения:\n" + "\n".join(f"- {fact['fact_summary']}" for fact in facts)
+    return "Не удалось подготовить ответ за отведенное время. Повторите запрос позже."
+
+
+async def event_stream_generator(
+    thread_id: str,
+    user_id: int,
+    query: str,
+    use_cache: bool = True,
+    is_disconnected: Callable[[], Awaitable[bool]] = _never_disconnected,
+    resume: bool = False,
+    timings: bool = False,
+):
+    """
+    Генератор для потоковой передачи событий SSE на фронтенд.
+    use_cache — вопрос без предыстории треда: только такой ответ можно взять
+    из семантического кэша и положить в него.
+    При отключении клиента запуск графа отменяется; чекпоинт остается на
+    последнем завершенном шаге, и запрос с resume=True продолжает с него.
+    По истечении CHAT_REQUEST_TIMEOUT клиент получает частичный ответ.
+    timings — отправлять node_end с длительностью каждого узла графа.
+    """
     config = {"configurable": {"thread_id": thread_id}}
-    
-    # Начальное состояние для графа
-    initial_state = {
+    use_cache = use_cache and settings.ANSWER_CACHE_ENABLED
+    # Вызовы LLM этого запроса идут в очередь интерактивных, по кругу пользователей
+    set_llm_request(Priority.INTERACTIVE, user_id)
+
+    lookup = await _lookup_cached_answer(query, user_id) if use_cache else None
+    if lookup and lookup.hit:
+        yield sse_event({'type': 'cache_hit', 'similarity': lookup.similarity})
+        yield sse_event({'type': 'final_response', 'content': lookup.answer})
+        # Вопрос и ответ записываются в тред, чтобы уточняющие вопросы шли с контекстом.
+        # От имени последнего узла графа: у треда не остается незавершенных шагов
+        # (кэш используется только для первого вопроса, сжимать еще нечего)
+        await graph_app.aupdate_state(config, {
+            "messages": [HumanMessage(content=query), AIMessage(content=lookup.answer)],
+            "user_id": user_id,
+            "original_query": query,
+            "final_response": lookup.answer,
+        }, as_node="compact_history")
+        yield sse_event({'type': 'stream_end'})
+        return
+
+    final_response, used_kb = None, False
+    chunks = ChunkCoalescer()
+    started, first_token_at = time.monotonic(), None
+    node_started: dict[str, float] = {}
+
+    # Начальное состояние для графа; None продолжает запуск с чекпоинта
+    initial_state = None if resume else {
         "messages": [HumanMessage(content=query)],
         "user_id": user_id,
         "original_query": query
     }
-    
+
     # Используем astream_events для получения событий о выполнении графа
-    async for event in graph_app.astream_events(initial_state, config, version="v2"):
-        kind = event["event"]
-        
-        # Отправляем события о вызове инструментов
-        if kind == "on_tool_start":
-            data = {
-                "type": "tool_start", 
-                "tool": event['name'], 
-                "input": event['data'].get('input')
-            }
-            yield f"data: {json.dumps(data)}\n\n"
-        
-        # Отправляем события о завершении инструментов
-        elif kind == "on_tool_end":
-            data = {
-                "type": "tool_end", 
-                "tool": event['name'], 
-            }
-            yield f"data: {json.dumps(data)}\n\n"
-            
-        # Отправляем финальный ответ, когда он появляется в состоянии
-        elif kind == "on_chain_end" and event["name"] == "ResponseFinalizerAgent":
-            final_response = event["data"].get("output", {}).get("final_response")
-            if final_response:
-                data = {"type": "final_response", "content": final_response}
-                yield f"data: {json.dumps(data)}\n\n"
+    events = guarded_stream(
+        graph_app.astream_events(initial_state, config, version="v2"),
+        is_disconnected, settings.CHAT_REQUEST_TIMEOUT, settings.SSE_DISCONNECT_POLL_INTERVAL,
+        wake_in=chunks.flush_in,
+    )
+    try:
+        async with aclosing(events):
+            async for event in events:
+                # Модель замолчала посреди ответа: накопленное уходит по сроку
+                if event is IDLE:
+                    for data in chunks.flush_due():
+                        yield sse_event(data)
+                    continue
+
+                kind = event["event"]
+
+                # Токены ответа узлов из SSE_STREAM_NODES отправляются по мере генерации
+                if kind == "on_chat_model_stream":
+                    node = event.get("metadata", {}).get("langgraph_node")
+                    if node in settings.SSE_STREAM_NODES:
+                        for data in chunks.add(node, event["data"]["chunk"].content):
+                            if first_token_at is None:
+                                first_token_at = time.monotonic()
+                                logger.info("Первый токен ответа через %.0f мс (%s)",
+                                            (first_token_at - started) * 1000, node)
+                            yield sse_event(data)
+                    continue
+
+                # Остаток токенов уходит раньше любого следующего события
+                for data in chunks.flush():
+                    yield sse_event(data)
+
+                # Запуск самого узла графа, а не вложенной в него цепочки
+                if timings and event["name"] == event.get("metadata", {}).get("langgraph_node"):
+                    if kind == "on_chain_start":
+                        node_started[event["run_id"]] = time.monotonic()
+                    elif kind == "on_chain_end" and event["run_id"] in node_started:
+                        duration = time.monotonic() - node_started.pop(event["run_id"])
+                        yield sse_event({'type': 'node_end', 'node': event["name"], 'duration_ms': duration * 1000})
+
+                # Ответ, в котором участвовала база знаний, кэшируется только для пользователя
+                if kind == "on_chain_end" and event["name"] == "LegalSearchAgent":
+                    used_kb = True
+
+                # Отправляем события о вызове инструментов
+                if kind == "on_tool_start":
+                    data = {
+                        "type": "tool_start",
+                        "tool": event['name'],
+                        "input": event['data'].get('input')
+                    }
+                    yield sse_event(data)
+
+                # Отправляем события о завершении инструментов
+                elif kind == "on_tool_end":
+                    data = {
+                        "type": "tool_end",
+                        "tool": event['name'],
+                    }
+                    yield sse_event(data)
+
+                # Промежуточные результаты анализа документов по мере готовности пачек
+                elif kind == "on_custom_event" and event["name"] == "analysis_partial":
+                    data = {"type": "analysis_partial", **event["data"]}
+                    yield sse_event(data)
+
+                # Вызов LLM ждет бюджета модели: позиция в очереди (0 — допущен)
+                elif kind == "on_custom_event" and event["name"] == "llm_queue":
+                    yield sse_event({"type": "queue_position", **event["data"]})
+
+                # Полный ответ, когда он появляется в состоянии: клиенту, получавшему
+                # llm_chunk, он заменяет собранный из пачек текст
+                elif kind == "on_chain_end" and event["name"] == "ResponseFinalizerAgent":
+                    final_response = event["data"].get("output", {}).get("final_response")
+                    if final_response:
+                        data = {"type": "final_response", "content": final_response}
+                        yield sse_event(data)
+    except ClientDisconnected:
+        logger.info("Клиент отключился, запуск графа в треде %s отменен", thread_id)
+        return
+    except DeadlineExceeded:
+        logger.warning("Истек срок запроса в треде %s (%s с)", thread_id, settings.CHAT_REQUEST_TIMEOUT)
+        if final_response:
+            # Ответ уже отправлен, не успело только сжатие истории
+            yield sse_event({'type': 'stream_end'})
+            return
+        for data in chunks.flush():
+            yield sse_event(data)
+        yield sse_event({'type': 'deadline_exceeded', 'timeout': settings.CHAT_REQUEST_TIMEOUT})
+        # Частичный ответ не кэшируется и не пишется в тред: запуск можно продолжить
+        yield sse_event({'type': 'final_response', 'content': await _partial_answer(config, chunks), 'partial': True})
+        yield sse_event({'type': 'stream_end'})
+        return
+
+    for data in chunks.flush():
+        yield sse_event(data)
 
     # Сигнал о завершении потока
-    yield f"data: {json.dumps({'type': 'stream_end'})}\n\n"
+    yield sse_event({'type': 'stream_end'})
+
+    if lookup and final_response:
+        await _store_cached_answer(lookup, query, user_id, used_kb, final_response)
+
 
 @router.post("/stream")
 async def stream_chat(
     chat_request: ChatRequest,
-    current_user: Annotated
+    request: Request,
+    current_user: Annotated[User, Depends(get_current_user)]
 ):
     """
     Основной эндпоинт для взаимодействия с агентом.
     Принимает запрос и возвращает потоковый ответ с обновлениями статуса.
     """
     user_id = current_user.id
+    if chat_request.thread_id is not None:
+        await _check_thread_owner(chat_request.thread_id, user_id)
     thread_id = chat_request.thread_id or f"thread_{user_id}_{uuid.uuid4()}"
-    
+
     return StreamingResponse(
-        event_stream_generator(thread_id, user_id, chat_request.query),
+        event_stream_generator(
+            thread_id, user_id, chat_request.query,
+            # Кэш ответов — только для первого вопроса треда
+            use_cache=chat_request.thread_id is None,
+            is_disconnected=request.is_disconnected,
+            resume=chat_request.resume and chat_request.thread_id is not None,
+            timings=chat_request.timings,
+        ),
         media_type="text/event-stream"
-    )
\ No newline at end of file
+    )
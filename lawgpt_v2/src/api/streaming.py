@@ -0,0 +1,157 @@
+# src/api/streaming.py
+
+import asyncio
+import json
+import time
+from contextlib import aclosing, suppress
+from typing import AsyncIterator, Awaitable, Callable
+
+from src.core.config import settings
+
+
+def sse_event(data: dict) -> str:
+    """Кадр Server-Sent Events с JSON-данными."""
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class ChunkCoalescer:
+    """
+    Собирает токены LLM в пачки для событий llm_chunk.
+    Первый токен узла уходит сразу (время до первого токена), дальше пачка
+    отправляется, когда набрала SSE_CHUNK_MAX_CHARS символов или ждет дольше
+    SSE_CHUNK_MAX_DELAY секунд. Срок проверяется и без новых токенов: поток
+    будит потребителя через flush_in, и тот забирает пачки flush_due.
+    Буферы у каждого узла свои: синтез и финализатор не перемешиваются.
+    """
+
+    def __init__(self, max_chars: int | None = None, max_delay: float | None = None):
+        self.max_chars = max_chars or settings.SSE_CHUNK_MAX_CHARS
+        self.max_delay = max_delay if max_delay is not None else settings.SSE_CHUNK_MAX_DELAY
+        self._buffers: dict[str, list[str]] = {}
+        self._sizes: dict[str, int] = {}
+        self._started: dict[str, float] = {}
+        self._seen: set[str] = set()
+        self._streamed: dict[str, list[str]] = {}
+
+    def add(self, node: str, text: str) -> list[dict]:
+        """Добавляет токен; возвращает события, которые пора отправить."""
+        if not text:
+            return []
+        self._streamed.setdefault(node, []).append(text)
+        if node not in self._seen:
+            self._seen.add(node)
+            return [self._event(node, text)]
+        if node not in self._buffers:
+            self._buffers[node], self._sizes[node] = [], 0
+            self._started[node] = time.monotonic()
+        self._buffers[node].append(text)
+        self._sizes[node] += len(text)
+        if self._sizes[node] >= self.max_chars or time.monotonic() - self._started[node] >= self.max_delay:
+            return [self._take(node)]
+        return []
+
+    def flush(self) -> list[dict]:
+        """Отправляет все накопленное (перед другими событиями и в конце потока)."""
+        return [self._take(node) for node in list(self._buffers)]
+
+    def flush_in(self) -> float | None:
+        """Секунды до срока самой старой пачки; None — отправлять нечего."""
+        if not self._started:
+            return None
+        return max(0.0, min(self._started.values()) + self.max_delay - time.monotonic())
+
+    def flush_due(self) -> list[dict]:
+        """Пачки, которые ждут дольше max_delay: модель замолчала посреди ответа."""
+        now = time.monotonic()
+        return [self._take(node) for node, started in list(self._started.items()) if now - started >= self.max_delay]
+
+    def streamed(self, node: str) -> str:
+        """Весь текст узла, полученный к этому моменту (для частичного ответа)."""
+        return "".join(self._streamed.get(node, ()))
+
+    def _take(self, node: str) -> dict:
+        text = "".join(self._buffers.pop(node))
+        del self._sizes[node], self._started[node]
+        return self._event(node, text)
+
+    @staticmethod
+    def _event(node: str, text: str) -> dict:
+        return {"type": "llm_chunk", "node": node, "content": text}
+
+
+class ClientDisconnected(Exception):
+    """Клиент SSE закрыл соединение."""
+
+
+class DeadlineExceeded(TimeoutError):
+    """Истек срок обработки запроса."""
+
+
+_END = object()
+# Элемент guarded_stream: подошел срок wake_in, а нового события нет
+IDLE = object()
+
+
+async def guarded_stream(
+    events: AsyncIterator,
+    is_disconnected: Callable[[], Awaitable[bool]],
+    timeout: float,
+    poll_interval: float,
+    wake_in: Callable[[], float | None] | None = None,
+) -> AsyncIterator:
+    """
+    Перебирает events в отдельной задаче и останавливает ее, если клиент
+    отключился (ClientDisconnected) или истек timeout секунд (DeadlineExceeded).
+    Отмена задачи закрывает astream_events, а тот отменяет запуск графа вместе
+    с незавершенными вызовами LLM и инструментов. Отключение проверяется и
+    тогда, когда граф долго ничего не отправляет: при ASGI 2.4 сервер сообщает
+    о нем только при записи в сокет.
+    wake_in — через сколько секунд потребителю нужно управление без нового
+    события (None — не нужно); в этот момент выдается IDLE.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+
+    async def produce():
+        try:
+            async with aclosing(events):
+                async for event in events:
+                    await queue.put(event)
+        except Exception as exc:
+            await queue.put(exc)
+        else:
+            await queue.put(_END)
+
+    producer = asyncio.create_task(produce())
+    checked = loop.time()
+    try:
+        while True:
+            now = loop.time()
+            if now >= deadline:
+                raise DeadlineExceeded()
+            # Не чаще раза в poll_interval, даже если события идут непрерывно
+            if now - checked >= poll_interval:
+                checked = now
+                if await is_disconnected():
+                    raise ClientDisconnected()
+            wait = min(poll_interval, deadline - now)
+            if wake_in is not None and (idle := wake_in()) is not None:
+                if idle <= 0:
+                    yield IDLE
+                    continue
+                wait = min(wait, idle)
+            try:
+                item = await asyncio.wait_for(queue.get(), wait)
+            except TimeoutError:
+                continue
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Сюда попадаем и при закрытии генератора сервером (отключение при ASGI < 2.4)
+        producer.cancel()
+        with suppress(asyncio.CancelledError):
+            await producer
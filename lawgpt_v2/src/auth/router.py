@@ -13,8 +13,9 @@ from src.auth.models import User
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
+
 @router.post("/register", response_model=schemas.UserOut, status_code=status.HTTP_201_CREATED)
-async def register_user(user_in: schemas.UserCreate, db: Annotated):
+async def register_user(user_in: schemas.UserCreate, db: Annotated[AsyncSession, Depends(get_db)]):
     """Создание нового пользователя."""
     hashed_password = security.get_password_hash(user_in.password)
     new_user = models.User(
@@ -34,10 +35,11 @@ async def register_user(user_in: schemas.UserCreate, db: Annotated):
         )
     return new_user
 
+
 @router.post("/token", response_model=schemas.Token)
 async def login_for_access_token(
-    form_data: Annotated,
-    db: Annotated
+    form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
+    db: Annotated[AsyncSession, Depends(get_db)]
 ):
     """Аутентификация пользователя и возврат JWT токена."""
     query = select(User).where(User.username == form_data.username)
@@ -56,7 +58,8 @@ async def login_for_access_token(
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
+
 @router.get("/users/me", response_model=schemas.UserOut)
-async def read_users_me(current_user: Annotated):
+async def read_users_me(current_user: Annotated[User, Depends(security.get_current_user)]):
     """Получение информации о текущем пользователе."""
-    return current_user
\ No newline at end of file
+    return current_user
@@ -2,22 +2,26 @@
 
 from pydantic import BaseModel, EmailStr
 
+
 class Token(BaseModel):
     access_token: str
     token_type: str
 
+
 class TokenData(BaseModel):
     username: str | None = None
 
+
 class UserCreate(BaseModel):
     username: str
     email: EmailStr
     password: str
 
+
 class UserOut(BaseModel):
     id: int
     username: str
     email: EmailStr
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
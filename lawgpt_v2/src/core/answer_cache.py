@@ -0,0 +1,102 @@
+# src/core/answer_cache.py
+
+from dataclasses import dataclass
+
+from sqlalchemy import text
+
+from src.core.config import settings
+from src.core.metrics import record_cache
+from src.db.session import session_manager
+
+# Семантический кэш ответов графа. Похожий вопрос (скалярное произведение
+# нормированных эмбеддингов не ниже ANSWER_CACHE_THRESHOLD) получает готовый
+# ответ без запуска графа. Ответы, построенные на базе знаний пользователя,
+# видны только ему и действуют, пока его база знаний не изменилась; ответы
+# без базы знаний (веб, общие знания модели) общие для всех пользователей.
+
+SHARED_SCOPE = "shared"
+
+
+def user_scope(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+@dataclass
+class AnswerLookup:
+    """Результат поиска в кэше; нужен и для последующей записи ответа."""
+    embedding: list[float]
+    model: str
+    kb_version: int
+    answer: str | None = None
+    similarity: float | None = None
+
+    @property
+    def hit(self) -> bool:
+        return self.answer is not None
+
+
+async def lookup_answer(embedding: list[float], model: str, user_id: int) -> AnswerLookup:
+    """
+    Ищет ближайший кэшированный ответ в областях пользователя и общей.
+    Версия базы знаний читается тем же запросом: ответ, вычисленный до ее
+    изменения, будет сохранен со старой версией и не найдется.
+    """
+    async with session_manager.session() as session:
+        row = (await session.execute(text("""
+            WITH version AS (
+                SELECT COALESCE(
+                    (SELECT version FROM knowledge_base_versions WHERE owner_id = :user_id), 0
+                ) AS current
+            )
+            SELECT version.current AS kb_version, hit.answer, hit.similarity
+            FROM version
+            LEFT JOIN LATERAL (
+                SELECT answer, -(embedding <#> :embedding) AS similarity
+                FROM answer_cache
+                WHERE model = :model
+                  AND created_at > now() - make_interval(secs => :ttl)
+                  AND (scope = :shared OR (scope = :user_scope AND kb_version = version.current))
+                ORDER BY embedding <#> :embedding
+                LIMIT 1
+            ) hit ON true
+        """), {
+            "user_id": user_id, "embedding": embedding, "model": model,
+            "ttl": float(settings.ANSWER_CACHE_TTL), "shared": SHARED_SCOPE, "user_scope": user_scope(user_id),
+        })).one()
+    lookup = AnswerLookup(embedding, model, row.kb_version)
+    if row.answer is not None and row.similarity >= settings.ANSWER_CACHE_THRESHOLD:
+        lookup.answer, lookup.similarity = row.answer, float(row.similarity)
+    record_cache("answer", "hit" if lookup.hit else "miss")
+    return lookup
+
+
+async def store_answer(lookup: AnswerLookup, query: str, user_id: int, used_knowledge_base: bool, answer: str):
+    """Сохраняет ответ и удаляет самые старые записи сверх ANSWER_CACHE_MAX_ENTRIES в области."""
+    scope = user_scope(user_id) if used_knowledge_base else SHARED_SCOPE
+    async with session_manager.session() as session:
+        await session.execute(text("""
+            INSERT INTO answer_cache (scope, model, kb_version, query, embedding, answer)
+            VALUES (:scope, :model, :kb_version, :query, :embedding, :answer)
+        """), {
+            "scope": scope, "model": lookup.model, "kb_version": lookup.kb_version,
+            "query": query, "embedding": lookup.embedding, "answer": answer,
+        })
+        await session.execute(text("""
+            DELETE FROM answer_cache WHERE id IN (
+                SELECT id FROM answer_cache WHERE scope = :scope
+                ORDER BY created_at DESC OFFSET :max_entries
+            )
+        """), {"scope": scope, "max_entries": settings.ANSWER_CACHE_MAX_ENTRIES})
+        await session.commit()
+
+
+async def bump_kb_version(session, owner_id: int):
+    """
+    Отмечает изменение базы знаний пользователя. Вызывается в транзакции,
+    которая меняет knowledge_base, поэтому кэш не переживет изменение.
+    """
+    await session.execute(text("""
+        INSERT INTO knowledge_base_versions (owner_id, version) VALUES (:owner_id, 1)
+        ON CONFLICT (owner_id) DO UPDATE SET version = knowledge_base_versions.version + 1
+    """), {"owner_id": owner_id})
+    await session.execute(text("DELETE FROM answer_cache WHERE scope = :scope"), {"scope": user_scope(owner_id)})
@@ -9,4 +9,9 @@ celery_app = Celery(
 
 celery_app.conf.task_routes = {  # Пример маршрутизации задач
     # 'src.tasks.example_task': {'queue': 'default'},
+    # Загрузка документов — отдельные воркеры, чтобы длинные файлы не задерживали
+    # остальные задачи: celery -A src.tasks worker -Q ingest --concurrency 2
+    'src.tasks.ingest_document': {'queue': 'ingest'},
 }
+# Длинные задачи: воркер не резервирует следующие, пока не закончит текущую
+celery_app.conf.worker_prefetch_multiplier = 1
@@ -1,12 +1,12 @@
 # src/core/config.py
 
-import os
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
 # Загружаем переменные окружения из файла.env
 load_dotenv()
 
+
 class Settings(BaseSettings):
     """
     Pydantic-модель для хранения настроек приложения.
@@ -16,17 +16,176 @@ class Settings(BaseSettings):
     DATABASE_URL: str
     REDIS_URL: str
 
+    # Пул соединений с БД (общий для API и инструментов графа)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 500  # 0 — отключить (например, за PgBouncer)
+    DB_ECHO: bool = False
+
     # JWT Authentication
     SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
 
+    # Общий пул соединений Redis (кэши, блокировки)
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT: int = 5
+
+    # Эмбеддинги. text-embedding-3-* укорачиваются параметром dimensions без
+    # переобучения; смена модели или размерности — через src.utils.reembed_knowledge_base
+    EMBEDDING_MODEL: str = "text-embedding-3-large"
+    EMBEDDING_DIMENSIONS: int = 1536  # родная размерность text-embedding-3-large — 3072
+    # HNSW по эмбеддингам: 'vector' | 'halfvec' | 'binary' (см. src/db/knowledge_base.py)
+    KB_VECTOR_INDEX: str = "vector"
+    KB_RERANK_OVERSAMPLE: int = 4  # кандидатов из квантованного индекса на один результат
+
+    # Кэш эмбеддингов: локальный LRU + Redis
+    EMBEDDING_CACHE_LOCAL_SIZE: int = 10_000
+    EMBEDDING_CACHE_LOCAL_TTL: int = 3600
+    EMBEDDING_CACHE_REDIS_ENABLED: bool = True
+    EMBEDDING_CACHE_REDIS_TTL: int = 30 * 24 * 3600
+
+    # Кэш поиска в интернете в Redis. Класс запроса: 'news' (новости, изменения,
+    # даты) | 'reference' (определения, нормы). После срока свежести результат
+    # еще WEB_SEARCH_STALE_TTL отдается из кэша и обновляется в фоне
+    WEB_SEARCH_CACHE_ENABLED: bool = True
+    WEB_SEARCH_FRESH_TTL: dict[str, int] = {"news": 15 * 60, "reference": 7 * 24 * 3600}
+    WEB_SEARCH_STALE_TTL: dict[str, int] = {"news": 60 * 60, "reference": 30 * 24 * 3600}
+    WEB_SEARCH_REFRESH_LOCK_TTL: int = 60
+
+    # Чекпоинты графа в Redis
+    CHECKPOINT_TTL_MINUTES: int = 30 * 24 * 60  # срок жизни треда, продлевается при обращении
+    CHECKPOINT_OFFLOAD_MIN_BYTES: int = 2048  # значения крупнее хранятся отдельно, по ссылке
+    CHECKPOINT_COMPRESSION_LEVEL: int = 3
+    CHECKPOINT_REF_CACHE_SIZE: int = 10_000
+
+    # История длинных тредов: окно последних сообщений + краткое содержание ранних
+    HISTORY_WINDOW_TOKENS: int = 2000
+    HISTORY_MAX_TOKENS: int = 4000  # при превышении ранние сообщения сворачиваются
+    HISTORY_SUMMARY_MAX_TOKENS: int = 600
+
+    # Объединение одинаковых одновременных запросов: поиск, эмбеддинги (src/core/single_flight.py)
+    SINGLE_FLIGHT_ENABLED: bool = True
+    SINGLE_FLIGHT_REDIS_ENABLED: bool = False  # и между воркерами, через блокировки Redis
+    SINGLE_FLIGHT_LOCK_TTL: float = 30.0  # предел ожидания ведущего из другого воркера
+    SINGLE_FLIGHT_RESULT_TTL: float = 10.0
+    SINGLE_FLIGHT_POLL_INTERVAL: float = 0.05
+
+    # Семантический кэш ответов графа
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_THRESHOLD: float = 0.95  # минимальное косинусное сходство вопросов
+    ANSWER_CACHE_TTL: int = 24 * 3600  # ответы с веб-поиском устаревают
+    ANSWER_CACHE_MAX_ENTRIES: int = 2000  # на область (пользователь или общая)
+
+    # Планы координатора: правила для типовых запросов и кэш по намерению
+    PLAN_RULES_ENABLED: bool = True
+    PLAN_RULES_MIN_CONFIDENCE: float = 0.8
+    PLAN_CACHE_TTL: int = 7 * 24 * 3600
+    PLAN_CACHE_LOCAL_SIZE: int = 5000
+
+    # Срок обработки запроса чата: по истечении клиент получает частичный ответ
+    CHAT_REQUEST_TIMEOUT: float = 180.0
+    SSE_DISCONNECT_POLL_INTERVAL: float = 1.0  # секунд между проверками отключения клиента
+
+    # Контекст финализатора: общий бюджет и пределы на аргумент и один документ
+    FINALIZER_CONTEXT_TOKENS: int = 8000
+    FINALIZER_ARGUMENT_TOKENS: int = 2000
+    FINALIZER_DOCUMENT_TOKENS: int = 800
+
+    # Потоковая передача ответа: токены каких узлов отправлять событиями llm_chunk
+    SSE_STREAM_NODES: list[str] = ["ResponseFinalizerAgent", "CaseLawSynthesisAgent"]
+    SSE_CHUNK_MAX_CHARS: int = 64
+    SSE_CHUNK_MAX_DELAY: float = 0.05  # секунд
+
+    # Оценка релевантности поиска: 'hybrid' (локально, LLM для пограничных) | 'local' | 'llm'
+    RELEVANCE_EVALUATOR: str = "hybrid"
+    RELEVANCE_TOP_N: int = 3  # оценка поиска — среднее по лучшим документам
+    RELEVANCE_ACCEPT: float = 0.6  # не ниже — Relevant без LLM
+    RELEVANCE_REJECT: float = 0.25  # не выше — Irrelevant без LLM
+    # Калибровка сигналов в [0, 1]: ниже LOW — 0, выше HIGH — 1
+    # (см. benchmarks/calibrate_relevance.py)
+    RELEVANCE_SIMILARITY_LOW: float = 0.2  # косинусное сходство text-embedding-3
+    RELEVANCE_SIMILARITY_HIGH: float = 0.5
+    RELEVANCE_FTS_RANK_LOW: float = 0.0  # ts_rank c FTS_RANK_NORMALIZATION=33
+    RELEVANCE_FTS_RANK_HIGH: float = 0.1
+    RELEVANCE_WEB_SCORE_LOW: float = 0.3  # оценка Tavily
+    RELEVANCE_WEB_SCORE_HIGH: float = 0.8
+
+    # Гибридный поиск по базе знаний
+    HYBRID_SEARCH_MODE: str = "parallel"  # 'sequential' | 'parallel' | 'fused'
+    HYBRID_SEARCH_TOP_K: int = 10
+    HYBRID_SEARCH_BRANCH_LIMIT: int = 10
+    RRF_K: int = 60
+    # ANN-поиск по арендаторам: 'auto' | 'exact' | 'hnsw'
+    KB_ANN_STRATEGY: str = "auto"
+    KB_EXACT_SCAN_MAX_ROWS: int = 20_000
+    KB_EF_SEARCH_MIN: int = 40
+    KB_EF_SEARCH_MAX: int = 1000
+    KB_EF_SEARCH_OVERSAMPLE: float = 2.0
+    KB_HNSW_ITERATIVE_SCAN: str = "relaxed_order"  # 'off' для pgvector < 0.8
+    KB_TENANT_STATS_TTL: int = 300
+    KB_PARTITIONS: int = 0  # число HASH-секций knowledge_base по owner_id (0 — без секций)
+    # Полнотекстовый поиск
+    FTS_CONFIG: str = "russian"
+    FTS_QUERY_PARSER: str = "websearch"  # 'websearch' | 'plain'
+    FTS_RANK_NORMALIZATION: int = 33  # 1 (длина документа) | 32 (rank / (rank + 1))
+    KB_DOC_TOKEN_BUDGET: int = 800
+    KB_HEADLINE_OPTIONS: str = "MaxFragments=2, MaxWords=35, MinWords=15, StartSel=**, StopSel=**"
+
+    # Map-reduce анализ документов
+    ANALYSIS_BATCH_TOKENS: int = 6000
+    ANALYSIS_MAX_CONCURRENCY: int = 4
+
+    # Загрузка документов в базу знаний (задачи Celery)
+    INGEST_PAGE_WINDOW: int = 20  # страниц на окно: разбор → эмбеддинги → COPY → прогресс
+    INGEST_PARSE_PREFETCH: int = 2  # окон, разобранных впрок, пока идут эмбеддинги
+    INGEST_WRITE_QUEUE: int = 2  # окон с готовыми эмбеддингами в очереди на COPY
+    INGEST_CHUNK_TOKENS: int = 500
+    INGEST_CHUNK_OVERLAP: int = 50
+    INGEST_EMBED_BATCH_SIZE: int = 128  # текстов в одном вызове API эмбеддингов
+    INGEST_EMBED_CONCURRENCY: int = 4
+    INGEST_DOCX_PARAGRAPHS_PER_PAGE: int = 40  # в DOCX нет страниц — окно из абзацев
+    INGEST_MAX_RETRIES: int = 5
+    EMBEDDING_PRICE_PER_1M_TOKENS: float = 0.13  # для отчета о сэкономленных расходах
+
     # LLMs and External Services
     OPENAI_API_KEY: str
     TAVILY_API_KEY: str
     SMART_LLM_MODEL: str = "gpt-4o"
     FAST_LLM_MODEL: str = "gpt-4o-mini"
 
+    # HTTP-клиенты LLM: общий keep-alive пул и лимиты на модель
+    LLM_TIMEOUT: float = 120.0
+    LLM_CONNECT_TIMEOUT: float = 5.0
+    LLM_POOL_TIMEOUT: float = 30.0
+    LLM_MAX_RETRIES: int = 2
+    LLM_MAX_CONNECTIONS: int = 100
+    LLM_KEEPALIVE_EXPIRY: float = 60.0
+    LLM_HTTP2: bool = True
+    SMART_LLM_MAX_CONCURRENCY: int = 16
+    FAST_LLM_MAX_CONCURRENCY: int = 32
+
+    # Допуск запросов к LLM: бюджеты в минуту на модель, общие для всех воркеров
+    # (src/agents/llm_scheduler.py). Модели без лимитов не ограничиваются
+    LLM_ADMISSION_ENABLED: bool = True
+    LLM_RPM_LIMITS: dict[str, int] = {"gpt-4o": 500, "gpt-4o-mini": 500}
+    LLM_TPM_LIMITS: dict[str, int] = {"gpt-4o": 30000, "gpt-4o-mini": 200000}
+    LLM_ADMISSION_COMPLETION_TOKENS: int = 1000  # оценка ответа, если max_tokens не задан
+    LLM_ADMISSION_POSITION_INTERVAL: float = 1.0  # не чаще одного события llm_queue в N секунд
+
+    # Запись/воспроизведение ответов OpenAI и Tavily для нагрузочных тестов (src/core/replay.py)
+    REPLAY_MODE: str = "off"  # 'off' | 'record' | 'replay'
+    REPLAY_CASSETTE_DIR: str = "benchmarks/cassettes"
+    REPLAY_LATENCY_SCALE: float = 1.0  # множитель записанных задержек
+    REPLAY_LATENCY_MS: float | None = None  # фиксированная задержка вместо записанной
+
+    # Метрики Prometheus на /metrics (src/core/metrics.py). При False
+    # инструментирование не подключается и эндпоинт не регистрируется
+    METRICS_ENABLED: bool = False
+
     # LangSmith Observability
     LANGCHAIN_TRACING_V2: str = "true"
     LANGCHAIN_API_KEY: str
@@ -37,9 +196,10 @@ class Settings(BaseSettings):
         env_file_encoding = "utf-8"
         case_sensitive = True
 
+
 # Глобальный экземпляр настроек для импорта в другие модули
 settings = Settings()
 
 # Отдельные переменные для Celery, чтобы избежать проблем с интроспекцией Pydantic
 CELERY_BROKER_URL: str = settings.REDIS_URL
-CELERY_RESULT_BACKEND: str = settings.REDIS_URL
\ No newline at end of file
+CELERY_RESULT_BACKEND: str = settings.REDIS_URL
@@ -0,0 +1,179 @@
+# src/core/embedding_cache.py
+
+import hashlib
+import logging
+import time
+from array import array
+from collections import OrderedDict
+
+from langchain_core.embeddings import Embeddings
+from redis.exceptions import RedisError
+
+from src.core.config import settings
+from src.core.metrics import observe_embedding, record_cache
+from src.core.redis_client import get_redis
+from src.core.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """Простой in-process LRU с TTL на запись."""
+
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, list[float]]] = OrderedDict()
+
+    def get(self, key: str):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def delete_prefix(self, prefix: str):
+        for key in [key for key in self._data if key.startswith(prefix)]:
+            del self._data[key]
+
+    def __len__(self):
+        return len(self._data)
+
+
+def _pack(vector: list[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(raw: bytes) -> list[float]:
+    vector = array("f")
+    vector.frombytes(raw)
+    return vector.tolist()
+
+
+def embedding_namespace(embeddings: Embeddings) -> str:
+    """Модель и размерность: векторы из разных пространств имен несравнимы."""
+    model = getattr(embeddings, "model", type(embeddings).__name__)
+    dimensions = getattr(embeddings, "dimensions", None) or "native"
+    return f"{model}:{dimensions}"
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Двухуровневый кэш эмбеддингов поверх любой модели LangChain.
+
+    Ключ — SHA-256 текста в пространстве имен модели и размерности, поэтому
+    смена модели или `dimensions` не может вернуть вектор чужой размерности.
+    Локальный уровень ограничен по размеру (LRU) и времени жизни; в Redis
+    записи живут EMBEDDING_CACHE_REDIS_TTL секунд, а вытеснение по памяти
+    обеспечивает политика maxmemory (volatile-lru) самого Redis.
+    """
+
+    def __init__(self, underlying: Embeddings, use_redis: bool | None = None):
+        self.underlying = underlying
+        self.model = embedding_namespace(underlying)
+        self.namespace = f"emb:{self.model}"
+        self.local = LRUCache(settings.EMBEDDING_CACHE_LOCAL_SIZE, settings.EMBEDDING_CACHE_LOCAL_TTL)
+        self.use_redis = settings.EMBEDDING_CACHE_REDIS_ENABLED if use_redis is None else use_redis
+        self.redis_ttl = settings.EMBEDDING_CACHE_REDIS_TTL
+        self.stats = {"local_hits": 0, "redis_hits": 0, "misses": 0}
+        # Один и тот же вопрос от нескольких запросов сразу эмбеддится один раз
+        self._flights = SingleFlight(self.namespace)
+
+    def key(self, text: str) -> str:
+        return f"{self.namespace}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def hit_rate(self) -> float:
+        total = sum(self.stats.values())
+        return (self.stats["local_hits"] + self.stats["redis_hits"]) / total if total else 0.0
+
+    # --- Асинхронный интерфейс ---
+
+    async def aembed_query(self, text: str) -> list[float]:
+        # Ключ — точный текст: вектор зависит и от регистра, и от пробелов
+        return await self._flights.do(self.key(text), lambda: self._aembed_one(text))
+
+    async def _aembed_one(self, text: str) -> list[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self.key(text) for text in texts]
+        results: dict[str, list[float]] = {}
+
+        for key in keys:
+            vector = self.local.get(key)
+            if vector is not None:
+                results[key] = vector
+                self.stats["local_hits"] += 1
+                record_cache("embedding", "local_hit")
+
+        pending = [key for key in dict.fromkeys(keys) if key not in results]
+        if pending and self.use_redis:
+            for key, vector in zip(pending, await self._redis_get_many(pending)):
+                if vector is not None:
+                    results[key] = vector
+                    self.local.set(key, vector)
+                    self.stats["redis_hits"] += 1
+                    record_cache("embedding", "redis_hit")
+
+        # Одинаковые тексты внутри пачки эмбеддятся один раз
+        missing = {key: text for key, text in zip(keys, texts) if key not in results}
+        if missing:
+            self.stats["misses"] += len(missing)
+            record_cache("embedding", "miss", len(missing))
+            started = time.perf_counter()
+            vectors = await self.underlying.aembed_documents(list(missing.values()))
+            observe_embedding(self.model, len(missing), time.perf_counter() - started)
+            fresh = dict(zip(missing.keys(), vectors))
+            for key, vector in fresh.items():
+                self.local.set(key, vector)
+            results.update(fresh)
+            if self.use_redis:
+                await self._redis_set_many(fresh)
+
+        return [results[key] for key in keys]
+
+    async def _redis_get_many(self, keys: list[str]) -> list[list[float] | None]:
+        try:
+            raw = await get_redis().mget(keys)
+        except RedisError as exc:
+            logger.warning("Кэш эмбеддингов в Redis недоступен: %s", exc)
+            return [None] * len(keys)
+        return [_unpack(item) if item is not None else None for item in raw]
+
+    async def _redis_set_many(self, vectors: dict[str, list[float]]):
+        try:
+            async with get_redis().pipeline(transaction=False) as pipe:
+                for key, vector in vectors.items():
+                    pipe.set(key, _pack(vector), ex=self.redis_ttl)
+                await pipe.execute()
+        except RedisError as exc:
+            logger.warning("Не удалось записать эмбеддинги в Redis: %s", exc)
+
+    # --- Синхронный интерфейс (только локальный уровень) ---
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self.key(text) for text in texts]
+        results = {key: self.local.get(key) for key in keys}
+        missing = {key: text for key, text in zip(keys, texts) if results[key] is None}
+        self.stats["local_hits"] += len(keys) - len(missing)
+        record_cache("embedding", "local_hit", len(keys) - len(missing))
+        if missing:
+            self.stats["misses"] += len(missing)
+            record_cache("embedding", "miss", len(missing))
+            for key, vector in zip(missing, self.underlying.embed_documents(list(missing.values()))):
+                self.local.set(key, vector)
+                results[key] = vector
+        return [results[key] for key in keys]
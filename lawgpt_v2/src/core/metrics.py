@@ -0,0 +1,212 @@
+# src/core/metrics.py
+
+import functools
+import os
+import time
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+
+from src.core.config import settings
+
+# Метрики Prometheus: задержки узлов графа, вызовов LLM, эмбеддингов и SQL,
+# токены, повторы запросов к OpenAI и попадания в кэши. При METRICS_ENABLED=False
+# обертки, колбэки и слушатели не подключаются вовсе, а функции записи
+# возвращаются сразу, так что стоимость — одна проверка флага.
+# С несколькими воркерами uvicorn задайте PROMETHEUS_MULTIPROC_DIR: /metrics
+# соберет значения всех процессов.
+
+ENABLED = settings.METRICS_ENABLED
+
+# Узлы и LLM — от десятков миллисекунд до минут
+_SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160)
+_FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+NODE_DURATION = Histogram(
+    "lawgpt_node_duration_seconds", "Время выполнения узла графа", ["node", "status"], buckets=_SLOW_BUCKETS,
+)
+LLM_DURATION = Histogram(
+    "lawgpt_llm_duration_seconds", "Время вызова LLM", ["model", "node", "status"], buckets=_SLOW_BUCKETS,
+)
+LLM_FIRST_TOKEN = Histogram(
+    "lawgpt_llm_first_token_seconds", "Время до первого токена потокового вызова LLM", ["model", "node"],
+    buckets=_SLOW_BUCKETS,
+)
+LLM_TOKENS = Counter("lawgpt_llm_tokens_total", "Токены LLM", ["model", "node", "kind"])
+LLM_QUEUE_WAIT = Histogram(
+    "lawgpt_llm_queue_wait_seconds", "Ожидание допуска к LLM по бюджету RPM/TPM", ["model", "priority"],
+    buckets=(0,) + _SLOW_BUCKETS,
+)
+LLM_RETRIES = Counter(
+    "lawgpt_llm_retries_total", "Ответы OpenAI, после которых клиент повторяет запрос", ["model", "status"],
+)
+EMBEDDING_DURATION = Histogram(
+    "lawgpt_embedding_duration_seconds", "Время запроса эмбеддингов к модели", ["model"], buckets=_FAST_BUCKETS,
+)
+EMBEDDING_TEXTS = Counter("lawgpt_embedding_texts_total", "Тексты, отправленные модели эмбеддингов", ["model"])
+SQL_DURATION = Histogram(
+    "lawgpt_sql_duration_seconds", "Время выполнения SQL-запроса", ["operation"], buckets=_FAST_BUCKETS,
+)
+CACHE_REQUESTS = Counter("lawgpt_cache_requests_total", "Обращения к кэшам", ["cache", "result"])
+
+# --- Узлы графа ---
+
+
+def instrument_node(name: str, func):
+    """Оборачивает асинхронный узел графа замером времени и статуса."""
+    if not ENABLED:
+        return func
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        status = "error"
+        try:
+            result = await func(*args, **kwargs)
+            status = "ok"
+            return result
+        finally:
+            NODE_DURATION.labels(name, status).observe(time.perf_counter() - started)
+
+    return wrapper
+
+# --- LLM ---
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """
+    Колбэк модели чата: задержка, время до первого токена и токены по узлу
+    графа (metadata langgraph_node). Выполняется в потоке event loop.
+    """
+
+    run_inline = True
+
+    def __init__(self, model: str):
+        self.model = model
+        self._runs: dict[UUID, list] = {}
+
+    def on_chat_model_start(self, serialized: dict, messages: list, *, run_id: UUID,
+                            metadata: dict | None = None, **kwargs: Any):
+        node = (metadata or {}).get("langgraph_node", "none")
+        # [узел, начало, первый токен получен]
+        self._runs[run_id] = [node, time.perf_counter(), False]
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any):
+        run = self._runs.get(run_id)
+        if run and not run[2] and token:
+            run[2] = True
+            LLM_FIRST_TOKEN.labels(self.model, run[0]).observe(time.perf_counter() - run[1])
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        node, started, _ = run
+        LLM_DURATION.labels(self.model, node, "ok").observe(time.perf_counter() - started)
+        prompt, completion = _token_usage(response)
+        if prompt:
+            LLM_TOKENS.labels(self.model, node, "prompt").inc(prompt)
+        if completion:
+            LLM_TOKENS.labels(self.model, node, "completion").inc(completion)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            LLM_DURATION.labels(self.model, run[0], "error").observe(time.perf_counter() - run[1])
+
+
+def _token_usage(response: LLMResult) -> tuple[int, int]:
+    # Потоковые вызовы несут usage_metadata в сообщении, обычные — еще и в llm_output
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+
+def llm_callbacks(model: str) -> list[BaseCallbackHandler]:
+    return [LLMMetricsCallback(model)] if ENABLED else []
+
+
+def observe_llm_queue(model: str, priority: str, seconds: float):
+    if ENABLED:
+        LLM_QUEUE_WAIT.labels(model, priority).observe(seconds)
+
+
+# Ответы, которые клиент openai повторяет (см. max_retries)
+_RETRIED_STATUSES = {408, 409, 429}
+
+
+def llm_event_hooks(model: str) -> dict:
+    """Хуки httpx-клиента OpenAI: считают ответы, за которыми последует повтор."""
+    if not ENABLED:
+        return {}
+
+    async def on_response(response):
+        if response.status_code in _RETRIED_STATUSES or response.status_code >= 500:
+            LLM_RETRIES.labels(model, str(response.status_code)).inc()
+
+    return {"response": [on_response]}
+
+# --- Эмбеддинги и кэши ---
+
+
+def observe_embedding(model: str, texts: int, seconds: float):
+    if ENABLED:
+        EMBEDDING_DURATION.labels(model).observe(seconds)
+        EMBEDDING_TEXTS.labels(model).inc(texts)
+
+
+def record_cache(cache: str, result: str, count: int = 1):
+    if ENABLED and count:
+        CACHE_REQUESTS.labels(cache, result).inc(count)
+
+# --- SQL ---
+
+
+def _operation(statement: str) -> str:
+    words = statement.split(None, 1)
+    # CTE в проекте — только выборки; первое слово ограничивает число меток
+    operation = words[0].upper() if words else "EMPTY"
+    return "SELECT" if operation == "WITH" else operation
+
+
+def instrument_engine(sync_engine):
+    """Слушатели SQLAlchemy, замеряющие время каждого запроса движка."""
+    if not ENABLED:
+        return
+    from sqlalchemy import event
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["metrics_started"].pop()
+        SQL_DURATION.labels(_operation(statement)).observe(time.perf_counter() - started)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def on_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("metrics_started"):
+            conn.info["metrics_started"].pop()
+
+# --- Экспорт ---
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Текст метрик для /metrics: всех воркеров, если задан PROMETHEUS_MULTIPROC_DIR."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
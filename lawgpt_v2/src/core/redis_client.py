@@ -0,0 +1,29 @@
+# src/core/redis_client.py
+
+from redis.asyncio import BlockingConnectionPool, Redis
+from src.core.config import settings
+
+# Общий асинхронный клиент Redis для кэшей приложения.
+# Соединения берутся из ограниченного пула, при исчерпании запрос ждет освобождения.
+_redis: Redis | None = None
+
+
+def get_redis() -> Redis:
+    """Возвращает общий клиент Redis, создавая пул при первом обращении."""
+    global _redis
+    if _redis is None:
+        pool = BlockingConnectionPool.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            timeout=settings.REDIS_POOL_TIMEOUT,
+        )
+        _redis = Redis(connection_pool=pool)
+    return _redis
+
+
+async def close_redis():
+    """Закрывает пул. Нужно там, где event loop пересоздается (задачи Celery)."""
+    global _redis
+    if _redis is not None:
+        await _redis.aclose(close_connection_pool=True)
+        _redis = None
@@ -0,0 +1,187 @@
+# src/core/replay.py
+
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+import httpx
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Запись и воспроизведение ответов внешних API для нагрузочных тестов без
+# расходов на OpenAI и Tavily. REPLAY_MODE:
+#   off    — обычная работа;
+#   record — запросы идут в API, ответы и их задержки пишутся в кассеты;
+#   replay — ответы берутся из кассет с задержкой записанной (умноженной на
+#            REPLAY_LATENCY_SCALE) или фиксированной (REPLAY_LATENCY_MS).
+# Кассета — JSONL-файл на пространство имен в REPLAY_CASSETTE_DIR, ключ записи —
+# хэш запроса. Потоковые ответы OpenAI воспроизводятся по событиям SSE, так что
+# время до первого токена тоже моделируется.
+
+
+class CassetteMiss(RuntimeError):
+    """В кассете нет ответа на запрос (режим replay)."""
+
+
+class Cassette:
+    def __init__(self, path: Path):
+        self.path = path
+        self._entries: dict[str, dict] | None = None
+
+    def _load(self) -> dict[str, dict]:
+        if self._entries is None:
+            self._entries = {}
+            if self.path.exists():
+                with self.path.open(encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            entry = json.loads(line)
+                            self._entries[entry["key"]] = entry
+        return self._entries
+
+    def get(self, key: str) -> dict | None:
+        return self._load().get(key)
+
+    def put(self, key: str, latency_ms: float, response: Any, **extra):
+        entry = {"key": key, "latency_ms": latency_ms, "response": response, **extra}
+        self._load()[key] = entry
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+_cassettes: dict[str, Cassette] = {}
+
+
+def get_cassette(namespace: str) -> Cassette:
+    if namespace not in _cassettes:
+        _cassettes[namespace] = Cassette(Path(settings.REPLAY_CASSETTE_DIR) / f"{namespace}.jsonl")
+    return _cassettes[namespace]
+
+
+def request_key(*parts: bytes | str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode() if isinstance(part, str) else part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def replay_delay(recorded_ms: float) -> float:
+    """Задержка воспроизведения в секундах."""
+    if settings.REPLAY_LATENCY_MS is not None:
+        return settings.REPLAY_LATENCY_MS / 1000
+    return recorded_ms * settings.REPLAY_LATENCY_SCALE / 1000
+
+
+def _miss(namespace: str, key: str) -> CassetteMiss:
+    logger.error("Нет записи %s в кассете %s: сначала запустите с REPLAY_MODE=record", key, namespace)
+    return CassetteMiss(f"{namespace}:{key}")
+
+
+async def replayed(namespace: str, request: Any, call: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Результат call (JSON-совместимый) для запроса request: из кассеты в режиме
+    replay, с записью в режиме record, напрямую при REPLAY_MODE=off.
+    """
+    if settings.REPLAY_MODE == "off":
+        return await call()
+    cassette = get_cassette(namespace)
+    key = request_key(json.dumps(request, sort_keys=True, ensure_ascii=False))
+    if settings.REPLAY_MODE == "replay":
+        entry = cassette.get(key)
+        if entry is None:
+            raise _miss(namespace, key)
+        await asyncio.sleep(replay_delay(entry["latency_ms"]))
+        return entry["response"]
+    started = time.perf_counter()
+    response = await call()
+    cassette.put(key, (time.perf_counter() - started) * 1000, response)
+    return response
+
+# --- HTTP (клиенты OpenAI) ---
+
+# Заголовки, которые описывают передачу исходного ответа, а не его содержимое
+_SKIPPED_HEADERS = {"transfer-encoding", "connection", "content-length", "date", "set-cookie"}
+
+
+class _ReplayStream(httpx.AsyncByteStream):
+    """Тело ответа по событиям SSE с равномерной задержкой между ними."""
+
+    def __init__(self, chunks: list[bytes], delay: float):
+        self._chunks = chunks
+        self._delay = delay
+
+    async def __aiter__(self):
+        for chunk in self._chunks:
+            await asyncio.sleep(self._delay)
+            yield chunk
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Записывает или воспроизводит ответы HTTP-транспорта."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, namespace: str):
+        self._transport = transport
+        self._namespace = namespace
+        self._cassette = get_cassette(namespace)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key = request_key(request.method, request.url.path, await request.aread())
+        if settings.REPLAY_MODE == "replay":
+            return await self._replay(key)
+
+        started = time.perf_counter()
+        response = await self._transport.handle_async_request(request)
+        first_byte_ms = (time.perf_counter() - started) * 1000
+        try:
+            body = b"".join([chunk async for chunk in response.stream])
+        finally:
+            await response.aclose()
+        headers = [(name, value) for name, value in response.headers.multi_items()
+                   if name.lower() not in _SKIPPED_HEADERS]
+        self._cassette.put(
+            key, (time.perf_counter() - started) * 1000,
+            {"status": response.status_code, "headers": headers, "body": base64.b64encode(body).decode()},
+            first_byte_ms=first_byte_ms,
+        )
+        return httpx.Response(response.status_code, headers=headers, content=body, request=request)
+
+    async def _replay(self, key: str) -> httpx.Response:
+        entry = self._cassette.get(key)
+        if entry is None:
+            raise _miss(self._namespace, key)
+        recorded = entry["response"]
+        body = base64.b64decode(recorded["body"])
+        headers = httpx.Headers(recorded["headers"])
+        await asyncio.sleep(replay_delay(entry.get("first_byte_ms", entry["latency_ms"])))
+        if headers.get("content-type", "").startswith("text/event-stream") and "content-encoding" not in headers:
+            chunks = [event + b"\n\n" for event in body.split(b"\n\n") if event]
+            rest = replay_delay(entry["latency_ms"]) - replay_delay(entry.get("first_byte_ms", 0))
+            stream = _ReplayStream(chunks, max(rest, 0) / max(len(chunks), 1))
+            return httpx.Response(recorded["status"], headers=headers, stream=stream)
+        return httpx.Response(recorded["status"], headers=headers, content=body)
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+def replay_transport(transport: httpx.AsyncBaseTransport, namespace: str) -> httpx.AsyncBaseTransport:
+    """Оборачивает транспорт в ReplayTransport, если запись/воспроизведение включены."""
+    if settings.REPLAY_MODE == "off":
+        return transport
+    return ReplayTransport(transport, namespace)
+
+
+def replay_http_client(namespace: str) -> httpx.AsyncClient | None:
+    """HTTP-клиент с записью/воспроизведением; None — клиент по умолчанию."""
+    if settings.REPLAY_MODE == "off":
+        return None
+    return httpx.AsyncClient(transport=replay_transport(httpx.AsyncHTTPTransport(), namespace))
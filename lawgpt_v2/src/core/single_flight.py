@@ -0,0 +1,155 @@
+# src/core/single_flight.py
+
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable
+
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from redis.exceptions import RedisError
+
+from src.core.config import settings
+from src.core.metrics import record_cache
+from src.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Объединение одинаковых одновременных запросов (single-flight). Пока запрос с
+# ключом выполняется, повторные вызовы с тем же ключом ждут его результата, а не
+# запускают свой. Вызов выполняется отдельной задачей: отключение клиента,
+# начавшего запрос, не отменяет его для остальных; задача отменяется, только
+# когда ушли все ожидающие. При SINGLE_FLIGHT_REDIS_ENABLED запросы объединяются
+# и между воркерами: ведущий держит блокировку в Redis и кладет результат под
+# идентификатором запуска, остальные его ждут. Результат общий для всех
+# ожидающих и не должен изменяться на месте. Граница арендатора задается
+# ключом: вызывающий код включает в него user_id, если результат зависит от него.
+
+
+def normalize_query(query: str) -> str:
+    """Ключ поискового запроса: без различий в регистре и пробелах."""
+    return " ".join(query.casefold().split())
+
+
+_MISSING = object()
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+# Удаляет блокировку, только если она все еще принадлежит этому запуску
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self._flights: dict[str, _Flight] = {}
+        self._serde = JsonPlusSerializer()
+        self._release = None
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Результат call; одновременные вызовы с одним key выполняются один раз."""
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            return await call()
+        flight = self._flights.get(key)
+        if flight is None:
+            run = self._run_shared(key, call) if settings.SINGLE_FLIGHT_REDIS_ENABLED else call()
+            flight = self._flights[key] = _Flight(asyncio.ensure_future(run))
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        else:
+            record_cache(f"single_flight:{self.namespace}", "shared")
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                flight.task.cancel()
+
+    def _forget(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.task.cancelled():
+            # Исключение уже получили ожидающие; без них оно не должно попасть в лог loop
+            flight.task.exception()
+
+    # --- Между воркерами ---
+
+    def _lock_key(self, key: str) -> str:
+        return f"single_flight:{self.namespace}:{key}"
+
+    async def _run_shared(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        redis, lock_key, flight_id = get_redis(), self._lock_key(key), uuid.uuid4().hex
+        ttl_ms = int(settings.SINGLE_FLIGHT_LOCK_TTL * 1000)
+        try:
+            # Блокировку могли отпустить между SET и GET — тогда еще одна попытка
+            for _ in range(2):
+                if await redis.set(lock_key, flight_id, nx=True, px=ttl_ms):
+                    leader = None
+                    break
+                if (leader := await redis.get(lock_key)) is not None:
+                    break
+            else:
+                return await call()
+        except RedisError as exc:
+            logger.warning("Блокировки single-flight в Redis недоступны: %s", exc)
+            return await call()
+
+        if leader is None:
+            return await self._lead(redis, lock_key, flight_id, call)
+        result = await self._follow(redis, lock_key, leader.decode())
+        if result is _MISSING:
+            return await call()
+        record_cache(f"single_flight:{self.namespace}", "shared_redis")
+        return result
+
+    async def _lead(self, redis, lock_key: str, flight_id: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            result = await call()
+            type_, data = self._serde.dumps_typed(result)
+            try:
+                await redis.set(f"{lock_key}:{flight_id}", type_.encode() + b"\0" + data,
+                                px=int(settings.SINGLE_FLIGHT_RESULT_TTL * 1000))
+            except RedisError as exc:
+                logger.warning("Не удалось передать результат single-flight через Redis: %s", exc)
+            return result
+        finally:
+            if self._release is None or self._release.registered_client is not redis:
+                self._release = redis.register_script(_RELEASE_SCRIPT)
+            try:
+                await self._release(keys=[lock_key], args=[flight_id])
+            except RedisError:
+                # Блокировка истечет сама
+                pass
+
+    async def _follow(self, redis, lock_key: str, flight_id: str) -> Any:
+        """Ждет результата ведущего; _MISSING — ведущий не справился, считать самим."""
+        result_key = f"{lock_key}:{flight_id}"
+        deadline = time.monotonic() + settings.SINGLE_FLIGHT_LOCK_TTL
+        try:
+            while True:
+                # Блокировка читается раньше результата: ведущий пишет результат до
+                # ее снятия, поэтому снятая блокировка без результата — это сбой
+                async with redis.pipeline(transaction=False) as pipe:
+                    holder, raw = await pipe.get(lock_key).get(result_key).execute()
+                if raw is not None:
+                    type_, data = raw.split(b"\0", 1)
+                    return self._serde.loads_typed((type_.decode(), data))
+                # Блокировка снята без результата: ведущий упал или истек срок
+                if holder is None or holder.decode() != flight_id or time.monotonic() > deadline:
+                    return _MISSING
+                await asyncio.sleep(settings.SINGLE_FLIGHT_POLL_INTERVAL)
+        except RedisError as exc:
+            logger.warning("Ожидание single-flight через Redis прервано: %s", exc)
+            return _MISSING
@@ -0,0 +1,45 @@
+# src/core/tokens.py
+
+from functools import lru_cache
+
+import tiktoken
+
+# Подсчет токенов тем же токенизатором, что и у моделей OpenAI.
+# Нужен для бюджетирования промптов: пачки документов, контекст финализатора.
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str | None):
+    if model:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            pass
+    return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: str | None = None) -> int:
+    """Возвращает количество токенов в тексте."""
+    return len(_encoding(model).encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str | None = None) -> str:
+    """Обрезает текст до max_tokens токенов."""
+    encoding = _encoding(model)
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+def split_by_tokens(text: str, max_tokens: int, model: str | None = None, overlap: int = 0) -> list[str]:
+    """
+    Делит текст на последовательные фрагменты не длиннее max_tokens токенов.
+    Соседние фрагменты перекрываются на overlap токенов.
+    """
+    encoding = _encoding(model)
+    tokens = encoding.encode(text, disallowed_special=())
+    step = max_tokens - overlap
+    # Последний фрагмент не должен состоять только из перекрытия с предыдущим
+    stop = max(len(tokens) - overlap, 1) if overlap else len(tokens)
+    return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, stop, step)] or [""]
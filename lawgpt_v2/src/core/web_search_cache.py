@@ -0,0 +1,78 @@
+# src/core/web_search_cache.py
+
+import hashlib
+import json
+import logging
+import re
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from redis.exceptions import RedisError
+
+from src.core.config import settings
+from src.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Кэш результатов поиска в интернете в Redis. Срок свежести зависит от класса
+# запроса: новости и изменения законодательства устаревают за минуты, а
+# определения и тексты норм — за дни. После срока свежести результат еще
+# WEB_SEARCH_STALE_TTL отдается сразу, а обновляется в фоне (stale-while-revalidate).
+
+NEWS, REFERENCE = "news", "reference"
+
+# Признаки запроса о свежих событиях: новости, изменения, относительные даты, год
+_NEWS_QUERY = re.compile(
+    r"новост|последн|недавн|свеж|актуальн|сегодня|вчера|на этой неделе|в этом (?:месяце|году)|"
+    r"изменени|поправк|вступ\w* в силу|законопроект|\b20\d\d\b|\bnews\b|\blatest\b",
+    re.IGNORECASE,
+)
+
+
+def query_class(query: str) -> str:
+    return NEWS if _NEWS_QUERY.search(query) else REFERENCE
+
+
+@dataclass
+class CachedSearch:
+    content: Any
+    artifact: Any
+    fetched_at: float
+    query_class: str
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() - self.fetched_at <= settings.WEB_SEARCH_FRESH_TTL[self.query_class]
+
+
+class WebSearchCache:
+    def __init__(self, prefix: str = "web_search"):
+        self.prefix = prefix
+
+    def key(self, request: dict) -> str:
+        digest = hashlib.sha256(json.dumps(request, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        return f"{self.prefix}:{digest.hexdigest()}"
+
+    async def get(self, key: str) -> CachedSearch | None:
+        try:
+            raw = await get_redis().get(key)
+        except RedisError as exc:
+            logger.warning("Кэш поиска в интернете недоступен: %s", exc)
+            return None
+        return CachedSearch(**json.loads(raw)) if raw is not None else None
+
+    async def set(self, key: str, content: Any, artifact: Any, query_class: str):
+        entry = {"content": content, "artifact": artifact, "fetched_at": time.time(), "query_class": query_class}
+        ttl = settings.WEB_SEARCH_FRESH_TTL[query_class] + settings.WEB_SEARCH_STALE_TTL[query_class]
+        try:
+            await get_redis().set(key, json.dumps(entry, ensure_ascii=False), ex=ttl)
+        except RedisError as exc:
+            logger.warning("Не удалось записать результат поиска в кэш: %s", exc)
+
+    async def claim_refresh(self, key: str) -> bool:
+        """Один воркер на устаревшую запись: остальные продолжают отдавать ее как есть."""
+        try:
+            return bool(await get_redis().set(f"{key}:refresh", 1, nx=True, ex=settings.WEB_SEARCH_REFRESH_LOCK_TTL))
+        except RedisError:
+            return False
@@ -0,0 +1,41 @@
+# src/db/answer_cache.py
+
+from datetime import datetime
+
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Index, Integer, String, Text, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.db.base import Base
+
+
+class AnswerCache(Base):
+    """
+    Готовые ответы графа по эмбеддингу вопроса. scope — 'user:<id>' для ответов,
+    использовавших базу знаний пользователя, или 'shared' для ответов без нее.
+    """
+    __tablename__ = 'answer_cache'
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    scope: Mapped[str] = mapped_column(String(64), nullable=False)
+    # Пространство имен модели эмбеддингов: векторы разных моделей несравнимы
+    model: Mapped[str] = mapped_column(String(100), nullable=False)
+    # Версия базы знаний пользователя, на которой получен ответ
+    kb_version: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    query: Mapped[str] = mapped_column(Text, nullable=False)
+    embedding: Mapped[list[float]] = mapped_column(Vector(), nullable=False)
+    answer: Mapped[str] = mapped_column(Text, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Поиск идет точным перебором в пределах области, размер которой ограничен
+        Index('idx_answer_cache_scope', scope, model, created_at),
+    )
+
+
+class KnowledgeBaseVersion(Base):
+    """Счетчик изменений базы знаний пользователя; инвалидирует его кэш ответов."""
+    __tablename__ = 'knowledge_base_versions'
+
+    owner_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
@@ -14,11 +14,12 @@ POSTGRES_INDEXES_NAMING_CONVENTION = {
     "pk": "pk_%(table_name)s",
 }
 
+
 class Base(AsyncAttrs, DeclarativeBase):
     """
     Базовый класс для всех моделей SQLAlchemy ORM.
     Включает асинхронную поддержку и соглашения об именовании для миграций.
     """
     __abstract__ = True
-    
-    metadata = MetaData(naming_convention=POSTGRES_INDEXES_NAMING_CONVENTION)
\ No newline at end of file
+
+    metadata = MetaData(naming_convention=POSTGRES_INDEXES_NAMING_CONVENTION)
@@ -0,0 +1,25 @@
+# src/db/embedding_store.py
+
+from datetime import datetime
+
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import DateTime, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.db.base import Base
+
+
+class EmbeddingStore(Base):
+    """
+    Общее для всех арендаторов хранилище эмбеддингов по хэшу текста фрагмента.
+    Одинаковый фрагмент из любой загрузки получает готовый вектор без вызова API.
+    Индекса по вектору нет: таблица используется только для поиска по ключу.
+    """
+    __tablename__ = 'embedding_store'
+
+    # Модель и размерность (embedding_namespace): векторы разных моделей несравнимы
+    model: Mapped[str] = mapped_column(String(100), primary_key=True)
+    content_hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    # Без фиксированной размерности: в хранилище могут лежать векторы разных моделей
+    embedding: Mapped[list[float]] = mapped_column(Vector(), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
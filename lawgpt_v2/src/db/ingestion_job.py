@@ -0,0 +1,39 @@
+# src/db/ingestion_job.py
+
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Integer, String, Text, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.db.base import Base
+
+
+class IngestionJob(Base):
+    """
+    Прогресс загрузки одного файла в базу знаний.
+    next_page обновляется в той же транзакции, что и COPY окна страниц,
+    поэтому после сбоя загрузка продолжается без пропусков и дублей.
+    """
+    __tablename__ = 'ingestion_jobs'
+
+    id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    owner_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    source_path: Mapped[str] = mapped_column(Text, nullable=False)
+    source_type: Mapped[str] = mapped_column(String(100), nullable=False)
+    # pending | running | done | failed
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default="pending")
+    total_pages: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    next_page: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    chunks_ingested: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Дедупликация: все фрагменты файла, уже имеющиеся у арендатора, векторы из
+    # embedding_store и токены, не отправленные в API эмбеддингов
+    chunks_total: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    chunks_duplicate: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    embeddings_reused: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    tokens_embedded: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    tokens_saved: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(),
+    )
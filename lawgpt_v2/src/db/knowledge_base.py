@@ -1,14 +1,58 @@
 # src/db/models/knowledge_base.py
 
 from sqlalchemy import (
-    Column, BigInteger, String, Text, Index, func, ForeignKey, Integer
+    BigInteger, String, Text, Index, ForeignKey, Integer, Computed, text
 )
 from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from pgvector.sqlalchemy import Vector
 from sqlalchemy.orm import Mapped, mapped_column
 
+from src.core.config import settings
 from src.db.base import Base
 
+# Варианты HNSW-индекса по эмбеддингам (KB_VECTOR_INDEX). Столбец всегда хранит
+# полные векторы float32; квантованные варианты индексируют выражение над ним,
+# а итоговый порядок кандидатов уточняется по полным векторам.
+#   vector  — float32, до 2000 измерений;
+#   halfvec — float16, вдвое меньше памяти, до 4000 измерений;
+#   binary  — 1 бит на измерение (расстояние Хэмминга), до 64000 измерений.
+VECTOR_INDEX_KINDS = {
+    "vector": ("embedding", "vector_ip_ops"),
+    "halfvec": ("(embedding::halfvec({dim}))", "halfvec_ip_ops"),
+    "binary": ("(binary_quantize(embedding)::bit({dim}))", "bit_hamming_ops"),
+}
+
+
+def embedding_index_expression(kind: str, dim: int) -> str:
+    """Индексируемое выражение; запрос должен сортировать ровно по нему."""
+    return VECTOR_INDEX_KINDS[kind][0].format(dim=dim)
+
+
+_HNSW_WITH = {'m': 16, 'ef_construction': 64}
+
+
+def embedding_index() -> Index:
+    expression, ops = VECTOR_INDEX_KINDS[settings.KB_VECTOR_INDEX]
+    # Класс операторов должен совпадать с оператором запроса (<#> — скалярное
+    # произведение, <~> — Хэмминг), иначе планировщик не использует индекс
+    return Index(
+        'idx_knowledge_base_embedding',
+        text(f"{expression.format(dim=settings.EMBEDDING_DIMENSIONS)} {ops}"),
+        postgresql_using='hnsw',
+        postgresql_with=_HNSW_WITH,
+    )
+
+
+def embedding_index_sql(kind: str, dim: int) -> str:
+    """DDL индекса для произвольного варианта — для миграций вне текущих настроек."""
+    expression, ops = VECTOR_INDEX_KINDS[kind]
+    options = ", ".join(f"{key} = {value}" for key, value in _HNSW_WITH.items())
+    return (
+        f"CREATE INDEX idx_knowledge_base_embedding ON knowledge_base "
+        f"USING hnsw ({expression.format(dim=dim)} {ops}) WITH ({options})"
+    )
+
+
 class KnowledgeBase(Base):
     __tablename__ = 'knowledge_base'
 
@@ -17,11 +61,21 @@ class KnowledgeBase(Base):
     source_type: Mapped[str] = mapped_column(String(100), nullable=False)
     content: Mapped[str] = mapped_column(Text, nullable=False)
     metadata: Mapped[dict] = mapped_column(JSONB, nullable=True)
-    embedding: Mapped[list[float]] = mapped_column(Vector(1536), nullable=False)
-    content_tsv: Mapped[str] = mapped_column(TSVECTOR, nullable=True)
-    
+    embedding: Mapped[list[float]] = mapped_column(Vector(settings.EMBEDDING_DIMENSIONS), nullable=False)
+    # SHA-256 нормализованного текста фрагмента: повторная загрузка того же
+    # фрагмента арендатором не создает новую строку (и вставку в HNSW)
+    content_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    # Поддерживается самим Postgres; конфигурация должна совпадать с FTS_CONFIG запросов,
+    # иначе GIN-индекс не подойдет к условию @@
+    content_tsv: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(f"to_tsvector('{settings.FTS_CONFIG}'::regconfig, content)", persisted=True),
+    )
+
     __table_args__ = (
-        Index('idx_knowledge_base_embedding', embedding, postgresql_using='hnsw', postgresql_with={'m': 16, 'ef_construction': 64}),
+        embedding_index(),
         Index('idx_knowledge_base_tsv', content_tsv, postgresql_using='gin'),
         Index('idx_knowledge_base_metadata', metadata, postgresql_using='gin'),
-    )
\ No newline at end of file
+        # owner_id входит в индекс, поэтому он допустим и на секционированной таблице
+        Index('uq_knowledge_base_owner_content_hash', owner_id, content_hash, unique=True),
+    )
@@ -1,8 +1,17 @@
 # src/db/session.py
 
-from typing import AsyncGenerator
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, AsyncIterator
+from pgvector.asyncpg import register_vector
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from src.core.config import settings
+from src.core.metrics import instrument_engine
+
+
+def _register_vector_codec(dbapi_connection, connection_record):
+    dbapi_connection.run_async(register_vector)
+
 
 class SessionManager:
     """
@@ -15,10 +24,23 @@ class SessionManager:
     def init(self, db_url: str = None):
         """
         Инициализирует асинхронный движок и фабрику сессий.
+        Параметры пула и кэша подготовленных выражений берутся из настроек.
         """
         if db_url is None:
             db_url = settings.DATABASE_URL
-        self._engine = create_async_engine(db_url, echo=True)
+        self._engine = create_async_engine(
+            db_url,
+            echo=settings.DB_ECHO,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+            connect_args={"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE},
+        )
+        # Кодек pgvector регистрируется один раз на физическое соединение пула
+        event.listen(self._engine.sync_engine, "connect", _register_vector_codec)
+        instrument_engine(self._engine.sync_engine)
         self._session_factory = async_sessionmaker(
             bind=self._engine,
             autocommit=False,
@@ -36,21 +58,32 @@ class SessionManager:
             self._engine = None
             self._session_factory = None
 
-    async def get_session(self) -> AsyncGenerator[AsyncSession, None]:
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[AsyncSession]:
         """
-        Предоставляет сессию базы данных как асинхронный генератор.
+        Выдает сессию из общего пула как асинхронный контекстный менеджер.
+        Используется вне FastAPI (инструменты графа, фоновые задачи).
         """
         if self._session_factory is None:
             self.init()
         async with self._session_factory() as session:
             yield session
 
+    async def get_session(self) -> AsyncGenerator[AsyncSession, None]:
+        """
+        Предоставляет сессию базы данных как асинхронный генератор.
+        """
+        async with self.session() as session:
+            yield session
+
+
 # Глобальный экземпляр менеджера сессий
 session_manager = SessionManager()
 
+
 async def get_db() -> AsyncGenerator:
     """
     Зависимость FastAPI для получения сессии базы данных.
     """
     async for session in session_manager.get_session():
-        yield session
\ No newline at end of file
+        yield session
@@ -4,6 +4,8 @@ from typing import List, Dict, Any, Annotated
 from typing_extensions import TypedDict
 from langchain_core.documents import Document
 from langgraph.graph.message import add_messages
+from src.graph.documents import merge_retrieved_documents
+
 
 class AgentState(TypedDict, total=False):
     """
@@ -12,24 +14,27 @@ class AgentState(TypedDict, total=False):
     # Входные данные
     original_query: str
     user_id: int
-    
+
     # План от координатора
     plan: List[str]
-    
+
     # Промежуточные результаты
     search_query: str
-    retrieved_documents: List[Document]
+    # Ветки поиска (веб и база знаний) выполняются параллельно и пишут сюда вместе
+    retrieved_documents: Annotated[List[Document], merge_retrieved_documents]
     analyzed_facts: Dict[str, Any]
     synthesized_argument: str
     draft_document: str
-    
+
     # Финальный результат
     final_response: str
-    
+
     # История сообщений для LLM
     messages: Annotated[list, add_messages]
-    
+    # Краткое содержание сообщений, удаленных из messages при сжатии истории
+    history_summary: str
+
     # Для цикла самокоррекции
     retrieval_attempts: int
-    retrieval_relevance: str # 'Relevant' или 'Irrelevant'
-    # ... другие промежуточные состояния по мере необходимости
\ No newline at end of file
+    retrieval_relevance: str  # 'Relevant' или 'Irrelevant'
+    # ... другие промежуточные состояния по мере необходимости
@@ -0,0 +1,218 @@
+# src/graph/checkpointer.py
+
+import asyncio
+import hashlib
+import importlib.util
+import logging
+import zlib
+from typing import Any, AsyncIterator, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import CheckpointTuple
+from langgraph.checkpoint.redis.aio import AsyncRedisSaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from redis.asyncio import Redis
+
+from src.core.config import settings
+from src.core.embedding_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Асинхронный чекпоинтер графа на общем пуле Redis.
+# AsyncRedisSaver хранит каждый чекпоинт целиком: все значения каналов
+# копируются в JSON каждого шага. Крупные значения (документы поиска, факты,
+# история) здесь выносятся в отдельные ключи: msgpack + сжатие, ключ — хэш
+# содержимого, поэтому неизменившийся канал хранится один раз на тред, а
+# чекпоинт содержит только ссылку. Срок жизни ключей продлевается при записи
+# и чтении треда.
+
+_ZSTD_AVAILABLE = importlib.util.find_spec("zstandard") is not None
+if _ZSTD_AVAILABLE:
+    import zstandard
+
+BLOB_REF = "__checkpoint_blob__"
+_ZSTD, _ZLIB = b"z", b"d"
+
+
+def _compress(data: bytes) -> bytes:
+    if _ZSTD_AVAILABLE:
+        return _ZSTD + zstandard.ZstdCompressor(level=settings.CHECKPOINT_COMPRESSION_LEVEL).compress(data)
+    return _ZLIB + zlib.compress(data, settings.CHECKPOINT_COMPRESSION_LEVEL)
+
+
+def _decompress(blob: bytes) -> bytes:
+    codec, data = blob[:1], blob[1:]
+    if codec == _ZSTD:
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def _ref(value: Any) -> str | None:
+    if isinstance(value, dict) and len(value) == 1:
+        return value.get(BLOB_REF)
+    return None
+
+
+class CompactAsyncRedisSaver(AsyncRedisSaver):
+    """
+    AsyncRedisSaver со ссылками на крупные значения каналов и записей задач.
+    Индексы RediSearch создаются при первом обращении, поэтому экземпляр можно
+    создать при импорте модуля графа.
+    """
+
+    def __init__(self, redis_client: Redis, ttl_minutes: int | None = None, offload_min_bytes: int = 2048):
+        super().__init__(
+            redis_client=redis_client,
+            ttl={"default_ttl": ttl_minutes, "refresh_on_read": True} if ttl_minutes else None,
+        )
+        self._ttl_seconds = ttl_minutes * 60 if ttl_minutes else None
+        self._offload_min_bytes = offload_min_bytes
+        # Чистый msgpack: сериализатор AsyncRedisSaver приводит значения к JSON
+        self._blob_serde = JsonPlusSerializer()
+        # Ссылки на значения по версии канала: неизменившийся канал не сериализуется заново
+        self._refs = LRUCache(settings.CHECKPOINT_REF_CACHE_SIZE, self._ttl_seconds or 24 * 3600)
+        self._setup_lock = asyncio.Lock()
+        self._ready = False
+
+    async def _ensure_setup(self):
+        if not self._ready:
+            async with self._setup_lock:
+                if not self._ready:
+                    await self.asetup()
+                    self._ready = True
+
+    @staticmethod
+    def _blob_key(thread_id: str, digest: str) -> str:
+        return f"checkpoint_blob:{thread_id}:{digest}"
+
+    async def _store_blobs(self, blobs: dict[str, bytes | None]) -> list[str]:
+        """
+        Записывает только отсутствующие блобы; у существующих продлевает срок.
+        None — блоб канала, взятый по версии из кэша ссылок: только продление.
+        Возвращает такие ключи, которых в Redis уже нет (истекли или удалены).
+        """
+        if not blobs:
+            return []
+        keys = list(blobs)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                # EXPIRE заодно сообщает, есть ли ключ
+                if self._ttl_seconds:
+                    pipe.expire(key, self._ttl_seconds)
+                else:
+                    pipe.exists(key)
+            present = await pipe.execute()
+        absent = [key for key, found in zip(keys, present) if not found]
+        missing = [key for key in absent if blobs[key] is not None]
+        if missing:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for key in missing:
+                    pipe.set(key, blobs[key], ex=self._ttl_seconds)
+                await pipe.execute()
+        return [key for key in absent if blobs[key] is None]
+
+    def _offload_value(self, thread_id: str, channel: str, value: Any, blobs: dict[str, bytes | None]) -> Any:
+        # Служебные каналы LangGraph (__interrupt__, __resume__ и т. п.) читает сама библиотека
+        if channel.startswith("__") or value is None or isinstance(value, (bool, int, float)):
+            return value
+        type_, data = self._blob_serde.dumps_typed(value)
+        if len(data) < self._offload_min_bytes:
+            return value
+        digest = hashlib.sha256(type_.encode() + b"\0" + data).hexdigest()
+        key = self._blob_key(thread_id, digest)
+        if blobs.get(key) is None:
+            blobs[key] = type_.encode() + b"\0" + _compress(data)
+        return {BLOB_REF: digest}
+
+    async def _resolve(self, thread_id: str, values: list[Any]) -> list[Any]:
+        """Заменяет ссылки значениями одним MGET."""
+        refs = {ref for value in values if (ref := _ref(value))}
+        if not refs:
+            return values
+        keys = [self._blob_key(thread_id, digest) for digest in refs]
+        loaded = {}
+        for digest, blob in zip(refs, await self._redis.mget(keys)):
+            if blob is None:
+                # Блоб не переживает чекпоинт, если TTL изменили на ходу
+                logger.warning("Блоб чекпоинта %s треда %s не найден", digest, thread_id)
+                continue
+            type_, data = blob.split(b"\0", 1)
+            loaded[digest] = self._blob_serde.loads_typed((type_.decode(), _decompress(data)))
+        if self._ttl_seconds:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.expire(key, self._ttl_seconds)
+                await pipe.execute()
+        return [loaded.get(ref) if (ref := _ref(value)) else value for value in values]
+
+    async def _resolve_tuple(self, checkpoint_tuple: CheckpointTuple) -> CheckpointTuple:
+        thread_id = checkpoint_tuple.config["configurable"]["thread_id"]
+        channel_values = checkpoint_tuple.checkpoint.get("channel_values") or {}
+        writes = checkpoint_tuple.pending_writes or []
+        resolved = await self._resolve(thread_id, list(channel_values.values()) + [value for *_, value in writes])
+        checkpoint = {**checkpoint_tuple.checkpoint, "channel_values": dict(zip(channel_values, resolved))}
+        pending_writes = [(task_id, channel, value)
+                          for (task_id, channel, _), value in zip(writes, resolved[len(channel_values):])]
+        return checkpoint_tuple._replace(checkpoint=checkpoint, pending_writes=pending_writes)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        await self._ensure_setup()
+        checkpoint_tuple = await super().aget_tuple(config)
+        return await self._resolve_tuple(checkpoint_tuple) if checkpoint_tuple else None
+
+    async def alist(self, config: Optional[RunnableConfig], **kwargs) -> AsyncIterator[CheckpointTuple]:
+        await self._ensure_setup()
+        async for checkpoint_tuple in super().alist(config, **kwargs):
+            yield await self._resolve_tuple(checkpoint_tuple)
+
+    async def aput(self, config: RunnableConfig, checkpoint, metadata, new_versions, *args, **kwargs) -> RunnableConfig:
+        await self._ensure_setup()
+        thread_id = config["configurable"]["thread_id"]
+        blobs: dict[str, bytes | None] = {}
+        namespace = config["configurable"].get("checkpoint_ns", "")
+        versions = checkpoint.get("channel_versions") or {}
+        values = checkpoint.get("channel_values") or {}
+        channel_values = {}
+        # Ключ блоба из кэша ссылок -> каналы, которые на него ссылаются
+        cached: dict[str, list[str]] = {}
+        for channel, value in values.items():
+            version_key = f"{thread_id}:{namespace}:{channel}:{versions.get(channel)}"
+            if (digest := self._refs.get(version_key)) is not None:
+                key = self._blob_key(thread_id, digest)
+                blobs.setdefault(key, None)
+                cached.setdefault(key, []).append(channel)
+                channel_values[channel] = {BLOB_REF: digest}
+                continue
+            channel_values[channel] = self._offload_value(thread_id, channel, value, blobs)
+            if (digest := _ref(channel_values[channel])) and channel in versions:
+                self._refs.set(version_key, digest)
+        # Блобы пишутся раньше чекпоинта, который на них ссылается
+        lost = await self._store_blobs(blobs)
+        if lost:
+            # Блоб по ссылке из кэша истек или удален: значение записывается заново
+            rewritten: dict[str, bytes | None] = {}
+            for channel in (channel for key in lost for channel in cached[key]):
+                version_key = f"{thread_id}:{namespace}:{channel}:{versions.get(channel)}"
+                channel_values[channel] = self._offload_value(thread_id, channel, values[channel], rewritten)
+                if digest := _ref(channel_values[channel]):
+                    self._refs.set(version_key, digest)
+            await self._store_blobs(rewritten)
+        return await super().aput(config, {**checkpoint, "channel_values": channel_values},
+                                  metadata, new_versions, *args, **kwargs)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        await self._ensure_setup()
+        thread_id = config["configurable"]["thread_id"]
+        blobs: dict[str, bytes | None] = {}
+        writes = [(channel, self._offload_value(thread_id, channel, value, blobs)) for channel, value in writes]
+        await self._store_blobs(blobs)
+        await super().aput_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await self._ensure_setup()
+        await super().adelete_thread(thread_id)
+        self._refs.delete_prefix(f"{thread_id}:")
+        keys = [key async for key in self._redis.scan_iter(match=self._blob_key(thread_id, "*"), count=500)]
+        if keys:
+            await self._redis.delete(*keys)
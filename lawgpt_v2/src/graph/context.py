@@ -0,0 +1,124 @@
+# src/graph/context.py
+
+import logging
+from dataclasses import dataclass, field
+
+from langchain_core.messages import BaseMessage, HumanMessage
+
+from src.agents.history import history_messages, message_tokens
+from src.core.config import settings
+from src.core.tokens import count_tokens, truncate_to_tokens
+from src.graph.documents import document_id, document_to_text
+
+logger = logging.getLogger(__name__)
+
+# Сборка контекста финализатора из состояния графа. Вместо repr всех полей
+# состояния в промпт попадают только непустые разделы в порядке ценности:
+# синтезированный аргумент, факты (без повторов, по рангу источника), тексты
+# документов и проект документа — пока не исчерпан FINALIZER_CONTEXT_TOKENS.
+
+
+@dataclass
+class FinalizerContext:
+    history: list[BaseMessage]
+    context: str
+    stats: dict = field(default_factory=dict)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def rank_facts(facts: list[dict], documents: list) -> list[dict]:
+    """
+    Убирает повторы (одинаковое изложение из разных фрагментов) и сортирует
+    факты по рангу документа-источника в результатах поиска; при равном ранге
+    первыми идут факты с цитатой.
+    """
+    ranks = {document_id(doc): rank for rank, doc in enumerate(documents)}
+    unique = {}
+    for fact in facts:
+        unique.setdefault(_normalize(fact.get("fact_summary") or ""), fact)
+    return sorted(
+        (fact for key, fact in unique.items() if key),
+        key=lambda fact: (ranks.get((fact.get("source_document_id") or "").strip(), len(ranks)),
+                          not fact.get("direct_quote")),
+    )
+
+
+def _format_fact(fact: dict) -> str:
+    line = f"- {fact['fact_summary']}"
+    if source := fact.get("source_document_id"):
+        line += f" [Документ {source}]"
+    if quote := fact.get("direct_quote"):
+        line += f"\n  Цитата: «{quote}»"
+    return line
+
+
+class _Budget:
+    def __init__(self, tokens: int):
+        self.left = tokens
+
+    def take(self, text: str, limit: int | None = None) -> str | None:
+        """Текст целиком или обрезанный до limit; None, если бюджет исчерпан."""
+        if self.left <= 0:
+            return None
+        text = truncate_to_tokens(text, min(limit or self.left, self.left))
+        self.left -= count_tokens(text)
+        return text
+
+
+def build_finalizer_context(state: dict) -> FinalizerContext:
+    budget = _Budget(settings.FINALIZER_CONTEXT_TOKENS)
+    sections, stats = [], {}
+
+    if argument := state.get("synthesized_argument"):
+        sections.append(f"## Юридический аргумент\n{budget.take(argument, settings.FINALIZER_ARGUMENT_TOKENS)}")
+
+    documents = state.get("retrieved_documents") or []
+    facts = rank_facts(state.get("analyzed_facts") or [], documents)
+    lines = []
+    for fact in facts:
+        line = budget.take(_format_fact(fact))
+        if line is None:
+            break
+        lines.append(line)
+    if lines:
+        sections.append("## Извлеченные факты\n" + "\n".join(lines))
+    stats["facts"] = f"{len(lines)}/{len(state.get('analyzed_facts') or [])}"
+
+    # Тексты документов — в порядке ранга; при фактах это подтверждение цитат
+    texts = []
+    for doc in documents:
+        text = budget.take(document_to_text(doc), settings.FINALIZER_DOCUMENT_TOKENS)
+        if text is None:
+            break
+        texts.append(text)
+    if texts:
+        sections.append("## Найденные документы\n" + "\n\n".join(texts))
+    stats["documents"] = f"{len(texts)}/{len(documents)}"
+
+    if (draft := state.get("draft_document")) and (draft := budget.take(draft)):
+        sections.append(f"## Проект документа\n{draft}")
+
+    # Текущий вопрос идет последним в контексте, а не в истории
+    history = history_messages(state)
+    if history and isinstance(history[-1], HumanMessage) and history[-1].content == state.get("original_query"):
+        history = history[:-1]
+    sections.append(f"## Вопрос пользователя\n{state.get('original_query', '')}")
+
+    context = "\n\n".join(sections)
+    stats["history_tokens"] = sum(message_tokens(message) for message in history)
+    stats["context_tokens"] = count_tokens(context)
+    return FinalizerContext(history, context, stats)
+
+
+def log_prompt_tokens(instructions: str, finalizer_context: FinalizerContext):
+    stats = finalizer_context.stats
+    instructions_tokens = count_tokens(instructions)
+    logger.info(
+        "Промпт финализатора: %d токенов (инструкции %d, история %d, контекст %d); фактов %s, документов %s",
+        instructions_tokens + stats["history_tokens"] + stats["context_tokens"],
+        instructions_tokens, stats["history_tokens"], stats["context_tokens"],
+        stats["facts"], stats["documents"],
+    )
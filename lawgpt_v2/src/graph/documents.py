@@ -0,0 +1,71 @@
+# src/graph/documents.py
+
+import hashlib
+
+from langchain_core.documents import Document
+from src.core.config import settings
+
+# Вспомогательные функции для работы с результатами поиска в состоянии графа.
+# Результаты бывают объектами Document, словарями (Tavily) или голыми id.
+
+
+def _content_key(content: str) -> str:
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()[:16]
+
+
+def document_id(doc) -> str:
+    """Стабильный идентификатор документа для ссылок и дедупликации."""
+    if isinstance(doc, Document):
+        return str(doc.metadata.get("id") or doc.metadata.get("source") or _content_key(doc.page_content))
+    if isinstance(doc, dict):
+        return str(doc.get("id") or doc.get("url") or _content_key(doc.get("content", "")))
+    return str(doc)
+
+
+def document_to_text(doc) -> str:
+    """Текстовое представление документа для промпта с указанием его id."""
+    if isinstance(doc, Document):
+        content = doc.page_content
+    elif isinstance(doc, dict):
+        content = doc.get("content", "")
+    else:
+        content = str(doc)
+    return f"[Документ {document_id(doc)}]\n{content}"
+
+
+def document_snippet(doc) -> str:
+    """Короткий фрагмент документа (ts_headline для базы знаний) для быстрых проверок."""
+    if isinstance(doc, Document):
+        snippet = doc.metadata.get("snippet") or doc.page_content[:500]
+    elif isinstance(doc, dict):
+        snippet = doc.get("content", "")[:500]
+    else:
+        snippet = str(doc)
+    return f"[Документ {document_id(doc)}] {snippet}"
+
+
+def fuse_documents(result_lists: list[list], k: int = 60) -> list:
+    """
+    Сливает ранжированные списки документов из разных источников через RRF.
+    Повторяющиеся документы (по document_id) объединяются в один.
+    """
+    scores, documents = {}, {}
+    for result_list in result_lists:
+        for rank, doc in enumerate(result_list):
+            key = document_id(doc)
+            documents.setdefault(key, doc)
+            scores[key] = scores.get(key, 0) + 1 / (rank + k)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+def merge_retrieved_documents(left: list | None, right: list | None) -> list:
+    """
+    Редьюсер `retrieved_documents`: результаты параллельных веток поиска
+    сливаются через RRF. Значение None сбрасывает накопленные документы
+    (новый запрос или уточнение поиска).
+    """
+    if right is None:
+        return []
+    if not left:
+        return list(right)
+    return fuse_documents([left, right], k=settings.RRF_K)
@@ -1,42 +1,57 @@
 # src/graph/graph.py
 
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.redis import RedisSaver
 from src.core.config import settings
-from.agent_state import AgentState
-from.nodes import (
+from src.core.metrics import instrument_node
+from src.core.redis_client import get_redis
+from .checkpointer import CompactAsyncRedisSaver
+from .agent_state import AgentState
+from .nodes import (
     run_coordinator, run_web_search, run_legal_search,
-    run_document_analysis, run_synthesis, run_response_finalizer,
+    run_document_analysis, run_synthesis, run_response_finalizer, run_history_compaction,
     evaluate_retrieval, refine_query,
     route_after_coordinator, route_after_retrieval_evaluation, route_after_analysis
 )
 
-# Инициализация чекпоинтера для сохранения состояния в Redis
-memory = RedisSaver.from_conn_string(settings.REDIS_URL)
+# Асинхронный чекпоинтер на общем пуле Redis (см. checkpointer.py)
+memory = CompactAsyncRedisSaver(
+    get_redis(),
+    ttl_minutes=settings.CHECKPOINT_TTL_MINUTES,
+    offload_min_bytes=settings.CHECKPOINT_OFFLOAD_MIN_BYTES,
+)
 
 # Создание графа
 workflow = StateGraph(AgentState)
 
+
+def add_node(name: str, func):
+    # Каждый узел пишет метрики задержки (src/core/metrics.py)
+    workflow.add_node(name, instrument_node(name, func))
+
+
 # Добавление узлов
-workflow.add_node("coordinator", run_coordinator)
-workflow.add_node("WebSearchAgent", run_web_search)
-workflow.add_node("LegalSearchAgent", run_legal_search)
-workflow.add_node("evaluate_retrieval", evaluate_retrieval)
-workflow.add_node("refine_query", refine_query)
-workflow.add_node("DocumentAnalysisAgent", run_document_analysis)
-workflow.add_node("CaseLawSynthesisAgent", run_synthesis)
-workflow.add_node("ResponseFinalizerAgent", run_response_finalizer)
+add_node("coordinator", run_coordinator)
+add_node("WebSearchAgent", run_web_search)
+add_node("LegalSearchAgent", run_legal_search)
+add_node("evaluate_retrieval", evaluate_retrieval)
+add_node("refine_query", refine_query)
+add_node("DocumentAnalysisAgent", run_document_analysis)
+add_node("CaseLawSynthesisAgent", run_synthesis)
+add_node("ResponseFinalizerAgent", run_response_finalizer)
+add_node("compact_history", run_history_compaction)
 
 # Определение ребер
 workflow.set_entry_point("coordinator")
 
-# 1. Маршрутизация от координатора
+# 1. Маршрутизация от координатора: все шаги поиска из плана выполняются
+# параллельно, evaluate_retrieval запускается один раз после обеих веток
 workflow.add_conditional_edges(
     "coordinator",
     route_after_coordinator,
     {
         "WebSearchAgent": "WebSearchAgent",
         "LegalSearchAgent": "LegalSearchAgent",
+        "ResponseFinalizerAgent": "ResponseFinalizerAgent",
         "end": END
     }
 )
@@ -51,11 +66,11 @@ workflow.add_conditional_edges(
     {
         "refine": "refine_query",
         "DocumentAnalysisAgent": "DocumentAnalysisAgent",
-        "ResponseFinalizerAgent": "ResponseFinalizerAgent", # Если анализ не нужен
+        "ResponseFinalizerAgent": "ResponseFinalizerAgent",  # Если анализ не нужен
         "end": END
     }
 )
-workflow.add_edge("refine_query", "LegalSearchAgent") # Повторная попытка поиска в базе знаний
+workflow.add_edge("refine_query", "LegalSearchAgent")  # Повторная попытка поиска в базе знаний
 
 # 3. Поток после анализа документов
 workflow.add_conditional_edges(
@@ -70,7 +85,9 @@ workflow.add_conditional_edges(
 
 # 4. Линейные переходы
 workflow.add_edge("CaseLawSynthesisAgent", "ResponseFinalizerAgent")
-workflow.add_edge("ResponseFinalizerAgent", END)
+# Сжатие истории после ответа: клиент уже получил final_response
+workflow.add_edge("ResponseFinalizerAgent", "compact_history")
+workflow.add_edge("compact_history", END)
 
 # Компиляция графа с чекпоинтером
-graph_app = workflow.compile(checkpointer=memory)
\ No newline at end of file
+graph_app = workflow.compile(checkpointer=memory)
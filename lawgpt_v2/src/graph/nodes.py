@@ -1,30 +1,82 @@
 # src/graph/nodes.py
 
-from.agent_state import AgentState
-from src.agents.coordinator import coordinator_chain
-from src.agents.document_analysis import analysis_chain
+import asyncio
+from itertools import chain
+
+from .agent_state import AgentState
+from .context import build_finalizer_context, log_prompt_tokens
+from .documents import document_to_text
+from .relevance import IRRELEVANT, get_relevance_evaluator
+from src.agents.coordinator import plan_query
+from src.agents.history import compact_history, history_messages
+from src.agents.document_analysis import analysis_chain, batch_documents, merge_facts
 from src.agents.llm_factory import get_fast_llm, get_smart_llm
-from.tools.web_search import web_search_tool
-from.tools.kb_search import hybrid_search
-from langchain_core.messages import HumanMessage
-from langchain_core.prompts import ChatPromptTemplate
+from src.core.config import settings
+from .tools.web_search import web_search_tool, web_results_to_documents
+from .tools.kb_search import hybrid_search
+from langchain_core.callbacks.manager import adispatch_custom_event
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+# Узлы поиска, которые запускаются параллельно после координатора
+RETRIEVAL_STEPS = ("WebSearchAgent", "LegalSearchAgent")
+
+# --- Цепочки узлов ---
+# Собираются один раз при импорте: клиенты LLM общие (см. llm_factory),
+# поэтому узлы не создают ни промптов, ни HTTP-пулов на каждом шаге графа.
+
+synthesis_chain = ChatPromptTemplate.from_template(
+    """Основываясь на следующем запросе пользователя и извлеченных фактах, создай связный юридический аргумент.
+    Запрос: {query}
+    Факты: {facts}"""
+) | get_smart_llm()
+
+# Неизменная часть промпта идет первой: одинаковый префикс запросов
+# позволяет провайдеру применять кэширование промптов
+FINALIZER_INSTRUCTIONS = (
+    "Ты — юридический ассистент. Основываясь на всей проделанной работе, сформируй окончательный, "
+    "исчерпывающий и хорошо отформатированный ответ на последний вопрос пользователя.\n"
+    "Если есть цитаты или ссылки на документы, обязательно укажи их в виде [Документ id].\n"
+    "Опирайся на разделы контекста: юридический аргумент, извлеченные факты, найденные документы, "
+    "проект документа. Если сведений недостаточно, прямо скажи об этом."
+)
+
+finalizer_chain = ChatPromptTemplate.from_messages([
+    ("system", FINALIZER_INSTRUCTIONS),
+    MessagesPlaceholder("history"),
+    ("human", "Контекст работы:\n\n{context}\n\nСформируй финальный ответ."),
+]) | get_smart_llm()
+
+refine_chain = ChatPromptTemplate.from_template(
+    """Предыдущий поисковый запрос "{search_query}" по теме "{original_query}" вернул нерелевантные результаты.
+    Сгенерируй новый, более точный или альтернативный поисковый запрос, чтобы найти нужную информацию.
+    Верни только сам новый запрос.
+    """
+) | get_fast_llm()
+
+# Локальная оценка по сигналам поиска; LLM — только в пограничных случаях
+relevance_evaluator = get_relevance_evaluator()
 
 # --- Узлы Агентов ---
 
+
 async def run_coordinator(state: AgentState) -> dict:
-    """Запускает агента-координатора для создания плана."""
+    """
+    Создает план: типовые запросы планируются правилами или берутся из кэша
+    планов, координатор-LLM вызывается только для остальных.
+    """
     print("--- УЗЕЛ: Координатор ---")
-    response = await coordinator_chain.ainvoke({
-        "messages": state["messages"],
-        "original_query": state["original_query"]
-    })
-    return {"plan": response.plan, "search_query": response.search_query}
+    # Краткое содержание и окно последних сообщений: промпт не растет с длиной треда
+    response = await plan_query(state["original_query"], history_messages(state))
+    # None сбрасывает документы, накопленные редьюсером на прошлом ходе треда
+    return {"plan": response.plan, "search_query": response.search_query, "retrieved_documents": None}
+
 
 async def run_web_search(state: AgentState) -> dict:
     """Выполняет поиск в интернете."""
     print(f"--- УЗЕЛ: Поиск в интернете ({state['search_query']}) ---")
     result = await web_search_tool.ainvoke({"query": state["search_query"]})
-    return {"retrieved_documents": result}
+    return {"retrieved_documents": web_results_to_documents(result)}
+
 
 async def run_legal_search(state: AgentState) -> dict:
     """Выполняет гибридный поиск по базе знаний."""
@@ -32,124 +84,135 @@ async def run_legal_search(state: AgentState) -> dict:
     result = await hybrid_search.ainvoke({"query": state["search_query"], "user_id": state["user_id"]})
     return {"retrieved_documents": result}
 
+
 async def run_document_analysis(state: AgentState) -> dict:
-    """Анализирует извлеченные документы."""
+    """
+    Анализирует извлеченные документы по схеме map-reduce: документы делятся
+    на пачки с ограничением по токенам, пачки анализируются параллельно
+    (не более ANALYSIS_MAX_CONCURRENCY одновременно), а факты объединяются
+    без повторов. Результат каждой пачки отправляется событием
+    `analysis_partial` сразу по готовности.
+    """
     print("--- УЗЕЛ: Анализ документов ---")
     if not state.get("retrieved_documents"):
-        return {"analyzed_facts":}
-    
-    response = await analysis_chain.ainvoke({"documents": state["retrieved_documents"]})
-    return {"analyzed_facts": [fact.dict() for fact in response.facts]}
+        return {"analyzed_facts": []}
+
+    texts = [document_to_text(doc) for doc in state["retrieved_documents"]]
+    batches = batch_documents(texts, settings.ANALYSIS_BATCH_TOKENS)
+    semaphore = asyncio.Semaphore(settings.ANALYSIS_MAX_CONCURRENCY)
+
+    async def analyze(index: int, batch: str):
+        async with semaphore:
+            response = await analysis_chain.ainvoke({"documents": batch})
+        return index, response.facts
+
+    results = [[] for _ in batches]
+    tasks = [asyncio.create_task(analyze(i, batch)) for i, batch in enumerate(batches)]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            index, facts = await finished
+            results[index] = facts
+            await adispatch_custom_event("analysis_partial", {
+                "batch": index + 1,
+                "total_batches": len(batches),
+                "facts": [fact.model_dump() for fact in facts],
+            })
+    finally:
+        # Отмена узла (отключение клиента, срок запроса) или ошибка пачки
+        # останавливает и остальные вызовы LLM
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    facts = merge_facts(chain.from_iterable(results))
+    return {"analyzed_facts": [fact.model_dump() for fact in facts]}
+
 
 async def run_synthesis(state: AgentState) -> dict:
     """Синтезирует аргумент из проанализированных фактов."""
     print("--- УЗЕЛ: Синтез аргумента ---")
-    prompt = ChatPromptTemplate.from_template(
-        """Основываясь на следующем запросе пользователя и извлеченных фактах, создай связный юридический аргумент.
-        Запрос: {query}
-        Факты: {facts}"""
-    )
-    synthesis_chain = prompt | get_smart_llm()
     response = await synthesis_chain.ainvoke({
         "query": state["original_query"],
         "facts": state["analyzed_facts"]
     })
     return {"synthesized_argument": response.content}
 
+
 async def run_response_finalizer(state: AgentState) -> dict:
     """Форматирует финальный ответ для пользователя."""
     print("--- УЗЕЛ: Финализация ответа ---")
-    # Собираем весь контекст, который есть в состоянии
-    context = f"""
-    Исходный запрос: {state.get('original_query', 'N/A')}
-    Результаты поиска: {state.get('retrieved_documents', 'N/A')}
-    Извлеченные факты: {state.get('analyzed_facts', 'N/A')}
-    Синтезированный аргумент: {state.get('synthesized_argument', 'N/A')}
-    Проект документа: {state.get('draft_document', 'N/A')}
-    """
-    
-    prompt = ChatPromptTemplate.from_template(
-        """Основываясь на всей проделанной работе, сформируй окончательный, исчерпывающий и хорошо отформатированный ответ для пользователя.
-        Если есть цитаты или ссылки на документы, обязательно укажи их.
-        
-        Контекст работы:
-        {context}
-        
-        Сформируй финальный ответ:
-        """
-    )
-    finalizer_chain = prompt | get_smart_llm()
-    response = await finalizer_chain.ainvoke({"context": context})
+    # Ранжированный и ограниченный бюджетом токенов контекст вместо repr состояния
+    finalizer_context = build_finalizer_context(state)
+    log_prompt_tokens(FINALIZER_INSTRUCTIONS, finalizer_context)
+    response = await finalizer_chain.ainvoke({
+        "history": finalizer_context.history,
+        "context": finalizer_context.context,
+    })
     return {"final_response": response.content, "messages": [("ai", response.content)]}
 
+
+async def run_history_compaction(state: AgentState) -> dict:
+    """Сворачивает раннюю историю длинного треда в краткое содержание."""
+    print("--- УЗЕЛ: Сжатие истории ---")
+    return await compact_history(state.get("messages") or [], state.get("history_summary"))
+
 # --- Узлы для цикла самокоррекции ---
 
+
 async def evaluate_retrieval(state: AgentState) -> dict:
     """Оценивает релевантность найденных документов."""
     print("--- УЗЕЛ: Оценка релевантности поиска ---")
     if not state.get("retrieved_documents"):
-        return {"retrieval_relevance": "Irrelevant"}
-
-    prompt = ChatPromptTemplate.from_template(
-        """Оцени, являются ли следующие документы релевантными для ответа на запрос пользователя.
-        Ответь только 'Relevant' или 'Irrelevant'.
-        
-        Запрос пользователя: {query}
-        Найденные документы: {documents}
-        """
-    )
-    eval_chain = prompt | get_fast_llm()
-    response = await eval_chain.ainvoke({
-        "query": state["original_query"],
-        "documents": state["retrieved_documents"][:1000] # Ограничиваем для экономии
-    })
-    relevance = "Relevant" if "relevant" in response.content.lower() else "Irrelevant"
-    print(f"Результат оценки: {relevance}")
-    return {"retrieval_relevance": relevance}
+        return {"retrieval_relevance": IRRELEVANT}
+
+    verdict = await relevance_evaluator.evaluate(state["original_query"], state["retrieved_documents"])
+    print(f"Результат оценки: {verdict.label} ({verdict.source}, оценка {verdict.score})")
+    return {"retrieval_relevance": verdict.label}
+
 
 async def refine_query(state: AgentState) -> dict:
     """Уточняет поисковый запрос, если предыдущий поиск был нерелевантным."""
     print("--- УЗЕЛ: Уточнение запроса ---")
-    prompt = ChatPromptTemplate.from_template(
-        """Предыдущий поисковый запрос "{search_query}" по теме "{original_query}" вернул нерелевантные результаты.
-        Сгенерируй новый, более точный или альтернативный поисковый запрос, чтобы найти нужную информацию.
-        Верни только сам новый запрос.
-        """
-    )
-    refine_chain = prompt | get_fast_llm()
     response = await refine_chain.ainvoke({
         "search_query": state["search_query"],
         "original_query": state["original_query"]
     })
-    return {"search_query": response.content, "retrieval_attempts": state.get("retrieval_attempts", 0) + 1}
+    return {
+        "search_query": response.content,
+        "retrieval_attempts": state.get("retrieval_attempts", 0) + 1,
+        "retrieved_documents": None,  # повторный поиск заменяет нерелевантные результаты
+    }
 
 # --- Условные ребра ---
 
-def route_after_coordinator(state: AgentState) -> str:
-    """Маршрутизирует выполнение после координатора на основе плана."""
-    if not state.get("plan"):
-        return "end"
-    first_step = state["plan"]
-    return first_step
+
+def route_after_coordinator(state: AgentState) -> list[str] | str:
+    """
+    Маршрутизирует выполнение после координатора на основе плана.
+    Все шаги поиска из плана запускаются параллельно, их результаты
+    объединяет редьюсер `retrieved_documents` перед оценкой релевантности.
+    План без поиска сразу идет к финализатору: пользователь получает ответ,
+    а история — сжатие.
+    """
+    retrieval_steps = [step for step in state.get("plan") or [] if step in RETRIEVAL_STEPS]
+    return retrieval_steps or "ResponseFinalizerAgent"
+
 
 def route_after_retrieval_evaluation(state: AgentState) -> str:
     """Маршрутизирует после оценки релевантности поиска."""
     attempts = state.get("retrieval_attempts", 0)
-    if state.get("retrieval_relevance") == "Irrelevant" and attempts < 2:
+    if state.get("retrieval_relevance") == IRRELEVANT and attempts < 2:
         return "refine"
     else:
-        # Находим следующий шаг после поиска в плане
+        # Находим следующий шаг после последнего шага поиска в плане
         plan = state["plan"]
-        current_step_index = -1
-        if "LegalSearchAgent" in plan:
-            current_step_index = plan.index("LegalSearchAgent")
-        elif "WebSearchAgent" in plan:
-            current_step_index = plan.index("WebSearchAgent")
-        
-        if current_step_index!= -1 and current_step_index + 1 < len(plan):
+        current_step_index = max((i for i, step in enumerate(plan) if step in RETRIEVAL_STEPS), default=-1)
+
+        if current_step_index != -1 and current_step_index + 1 < len(plan):
             return plan[current_step_index + 1]
         return "end"
 
+
 def route_after_analysis(state: AgentState) -> str:
     """Маршрутизация после анализа документов."""
     plan = state["plan"]
@@ -159,4 +222,4 @@ def route_after_analysis(state: AgentState) -> str:
             return plan[current_step_index + 1]
     except ValueError:
         pass
-    return "end"
\ No newline at end of file
+    return "end"
@@ -0,0 +1,133 @@
+# src/graph/relevance.py
+
+import re
+from dataclasses import dataclass
+
+from langchain_core.documents import Document
+from langchain_core.prompts import ChatPromptTemplate
+
+from src.agents.llm_factory import get_fast_llm
+from src.core.config import settings
+from src.graph.documents import document_snippet
+
+# Оценка релевантности найденных документов для цикла самокоррекции.
+# Локальная оценка использует сигналы, которые поиск уже посчитал:
+# сходство эмбеддингов и ts_rank базы знаний, оценку Tavily для веба.
+# LLM спрашивается только в пограничных случаях.
+
+RELEVANT, IRRELEVANT = "Relevant", "Irrelevant"
+
+eval_chain = ChatPromptTemplate.from_template(
+    """Оцени, являются ли следующие документы релевантными для ответа на запрос пользователя.
+    Ответь только 'Relevant' или 'Irrelevant'.
+
+    Запрос пользователя: {query}
+    Найденные документы: {documents}
+    """
+) | get_fast_llm()
+
+
+@dataclass
+class RelevanceVerdict:
+    label: str  # RELEVANT | IRRELEVANT | None (пограничный случай)
+    score: float | None
+    source: str  # 'local' | 'llm'
+
+
+def _scale(value: float | None, low: float, high: float) -> float:
+    """Линейно переводит сигнал в [0, 1]: ниже low — 0, выше high — 1."""
+    if value is None:
+        return 0.0
+    return min(1.0, max(0.0, (value - low) / (high - low)))
+
+
+def document_score(doc) -> float:
+    """Оценка одного документа — сильнейший из его сигналов после калибровки."""
+    metadata = doc.metadata if isinstance(doc, Document) else doc if isinstance(doc, dict) else {}
+    return max(
+        _scale(metadata.get("vector_similarity"),
+               settings.RELEVANCE_SIMILARITY_LOW, settings.RELEVANCE_SIMILARITY_HIGH),
+        _scale(metadata.get("fts_rank"), settings.RELEVANCE_FTS_RANK_LOW, settings.RELEVANCE_FTS_RANK_HIGH),
+        _scale(metadata.get("score"), settings.RELEVANCE_WEB_SCORE_LOW, settings.RELEVANCE_WEB_SCORE_HIGH),
+    )
+
+
+def retrieval_score(documents: list) -> float:
+    """Средняя оценка RELEVANCE_TOP_N лучших документов."""
+    scores = sorted((document_score(doc) for doc in documents), reverse=True)[:settings.RELEVANCE_TOP_N]
+    return sum(scores) / len(scores) if scores else 0.0
+
+
+class LocalRelevanceEvaluator:
+    """Без сетевых вызовов; между порогами отказа и принятия возвращает label=None."""
+
+    async def evaluate(self, query: str, documents: list) -> RelevanceVerdict:
+        score = retrieval_score(documents)
+        if score >= settings.RELEVANCE_ACCEPT:
+            label = RELEVANT
+        elif score <= settings.RELEVANCE_REJECT:
+            label = IRRELEVANT
+        else:
+            label = None
+        return RelevanceVerdict(label, score, "local")
+
+
+_VERDICT = re.compile(r"\b(not\s+relevant|irrelevant|relevant|не\s*релевант\w*|релевант\w*)", re.IGNORECASE)
+
+
+def parse_llm_verdict(content: str) -> str:
+    # Первый вердикт целиком: подстрока "relevant" есть и в "Irrelevant",
+    # а "not relevant" и "нерелевантно" — отрицания. Модель может ответить по-русски
+    match = _VERDICT.search(content)
+    if match is None:
+        return IRRELEVANT
+    verdict = match.group(1).lower()
+    return RELEVANT if verdict == "relevant" or verdict.startswith("релевант") else IRRELEVANT
+
+
+class LLMRelevanceEvaluator:
+    async def evaluate(self, query: str, documents: list) -> RelevanceVerdict:
+        response = await eval_chain.ainvoke({
+            "query": query,
+            # Для оценки достаточно сниппетов, полный текст нужен только анализу
+            "documents": "\n".join(document_snippet(doc) for doc in documents),
+        })
+        return RelevanceVerdict(parse_llm_verdict(response.content), None, "llm")
+
+
+class HybridRelevanceEvaluator:
+    """Локальная оценка; LLM — только для пограничных случаев."""
+
+    def __init__(self, local=None, llm=None):
+        self.local = local or LocalRelevanceEvaluator()
+        self.llm = llm or LLMRelevanceEvaluator()
+
+    async def evaluate(self, query: str, documents: list) -> RelevanceVerdict:
+        verdict = await self.local.evaluate(query, documents)
+        if verdict.label is not None:
+            return verdict
+        llm_verdict = await self.llm.evaluate(query, documents)
+        llm_verdict.score = verdict.score
+        return llm_verdict
+
+
+class StrictLocalRelevanceEvaluator(LocalRelevanceEvaluator):
+    """Только локальная оценка: пограничный случай считается релевантным."""
+
+    async def evaluate(self, query: str, documents: list) -> RelevanceVerdict:
+        verdict = await super().evaluate(query, documents)
+        if verdict.label is None:
+            verdict.label = RELEVANT
+        return verdict
+
+
+RELEVANCE_EVALUATORS = {
+    "hybrid": HybridRelevanceEvaluator,
+    "local": StrictLocalRelevanceEvaluator,
+    "llm": LLMRelevanceEvaluator,
+}
+
+
+def get_relevance_evaluator(name: str | None = None):
+    """Оценщик по имени из RELEVANCE_EVALUATOR: 'hybrid' | 'local' | 'llm'."""
+    return RELEVANCE_EVALUATORS[name or settings.RELEVANCE_EVALUATOR]()
@@ -1,37 +1,250 @@
 # src/graph/tools/kb_search.py
 
 import asyncio
+import math
+import time
+from langchain_core.documents import Document
 from langchain_core.tools import tool
 from langchain_openai import OpenAIEmbeddings
 from sqlalchemy import text
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
 from src.core.config import settings
+from src.core.embedding_cache import CachedEmbeddings
+from src.core.replay import replay_http_client
+from src.core.single_flight import SingleFlight, normalize_query
+from src.core.tokens import truncate_to_tokens
+from src.db.knowledge_base import embedding_index_expression
+from src.db.session import session_manager
 
-# Инициализация модели для эмбеддингов вне функции для переиспользования
-embeddings_model = OpenAIEmbeddings(model="text-embedding-3-large", api_key=settings.OPENAI_API_KEY)
+# Инициализация модели для эмбеддингов вне функции для переиспользования.
+# Повторные запросы (уточнения, типовые вопросы) берутся из кэша.
+# Размерность задается в настройках и совпадает со столбцом knowledge_base.embedding.
+embeddings_model = CachedEmbeddings(
+    OpenAIEmbeddings(
+        model=settings.EMBEDDING_MODEL,
+        dimensions=settings.EMBEDDING_DIMENSIONS,
+        api_key=settings.OPENAI_API_KEY,
+        http_async_client=replay_http_client("openai"),
+    )
+)
 
-async def fts_search(session, query: str, user_id: int, limit: int = 10):
-    sql = text("""
-        SELECT id, ts_rank(content_tsv, plainto_tsquery(:query)) AS rank
+# Верхняя оценка символов на токен: текст обрезается в SQL, чтобы не тянуть
+# из БД документы целиком, а точная обрезка по токенам делается в Python.
+_CHARS_PER_TOKEN = 8
+
+_TSQUERY_PARSERS = {"websearch": "websearch_to_tsquery", "plain": "plainto_tsquery"}
+
+
+def _tsquery() -> str:
+    """
+    Выражение tsquery для запроса пользователя. Конфигурация та же, что у
+    генерируемого столбца content_tsv, поэтому условие @@ использует GIN-индекс.
+    """
+    return f"{_TSQUERY_PARSERS[settings.FTS_QUERY_PARSER]}(CAST(:fts_config AS regconfig), :query)"
+
+
+def _document_columns() -> str:
+    # Поля документа, возвращаемые каждой веткой поиска вместе с рангом.
+    # ts_headline считается во внешнем запросе — только для строк после LIMIT.
+    return f"""
+        kb.source_type,
+        left(kb.content, :max_chars) AS content,
+        kb.metadata,
+        ts_headline(CAST(:fts_config AS regconfig), kb.content, {_tsquery()}, :headline_options) AS snippet
+    """
+
+
+def _fts_branch() -> str:
+    """Индексируемый FTS: только документы, совпавшие с запросом, с нормализованным рангом."""
+    return f"""
+        SELECT id, ts_rank(content_tsv, {_tsquery()}, :rank_normalization) AS rank
         FROM knowledge_base
-        WHERE owner_id = :user_id
+        WHERE owner_id = :user_id AND content_tsv @@ {_tsquery()}
         ORDER BY rank DESC
         LIMIT :limit
-    """)
-    result = await session.execute(sql, {"query": query, "user_id": user_id, "limit": limit})
-    return [(row.id, row.rank) for row in result]
+    """
 
-async def vector_search(session, embedding, user_id: int, limit: int = 10):
-    sql = text("""
-        SELECT id, 1 - (embedding <#> :embedding) AS score
-        FROM knowledge_base
-        WHERE owner_id = :user_id
-        ORDER BY embedding <#> :embedding
+
+def _document_params(query: str) -> dict:
+    return {
+        "query": query,
+        "fts_config": settings.FTS_CONFIG,
+        "rank_normalization": settings.FTS_RANK_NORMALIZATION,
+        "max_chars": settings.KB_DOC_TOKEN_BUDGET * _CHARS_PER_TOKEN,
+        "headline_options": settings.KB_HEADLINE_OPTIONS,
+    }
+
+# --- Настройка ANN-поиска под размер арендатора ---
+# Глобальный HNSW-индекс фильтрует owner_id уже после обхода графа: у маленьких
+# арендаторов в большой таблице почти все кандидаты отбрасываются. Поэтому
+# маленькие арендаторы ищутся точным перебором своих строк (по индексу owner_id),
+# а большие — по HNSW с ef_search, подобранным под долю их строк, и с
+# итеративным сканированием pgvector >= 0.8.
+
+
+_tenant_stats_cache: dict[int, tuple[float, int, int]] = {}
+
+
+async def tenant_stats(session, user_id: int) -> tuple[int, int]:
+    """Возвращает (строк у арендатора, строк всего) с кэшированием на KB_TENANT_STATS_TTL."""
+    cached = _tenant_stats_cache.get(user_id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1], cached[2]
+    row = (await session.execute(text("""
+        SELECT
+            (SELECT count(*) FROM knowledge_base WHERE owner_id = :user_id) AS tenant_rows,
+            (SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = 'knowledge_base'::regclass) AS total_rows
+    """), {"user_id": user_id})).one()
+    tenant_rows, total_rows = row.tenant_rows, max(row.total_rows, row.tenant_rows)
+    _tenant_stats_cache[user_id] = (time.monotonic() + settings.KB_TENANT_STATS_TTL, tenant_rows, total_rows)
+    return tenant_rows, total_rows
+
+
+def ef_search_for(limit: int, tenant_rows: int, total_rows: int) -> int:
+    """ef_search, при котором после фильтра по owner_id ожидаемо остается limit кандидатов."""
+    # При секционировании по owner_id HNSW обходит только секцию арендатора
+    scanned_rows = max(1, total_rows / max(1, settings.KB_PARTITIONS))
+    selectivity = min(1.0, max(tenant_rows, 1) / scanned_rows)
+    ef = math.ceil(limit * settings.KB_EF_SEARCH_OVERSAMPLE / selectivity)
+    return max(settings.KB_EF_SEARCH_MIN, min(settings.KB_EF_SEARCH_MAX, ef))
+
+
+async def prepare_vector_scan(session, user_id: int, limit: int, strategy: str | None = None) -> bool:
+    """
+    Выбирает способ векторного поиска для запроса и настраивает HNSW
+    параметрами уровня транзакции. Возвращает True для точного перебора.
+    Стратегии: 'auto' (по размеру арендатора), 'exact', 'hnsw' (без настройки).
+    """
+    strategy = strategy or settings.KB_ANN_STRATEGY
+    if strategy in ("exact", "hnsw"):
+        return strategy == "exact"
+
+    tenant_rows, total_rows = await tenant_stats(session, user_id)
+    if tenant_rows <= settings.KB_EXACT_SCAN_MAX_ROWS:
+        return True
+
+    params = {"ef": str(ef_search_for(limit, tenant_rows, total_rows))}
+    sql = "SELECT set_config('hnsw.ef_search', :ef, true)"
+    if settings.KB_HNSW_ITERATIVE_SCAN != "off":
+        params["iterative"] = settings.KB_HNSW_ITERATIVE_SCAN
+        sql += ", set_config('hnsw.iterative_scan', :iterative, true)"
+    await session.execute(text(sql), params)
+    return False
+
+
+def _distance_order(exact: bool) -> str:
+    # "+ 0" делает выражение неиндексируемым: планировщик сортирует строки
+    # арендатора, найденные по индексу owner_id, то есть ищет точно.
+    return "(embedding <#> :embedding) + 0" if exact else "embedding <#> :embedding"
+
+
+# Правая часть сравнения для квантованных индексов: вектор запроса приводится
+# к тому же представлению, что и индексируемое выражение.
+_QUANTIZED_QUERY = {
+    "halfvec": "<#> CAST(:embedding AS vector({dim}))::halfvec({dim})",
+    "binary": "<~> binary_quantize(CAST(:embedding AS vector({dim})))::bit({dim})",
+}
+
+
+def _quantized(exact: bool) -> bool:
+    return not exact and settings.KB_VECTOR_INDEX in _QUANTIZED_QUERY
+
+
+def _ann_limit(limit: int, exact: bool) -> int:
+    """Сколько кандидатов запрашивать у HNSW (с запасом под уточнение порядка)."""
+    return limit * settings.KB_RERANK_OVERSAMPLE if _quantized(exact) else limit
+
+
+def _vector_branch(exact: bool) -> str:
+    """
+    Ветка ANN: id и расстояние до запроса по полным векторам. При квантованном
+    индексе HNSW отбирает :candidates строк по сжатому представлению, а
+    итоговые :limit выбираются по точному скалярному произведению.
+    """
+    if not _quantized(exact):
+        return f"""
+            SELECT id, embedding <#> :embedding AS distance
+            FROM knowledge_base
+            WHERE owner_id = :user_id
+            ORDER BY {_distance_order(exact)}
+            LIMIT :limit
+        """
+    kind, dim = settings.KB_VECTOR_INDEX, settings.EMBEDDING_DIMENSIONS
+    return f"""
+        SELECT id, embedding <#> :embedding AS distance
+        FROM (
+            SELECT id, embedding
+            FROM knowledge_base
+            WHERE owner_id = :user_id
+            ORDER BY {embedding_index_expression(kind, dim)} {_QUANTIZED_QUERY[kind].format(dim=dim)}
+            LIMIT :candidates
+        ) candidates
+        ORDER BY distance
         LIMIT :limit
+    """
+
+
+async def fts_search(session, query: str, user_id: int, limit: int = 10):
+    sql = text(f"""
+        SELECT f.id, f.rank, {_document_columns()}
+        FROM ({_fts_branch()}) f
+        JOIN knowledge_base kb ON kb.id = f.id
+        ORDER BY f.rank DESC
+    """)
+    result = await session.execute(sql, {**_document_params(query), "user_id": user_id, "limit": limit})
+    return [row._asdict() for row in result]
+
+
+async def vector_search(session, query: str, embedding, user_id: int, limit: int = 10, strategy: str | None = None):
+    exact = await prepare_vector_scan(session, user_id, _ann_limit(limit, exact=False), strategy)
+    sql = text(f"""
+        SELECT v.id, -v.distance AS similarity, {_document_columns()}
+        FROM ({_vector_branch(exact)}) v
+        JOIN knowledge_base kb ON kb.id = v.id
+        ORDER BY v.distance
     """)
-    result = await session.execute(sql, {"embedding": embedding, "user_id": user_id, "limit": limit})
-    return [(row.id, row.score) for row in result]
+    result = await session.execute(sql, {
+        **_document_params(query), "embedding": embedding, "user_id": user_id,
+        "limit": limit, "candidates": _ann_limit(limit, exact),
+    })
+    return [row._asdict() for row in result]
+
+
+async def fused_search(session, query: str, embedding, user_id: int, limit: int = 10, top_k: int = 10, k: int = 60):
+    """
+    Обе ветки, RRF и загрузка документов в одном SQL-запросе: один сетевой
+    круг вместо двух. Ранги считаются с нуля, как в reciprocal_rank_fusion.
+    """
+    exact = await prepare_vector_scan(session, user_id, _ann_limit(limit, exact=False))
+    sql = text(f"""
+        WITH fts AS (
+            SELECT id, rank, row_number() OVER (ORDER BY rank DESC) - 1 AS rnk
+            FROM ({_fts_branch()}) f
+        ),
+        vec AS (
+            SELECT id, distance, row_number() OVER (ORDER BY distance) - 1 AS rnk
+            FROM ({_vector_branch(exact)}) v
+        ),
+        fused AS (
+            SELECT COALESCE(fts.id, vec.id) AS id,
+                   fts.rank,
+                   -vec.distance AS similarity,
+                   COALESCE(1.0 / (:k + fts.rnk), 0) + COALESCE(1.0 / (:k + vec.rnk), 0) AS score
+            FROM fts FULL OUTER JOIN vec ON fts.id = vec.id
+            ORDER BY score DESC
+            LIMIT :top_k
+        )
+        SELECT fused.id, fused.rank, fused.similarity, fused.score, {_document_columns()}
+        FROM fused
+        JOIN knowledge_base kb ON kb.id = fused.id
+        ORDER BY fused.score DESC
+    """)
+    result = await session.execute(sql, {
+        **_document_params(query), "embedding": embedding, "user_id": user_id,
+        "limit": limit, "candidates": _ann_limit(limit, exact), "top_k": top_k, "k": k,
+    })
+    return [row._asdict() for row in result]
+
 
 def reciprocal_rank_fusion(results: list[list[tuple]], k: int = 60) -> list[tuple[int, float]]:
     """Выполняет слияние ранжированных списков с использованием Reciprocal Rank Fusion."""
@@ -41,24 +254,92 @@ def reciprocal_rank_fusion(results: list[list[tuple]], k: int = 60) -> list[tupl
             if doc_id not in fused_scores:
                 fused_scores[doc_id] = 0
             fused_scores[doc_id] += 1 / (rank + k)
-    
+
     reranked_results = sorted(fused_scores.items(), key=lambda x: x[1], reverse=True)
     return reranked_results
 
+
+def _to_document(row: dict, score: float) -> Document:
+    """Собирает Document из строки поиска, обрезая текст до бюджета токенов."""
+    metadata = dict(row.get("metadata") or {})
+    metadata.update({
+        "id": row["id"],
+        "source_type": row["source_type"],
+        "origin": "knowledge_base",
+        "snippet": row["snippet"],
+        "rrf_score": float(score),
+        "fts_rank": float(row["rank"]) if row.get("rank") is not None else None,
+        "vector_similarity": float(row["similarity"]) if row.get("similarity") is not None else None,
+    })
+    return Document(
+        page_content=truncate_to_tokens(row["content"], settings.KB_DOC_TOKEN_BUDGET),
+        metadata=metadata,
+    )
+
+
+def _fuse_rows(fts: list[dict], vect: list[dict], top_k: int, k: int) -> list[Document]:
+    rows = {}
+    for row in vect + fts:
+        rows.setdefault(row["id"], {}).update({key: value for key, value in row.items() if value is not None})
+    fused = reciprocal_rank_fusion([
+        [(row["id"], row["rank"]) for row in fts],
+        [(row["id"], row["similarity"]) for row in vect],
+    ], k=k)
+    return [_to_document(rows[doc_id], score) for doc_id, score in fused[:top_k]]
+
+
+async def retrieve(query: str, query_embedding, user_id: int, mode: str | None = None) -> list[Document]:
+    """
+    Ранжирует документы пользователя одной из стратегий:
+    'sequential' — ветки по очереди в одной сессии,
+    'parallel' — ветки одновременно на двух соединениях из пула,
+    'fused' — один CTE-запрос с RRF на стороне Postgres.
+    Текст, метаданные и сниппет загружаются тем же запросом, что и ранги.
+    """
+    mode = mode or settings.HYBRID_SEARCH_MODE
+    limit, top_k, k = settings.HYBRID_SEARCH_BRANCH_LIMIT, settings.HYBRID_SEARCH_TOP_K, settings.RRF_K
+
+    if mode == "fused":
+        async with session_manager.session() as session:
+            rows = await fused_search(session, query, query_embedding, user_id, limit, top_k, k)
+        return [_to_document(row, row["score"]) for row in rows]
+
+    if mode == "parallel":
+        async def _fts():
+            async with session_manager.session() as session:
+                return await fts_search(session, query, user_id, limit)
+
+        async def _vector():
+            async with session_manager.session() as session:
+                return await vector_search(session, query, query_embedding, user_id, limit)
+
+        fts, vect = await asyncio.gather(_fts(), _vector())
+    elif mode == "sequential":
+        async with session_manager.session() as session:
+            fts = await fts_search(session, query, user_id, limit)
+            vect = await vector_search(session, query, query_embedding, user_id, limit)
+    else:
+        raise ValueError(f"Неизвестный режим гибридного поиска: {mode}")
+
+    return _fuse_rows(fts, vect, top_k, k)
+
+# Одинаковые одновременные запросы к базе знаний одного пользователя
+_search_flights = SingleFlight("hybrid_search")
+
+
+async def _hybrid_search(query: str, user_id: int) -> list[Document]:
+    # Сессии берутся из общего пула приложения: без создания движка и
+    # повторного рукопожатия с БД на каждый вызов.
+    query_embedding = await embeddings_model.aembed_query(query)
+    return await retrieve(query, query_embedding, user_id)
+
+
 @tool
-def hybrid_search(query: str, user_id: int) -> str:
+async def hybrid_search(query: str, user_id: int) -> list[Document]:
     """
     Выполняет гибридный поиск (векторный + полнотекстовый) по юридическим документам пользователя.
-    Возвращает id топ-N документов.
+    Возвращает топ-N документов с текстом, метаданными и сниппетом.
     """
-    engine = create_async_engine(settings.DATABASE_URL)
-    session_factory = async_sessionmaker(bind=engine)
-    async def _search():
-        query_embedding = await embeddings_model.aembed_query(query)
-        async with session_factory() as session:
-            fts = await fts_search(session, query, user_id)
-            vect = await vector_search(session, query_embedding, user_id)
-            fused = reciprocal_rank_fusion([fts, vect])
-            top_ids = [doc_id for doc_id, _ in fused[:10]]
-            return top_ids
-    return asyncio.run(_search())
\ No newline at end of file
+    # База знаний у каждого пользователя своя: user_id входит в ключ
+    key = f"{user_id}:{settings.HYBRID_SEARCH_MODE}:{normalize_query(query)}"
+    return await _search_flights.do(key, lambda: _hybrid_search(query, user_id))
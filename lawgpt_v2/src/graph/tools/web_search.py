@@ -1,11 +1,93 @@
 # src/graph/tools/web_search.py
 
+import asyncio
+import logging
+from functools import partial
+
 from langchain_community.tools.tavily_search import TavilySearchResults
+from langchain_core.documents import Document
 from src.core.config import settings
+from src.core.metrics import record_cache
+from src.core.replay import replayed
+from src.core.single_flight import SingleFlight, normalize_query
+from src.core.web_search_cache import WebSearchCache, query_class
+
+logger = logging.getLogger(__name__)
+
+# Одинаковые одновременные запросы в интернет. Результаты не зависят от
+# пользователя, поэтому объединяются и кэшируются запросы всех арендаторов
+_search_flights = SingleFlight("web_search")
+web_search_cache = WebSearchCache()
+
+# Фоновые обновления устаревших записей: ссылки держатся до завершения задач
+_refreshes: set[asyncio.Task] = set()
+
+
+class CachedTavilySearchResults(TavilySearchResults):
+    """
+    Поиск Tavily с кэшем в Redis (см. src/core/web_search_cache.py), объединением
+    одновременных запросов и записью/воспроизведением ответов (src/core/replay.py).
+    """
+
+    def _request(self, query: str) -> dict:
+        return {"query": normalize_query(query), "max_results": self.max_results, "search_depth": self.search_depth}
+
+    async def _arun(self, query: str, run_manager=None):
+        request = self._request(query)
+        if not settings.WEB_SEARCH_CACHE_ENABLED:
+            return await self._search(request, query, run_manager)
+        key = web_search_cache.key(request)
+        cached = await web_search_cache.get(key)
+        if cached is None:
+            record_cache("web_search", "miss")
+            return await self._search(request, query, run_manager, key)
+        if cached.fresh:
+            record_cache("web_search", "hit")
+        else:
+            record_cache("web_search", "stale")
+            if await web_search_cache.claim_refresh(key):
+                task = asyncio.create_task(self._refresh(request, query, key))
+                _refreshes.add(task)
+                task.add_done_callback(_refreshes.discard)
+        return cached.content, cached.artifact
+
+    async def _search(self, request: dict, query: str, run_manager=None, key: str | None = None):
+        """Запрос к Tavily; успешный результат кладется в кэш под key."""
+        async def fetch():
+            # Из кассеты пара (результаты, ответ API) возвращается списком JSON
+            content, artifact = await replayed(
+                "tavily", request, partial(TavilySearchResults._arun, self, query, run_manager),
+            )
+            # Строка вместо списка — ошибка API: она не кэшируется
+            if key and isinstance(content, list):
+                await web_search_cache.set(key, content, artifact, query_class(query))
+            return content, artifact
+
+        return await _search_flights.do(web_search_cache.key(request), fetch)
+
+    async def _refresh(self, request: dict, query: str, key: str):
+        try:
+            await self._search(request, query, key=key)
+        except Exception as exc:
+            logger.warning("Не удалось обновить результат поиска %r: %s", query, exc)
+
 
 # Инициализация инструмента для поиска в интернете
-web_search_tool = TavilySearchResults(
+web_search_tool = CachedTavilySearchResults(
     max_results=5,
     api_key=settings.TAVILY_API_KEY,
     description="Полезен для поиска актуальной информации, новостей или общих юридических определений в интернете."
-)
\ No newline at end of file
+)
+
+
+def web_results_to_documents(results) -> list[Document]:
+    """Преобразует ответ Tavily в документы. Строка означает ошибку инструмента."""
+    if not isinstance(results, list):
+        return []
+    return [
+        Document(
+            page_content=item.get("content", ""),
+            metadata={"source": item.get("url"), "score": item.get("score"), "origin": "web"},
+        )
+        for item in results
+    ]
@@ -0,0 +1,50 @@
+# src/ingestion/chunking.py
+
+import hashlib
+import re
+from dataclasses import dataclass, field
+
+from src.core.config import settings
+from src.core.tokens import split_by_tokens
+from src.ingestion.parsers import Page
+
+_SPACES = re.compile(r"[ \t\u00a0]+")
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+
+
+@dataclass
+class Chunk:
+    page: int
+    index: int  # номер фрагмента на странице
+    text: str
+    hash: str = field(init=False)
+
+    def __post_init__(self):
+        self.hash = content_hash(self.text)
+
+
+def content_hash(text: str) -> str:
+    """Ключ дедупликации фрагмента: SHA-256 нормализованного текста."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def normalize_text(text: str) -> str:
+    """Схлопывает пробелы и пустые строки, оставшиеся после извлечения текста."""
+    return _BLANK_LINES.sub("\n\n", _SPACES.sub(" ", text)).strip()
+
+
+def chunk_pages(pages: list[Page], max_tokens: int | None = None, overlap: int | None = None) -> list[Chunk]:
+    """
+    Делит страницы на фрагменты по токенам с перекрытием.
+    Фрагмент не выходит за границу страницы, чтобы ссылка на страницу была точной.
+    """
+    max_tokens = max_tokens or settings.INGEST_CHUNK_TOKENS
+    overlap = settings.INGEST_CHUNK_OVERLAP if overlap is None else overlap
+    chunks = []
+    for page in pages:
+        text = normalize_text(page.text)
+        if not text:
+            continue
+        for index, part in enumerate(split_by_tokens(text, max_tokens, overlap=overlap)):
+            chunks.append(Chunk(page.number, index, part))
+    return chunks
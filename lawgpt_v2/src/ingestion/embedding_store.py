@@ -0,0 +1,44 @@
+# src/ingestion/embedding_store.py
+
+from sqlalchemy import text
+
+# Запросы к общему хранилищу эмбеддингов и к хэшам фрагментов арендатора.
+# Векторы передаются как есть: кодек pgvector зарегистрирован на соединении.
+
+
+async def existing_hashes(session, owner_id: int, hashes: list[str]) -> set[str]:
+    """Хэши фрагментов, которые уже есть в базе знаний арендатора."""
+    if not hashes:
+        return set()
+    result = await session.execute(
+        text("SELECT content_hash FROM knowledge_base WHERE owner_id = :owner_id AND content_hash = ANY(:hashes)"),
+        {"owner_id": owner_id, "hashes": hashes},
+    )
+    return set(result.scalars())
+
+
+async def load_embeddings(session, model: str, hashes: list[str]) -> dict:
+    """Готовые векторы по хэшам фрагментов для пространства имен модели."""
+    if not hashes:
+        return {}
+    result = await session.execute(
+        text(
+            "SELECT content_hash, embedding FROM embedding_store "
+            "WHERE model = :model AND content_hash = ANY(:hashes)"
+        ),
+        {"model": model, "hashes": hashes},
+    )
+    return dict(result.tuples())
+
+
+async def save_embeddings(session, model: str, vectors: dict):
+    """Сохраняет новые векторы; параллельная загрузка того же фрагмента не мешает."""
+    if not vectors:
+        return
+    await session.execute(
+        text(
+            "INSERT INTO embedding_store (model, content_hash, embedding) "
+            "VALUES (:model, :content_hash, :embedding) ON CONFLICT DO NOTHING"
+        ),
+        [{"model": model, "content_hash": key, "embedding": vector} for key, vector in vectors.items()],
+    )
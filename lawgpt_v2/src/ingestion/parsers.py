@@ -0,0 +1,77 @@
+# src/ingestion/parsers.py
+
+import zipfile
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+from typing import Iterator
+from xml.etree import ElementTree
+
+import pymupdf
+
+from src.core.config import settings
+
+# Потоковый разбор документов: в памяти одновременно находится одна страница
+# PDF или одна «страница» абзацев DOCX, а не весь файл.
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+class UnsupportedDocumentError(ValueError):
+    """Формат файла не поддерживается загрузчиком."""
+
+
+@dataclass
+class Page:
+    number: int  # с нуля
+    text: str
+
+
+def iter_pdf_pages(path: str, start: int = 0) -> Iterator[Page]:
+    # PyMuPDF загружает страницы по требованию; объект страницы освобождается
+    # на следующей итерации
+    with pymupdf.open(path) as document:
+        for number in range(start, document.page_count):
+            yield Page(number, document.load_page(number).get_text("text"))
+
+
+def iter_docx_paragraphs(path: str) -> Iterator[str]:
+    # python-docx строит DOM всего document.xml, поэтому абзацы читаются
+    # iterparse'ом прямо из архива, а разобранные элементы сразу очищаются
+    with zipfile.ZipFile(path) as archive, archive.open("word/document.xml") as xml:
+        for _, element in ElementTree.iterparse(xml, events=("end",)):
+            if element.tag != f"{_W}p":
+                continue
+            text = "".join(node.text or "" for node in element.iter(f"{_W}t"))
+            element.clear()
+            if text.strip():
+                yield text
+
+
+def iter_docx_pages(path: str, start: int = 0) -> Iterator[Page]:
+    paragraphs = iter_docx_paragraphs(path)
+    per_page = settings.INGEST_DOCX_PARAGRAPHS_PER_PAGE
+    number = 0
+    while batch := list(islice(paragraphs, per_page)):
+        if number >= start:
+            yield Page(number, "\n".join(batch))
+        number += 1
+
+
+_PARSERS = {".pdf": iter_pdf_pages, ".docx": iter_docx_pages}
+
+
+def iter_pages(path: str, start: int = 0) -> Iterator[Page]:
+    """Страницы документа начиная со страницы start (для продолжения загрузки)."""
+    parser = _PARSERS.get(Path(path).suffix.lower())
+    if parser is None:
+        raise UnsupportedDocumentError(f"Неподдерживаемый формат документа: {path}")
+    return parser(path, start)
+
+
+def count_pages(path: str) -> int | None:
+    """Число страниц PDF без разбора текста; для DOCX заранее неизвестно."""
+    if Path(path).suffix.lower() != ".pdf":
+        return None
+    with pymupdf.open(path) as document:
+        return document.page_count
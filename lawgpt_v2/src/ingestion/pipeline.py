@@ -0,0 +1,273 @@
+# src/ingestion/pipeline.py
+#
+# Загрузка файла в базу знаний окнами страниц. Три стадии работают одновременно
+# и связаны очередями ограниченной длины:
+#
+#   разбор (один поток) → эмбеддинги (INGEST_EMBED_CONCURRENCY запросов) → COPY
+#
+# Каждое окно записывается одной транзакцией вместе с ingestion_jobs.next_page,
+# поэтому повторный запуск задачи продолжает с первой незаписанной страницы.
+# Фрагменты, которые уже есть у арендатора, не вставляются повторно, а векторы
+# одинаковых фрагментов из любых загрузок берутся из embedding_store.
+
+import asyncio
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+from langchain_openai import OpenAIEmbeddings
+from sqlalchemy import select, text, update
+from sqlalchemy.dialects.postgresql import insert
+
+from src.core.answer_cache import bump_kb_version
+from src.core.config import settings
+from src.core.embedding_cache import embedding_namespace
+from src.core.tokens import count_tokens
+from src.db.ingestion_job import IngestionJob
+from src.db.session import session_manager
+from src.ingestion.chunking import Chunk, chunk_pages
+from src.ingestion.embedding_store import existing_hashes, load_embeddings, save_embeddings
+from src.ingestion.parsers import Page, count_pages, iter_pages
+
+logger = logging.getLogger(__name__)
+
+COPY_COLUMNS = ("owner_id", "source_type", "content", "content_hash", "metadata", "embedding")
+
+_END = object()
+
+
+def _embedder() -> OpenAIEmbeddings:
+    # Та же модель, что и для запросов, но свой клиент: задача Celery работает в
+    # собственном event loop, а HTTP-соединения общего клиента привязаны к чужому.
+    # Локальный кэш эмбеддингов для массовой загрузки не нужен — он только растет.
+    return OpenAIEmbeddings(
+        model=settings.EMBEDDING_MODEL,
+        dimensions=settings.EMBEDDING_DIMENSIONS,
+        api_key=settings.OPENAI_API_KEY,
+    )
+
+
+async def _start_job(job_id: str, owner_id: int, path: str, source_type: str) -> IngestionJob:
+    async with session_manager.session() as session:
+        await session.execute(
+            insert(IngestionJob)
+            .values(id=job_id, owner_id=owner_id, source_path=path, source_type=source_type,
+                    status="pending", next_page=0, chunks_ingested=0)
+            .on_conflict_do_nothing(index_elements=["id"])
+        )
+        job = (await session.execute(select(IngestionJob).where(IngestionJob.id == job_id))).scalar_one()
+        if job.status != "done":
+            job.status = "running"
+            job.error = None
+            if job.total_pages is None:
+                job.total_pages = await asyncio.to_thread(count_pages, path)
+        await session.commit()
+        return job
+
+
+async def _finish_job(job_id: str, status: str, error: str | None = None):
+    async with session_manager.session() as session:
+        await session.execute(update(IngestionJob).where(IngestionJob.id == job_id).values(status=status, error=error))
+        await session.commit()
+
+
+async def _parse_stage(path: str, start: int, out: asyncio.Queue):
+    # PyMuPDF не потокобезопасен, поэтому весь разбор идет в одном выделенном потоке
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-parse") as executor:
+        pages = await loop.run_in_executor(executor, iter_pages, path, start)
+        try:
+            while window := await loop.run_in_executor(
+                executor, lambda: list(islice(pages, settings.INGEST_PAGE_WINDOW))
+            ):
+                await out.put(window)
+        finally:
+            await loop.run_in_executor(executor, pages.close)
+    await out.put(_END)
+
+
+async def embed_texts(embedder, texts: list[str], semaphore: asyncio.Semaphore) -> list[list[float]]:
+    """Эмбеддинги пачками по INGEST_EMBED_BATCH_SIZE текстов, пачки — параллельно."""
+    size = settings.INGEST_EMBED_BATCH_SIZE
+
+    async def embed_batch(batch: list[str]) -> list[list[float]]:
+        async with semaphore:
+            return await embedder.aembed_documents(batch)
+
+    results = await asyncio.gather(*(embed_batch(texts[i:i + size]) for i in range(0, len(texts), size)))
+    return [vector for batch in results for vector in batch]
+
+
+async def _deduplicate(
+    job: IngestionJob, model: str, chunks: list[Chunk], seen: set[str],
+) -> tuple[list[Chunk], dict, int]:
+    """
+    Отбрасывает фрагменты, уже загруженные арендатором (в том числе ранее в этом
+    файле), и находит в embedding_store готовые векторы для остальных.
+    """
+    unique = {}
+    for chunk in chunks:
+        if chunk.hash not in seen:
+            unique.setdefault(chunk.hash, chunk)
+    async with session_manager.session() as session:
+        existing = await existing_hashes(session, job.owner_id, list(unique))
+        fresh = [chunk for key, chunk in unique.items() if key not in existing]
+        stored = await load_embeddings(session, model, [chunk.hash for chunk in fresh])
+    seen.update(unique)
+    return fresh, stored, len(chunks) - len(fresh)
+
+
+async def _embed_stage(job: IngestionJob, inp: asyncio.Queue, out: asyncio.Queue):
+    embedder = _embedder()
+    model = embedding_namespace(embedder)
+    semaphore = asyncio.Semaphore(settings.INGEST_EMBED_CONCURRENCY)
+    seen: set[str] = set()
+    while (window := await inp.get()) is not _END:
+        chunks = chunk_pages(window)
+        fresh, stored, duplicates = await _deduplicate(job, model, chunks, seen)
+        missing = [chunk for chunk in fresh if chunk.hash not in stored]
+        computed = {}
+        if missing:
+            vectors = await embed_texts(embedder, [chunk.text for chunk in missing], semaphore)
+            computed = {chunk.hash: vector for chunk, vector in zip(missing, vectors)}
+            async with session_manager.session() as session:
+                await save_embeddings(session, model, computed)
+                await session.commit()
+        tokens_embedded = sum(count_tokens(chunk.text, embedder.model) for chunk in missing)
+        counts = {
+            "chunks_total": len(chunks),
+            "chunks_duplicate": duplicates,
+            "embeddings_reused": len(fresh) - len(missing),
+            "tokens_embedded": tokens_embedded,
+            # Без дедупликации в API ушел бы каждый фрагмент окна
+            "tokens_saved": sum(count_tokens(chunk.text, embedder.model) for chunk in chunks) - tokens_embedded,
+        }
+        vectors = [stored[chunk.hash] if chunk.hash in stored else computed[chunk.hash] for chunk in fresh]
+        await out.put((window, fresh, vectors, counts))
+    await out.put(_END)
+
+
+def _records(job: IngestionJob, chunks: list[Chunk], vectors: list) -> list[tuple]:
+    source = Path(job.source_path).name
+    return [
+        (
+            job.owner_id,
+            job.source_type,
+            chunk.text,
+            chunk.hash,
+            # Кодек jsonb драйвера (SQLAlchemy) ожидает уже сериализованную строку
+            json.dumps({"source": source, "page": chunk.page + 1, "chunk": chunk.index, "job_id": job.id},
+                       ensure_ascii=False),
+            vector,
+        )
+        for chunk, vector in zip(chunks, vectors)
+    ]
+
+
+# Фрагменты окна сначала копируются во временную таблицу: параллельная загрузка
+# того же фрагмента арендатором (проверка existing_hashes прошла у обеих) не
+# роняет COPY на уникальном индексе, а вставка пропускает уже записанные строки
+_CREATE_INCOMING_SQL = f"""
+    CREATE TEMP TABLE knowledge_base_incoming ON COMMIT DROP AS
+    SELECT {", ".join(COPY_COLUMNS)} FROM knowledge_base WITH NO DATA
+"""
+_INSERT_INCOMING_SQL = f"""
+    INSERT INTO knowledge_base ({", ".join(COPY_COLUMNS)})
+    SELECT {", ".join(COPY_COLUMNS)} FROM knowledge_base_incoming
+    ON CONFLICT (owner_id, content_hash) DO NOTHING
+"""
+
+
+async def _write_window(job: IngestionJob, window: list[Page], chunks: list[Chunk], vectors: list, counts: dict) -> int:
+    next_page = window[-1].number + 1
+    async with session_manager.session() as session:
+        inserted = 0
+        if chunks:
+            # CREATE открывает транзакцию, COPY на том же соединении попадает в нее же;
+            # счетчики дедупликации фиксируются вместе с данными окна
+            await session.execute(text(_CREATE_INCOMING_SQL))
+            connection = await (await session.connection()).get_raw_connection()
+            await connection.driver_connection.copy_records_to_table(
+                "knowledge_base_incoming", records=_records(job, chunks, vectors), columns=COPY_COLUMNS,
+            )
+            inserted = (await session.execute(text(_INSERT_INCOMING_SQL))).rowcount
+            if inserted:
+                # Кэшированные ответы по старой базе знаний больше не действительны
+                await bump_kb_version(session, job.owner_id)
+        # Строки, которые успела записать параллельная загрузка, — тоже повторы
+        counts = {**counts, "chunks_duplicate": counts["chunks_duplicate"] + len(chunks) - inserted}
+        counters = {name: getattr(IngestionJob, name) + value for name, value in counts.items()}
+        await session.execute(
+            update(IngestionJob)
+            .where(IngestionJob.id == job.id)
+            .values(next_page=next_page, chunks_ingested=IngestionJob.chunks_ingested + inserted, **counters)
+        )
+        await session.commit()
+    return next_page
+
+
+async def _write_stage(job: IngestionJob, inp: asyncio.Queue):
+    while (item := await inp.get()) is not _END:
+        next_page = await _write_window(job, *item)
+        logger.info("Загрузка %s: записано страниц %s из %s", job.id, next_page, job.total_pages or "?")
+
+
+def job_report(job: IngestionJob) -> dict:
+    """
+    Итог загрузки. dedup_ratio — доля фрагментов файла, для которых не понадобился
+    вызов API эмбеддингов (уже были у арендатора или нашлись в embedding_store).
+    """
+    embedded = job.chunks_ingested - job.embeddings_reused
+    price = settings.EMBEDDING_PRICE_PER_1M_TOKENS / 1_000_000
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "chunks_total": job.chunks_total,
+        "chunks_ingested": job.chunks_ingested,
+        "chunks_duplicate": job.chunks_duplicate,
+        "embeddings_reused": job.embeddings_reused,
+        "dedup_ratio": (job.chunks_total - embedded) / job.chunks_total if job.chunks_total else 0.0,
+        "tokens_embedded": job.tokens_embedded,
+        "tokens_saved": job.tokens_saved,
+        "spent_usd": round(job.tokens_embedded * price, 6),
+        "saved_usd": round(job.tokens_saved * price, 6),
+    }
+
+
+async def ingest_file(job_id: str, path: str, owner_id: int, source_type: str) -> dict:
+    """
+    Загружает PDF/DOCX в knowledge_base. Идемпотентна по job_id: завершенное
+    задание не повторяется, прерванное продолжается со страницы next_page.
+    """
+    job = await _start_job(job_id, owner_id, path, source_type)
+    if job.status == "done":
+        return job_report(job)
+
+    parsed = asyncio.Queue(maxsize=settings.INGEST_PARSE_PREFETCH)
+    embedded = asyncio.Queue(maxsize=settings.INGEST_WRITE_QUEUE)
+    stages = [
+        asyncio.create_task(_parse_stage(path, job.next_page, parsed)),
+        asyncio.create_task(_embed_stage(job, parsed, embedded)),
+        asyncio.create_task(_write_stage(job, embedded)),
+    ]
+    try:
+        await asyncio.gather(*stages)
+    except Exception as exc:
+        # Остальные стадии иначе навсегда повиснут на своих очередях
+        for stage in stages:
+            stage.cancel()
+        await asyncio.gather(*stages, return_exceptions=True)
+        await _finish_job(job_id, "failed", error=str(exc))
+        raise
+
+    await _finish_job(job_id, "done")
+    async with session_manager.session() as session:
+        job = await session.get(IngestionJob, job_id)
+    report = job_report(job)
+    logger.info(
+        "Загрузка %s завершена: фрагментов %s, доля дедупликации %.1f%%, сэкономлено $%.4f",
+        job_id, report["chunks_total"], report["dedup_ratio"] * 100, report["saved_usd"],
+    )
+    return report
@@ -1,11 +1,14 @@
 # src/main.py
 
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from src.core.config import settings
-from src.db.session import sessionmanager
+from src.core.metrics import render_metrics
+from src.core.redis_client import close_redis
+from src.db.session import session_manager
 from src.api.router import api_router
 
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -13,10 +16,11 @@ async def lifespan(app: FastAPI):
     """
     print("--- Запуск приложения ---")
     # Инициализация менеджера сессий БД при старте
-    sessionmanager.init(settings.DATABASE_URL)
+    session_manager.init(settings.DATABASE_URL)
     yield
-    # Закрытие пула соединений БД при остановке
-    await sessionmanager.close()
+    # Закрытие пулов соединений БД и Redis при остановке
+    await session_manager.close()
+    await close_redis()
     print("--- Остановка приложения ---")
 
 app = FastAPI(
@@ -29,9 +33,19 @@ app = FastAPI(
 # Включение всех модульных маршрутизаторов
 app.include_router(api_router)
 
-@app.get("/", tags=)
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        """
+        Метрики Prometheus: задержки узлов, LLM, эмбеддингов и SQL, токены, кэши.
+        """
+        content, media_type = render_metrics()
+        return Response(content=content, media_type=media_type)
+
+
+@app.get("/", tags=["Health"])
 def read_root():
     """
     Корневой эндпоинт для проверки работоспособности API.
     """
-    return {"message": "Добро пожаловать в API LawGPT 2.0"}
\ No newline at end of file
+    return {"message": "Добро пожаловать в API LawGPT 2.0"}
@@ -1,5 +1,49 @@
+import asyncio
+
+from celery import group
+
 from src.core.celery_app import celery_app
+from src.core.config import settings
+from src.core.redis_client import close_redis
+from src.db.session import session_manager
+from src.ingestion.parsers import UnsupportedDocumentError
+from src.ingestion.pipeline import ingest_file
+
 
 @celery_app.task
 def example_task(x, y):
     return x + y
+
+
+async def _ingest(job_id: str, path: str, owner_id: int, source_type: str) -> dict:
+    # Каждая задача работает в своем event loop (asyncio.run), поэтому пулы,
+    # созданные в нем, закрываются до его завершения
+    try:
+        return await ingest_file(job_id, path, owner_id, source_type)
+    finally:
+        await session_manager.close()
+        await close_redis()
+
+
+@celery_app.task(
+    bind=True,
+    acks_late=True,
+    autoretry_for=(Exception,),
+    dont_autoretry_for=(UnsupportedDocumentError,),
+    retry_backoff=True,
+    max_retries=settings.INGEST_MAX_RETRIES,
+)
+def ingest_document(self, path: str, owner_id: int, source_type: str = "document", job_id: str | None = None):
+    """
+    Загружает PDF/DOCX в базу знаний. При повторе (в том числе после падения
+    воркера) id задачи сохраняется, и загрузка продолжается с места остановки.
+    """
+    return asyncio.run(_ingest(job_id or self.request.id, path, owner_id, source_type))
+
+
+@celery_app.task
+def ingest_documents(paths: list[str], owner_id: int, source_type: str = "document"):
+    """Ставит загрузку нескольких файлов параллельными задачами."""
+    result = group(ingest_document.s(path, owner_id, source_type) for path in paths).apply_async()
+    result.save()
+    return result.id
@@ -1,4 +1,3 @@
-import os
 from dotenv import dotenv_values
 
 REQUIRED_VARS = [
@@ -6,6 +5,7 @@ REQUIRED_VARS = [
     "OPENAI_API_KEY", "TAVILY_API_KEY", "LANGCHAIN_API_KEY"
 ]
 
+
 def main():
     env = dotenv_values(".env")
     missing = [var for var in REQUIRED_VARS if not env.get(var)]
@@ -14,5 +14,6 @@ def main():
         exit(1)
     print("All required environment variables are set.")
 
+
 if __name__ == "__main__":
     main()
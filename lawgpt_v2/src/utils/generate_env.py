@@ -1,12 +1,11 @@
-import os
 from pathlib import Path
-from dotenv import dotenv_values
 
 REQUIRED_VARS = [
     "DATABASE_URL", "REDIS_URL", "SECRET_KEY", "ALGORITHM", "ACCESS_TOKEN_EXPIRE_MINUTES",
     "OPENAI_API_KEY", "TAVILY_API_KEY", "LANGCHAIN_API_KEY"
 ]
 
+
 def main():
     env_path = Path(".env")
     if env_path.exists():
@@ -17,5 +16,6 @@ def main():
             f.write(f"{var}=\n")
     print(".env file generated with required variables.")
 
+
 if __name__ == "__main__":
     main()
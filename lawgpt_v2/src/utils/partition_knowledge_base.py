@@ -0,0 +1,90 @@
+# src/utils/partition_knowledge_base.py
+#
+# Переводит knowledge_base на HASH-секционирование по owner_id.
+# У каждой секции свой HNSW-индекс, поэтому векторный поиск арендатора
+# обходит граф только своей секции, а не всей таблицы.
+#
+#   python -m src.utils.partition_knowledge_base --partitions 16 [--dry-run]
+#
+# Старая таблица остается как knowledge_base_unpartitioned для отката.
+
+import argparse
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+
+from src.core.config import settings
+from src.db.knowledge_base import KnowledgeBase
+from src.db.session import session_manager
+
+OLD_TABLE = "knowledge_base_unpartitioned"
+
+
+def partition_statements(partitions: int) -> list[str]:
+    """SQL для замены knowledge_base секционированной таблицей с переносом данных."""
+    table = KnowledgeBase.__table__
+    index_names = [index.name for index in table.indexes]
+    statements = [f"ALTER TABLE knowledge_base RENAME TO {OLD_TABLE}"]
+    # Имена индексов и ограничений уникальны в схеме — освобождаем их для новой таблицы
+    statements += [f"ALTER INDEX IF EXISTS {name} RENAME TO {name}_old" for name in index_names]
+    statements += [
+        f"ALTER TABLE {OLD_TABLE} RENAME CONSTRAINT pk_knowledge_base TO pk_{OLD_TABLE}",
+        f"ALTER TABLE {OLD_TABLE} RENAME CONSTRAINT fk_knowledge_base_owner_id_users TO fk_{OLD_TABLE}_owner_id_users",
+        f"CREATE TABLE knowledge_base (LIKE {OLD_TABLE} INCLUDING DEFAULTS INCLUDING GENERATED) "
+        "PARTITION BY HASH (owner_id)",
+        # Ключ секционирования обязан входить в первичный ключ
+        "ALTER TABLE knowledge_base ADD CONSTRAINT pk_knowledge_base PRIMARY KEY (id, owner_id)",
+        "ALTER TABLE knowledge_base ADD CONSTRAINT fk_knowledge_base_owner_id_users "
+        "FOREIGN KEY (owner_id) REFERENCES users (id)",
+    ]
+    statements += [
+        f"CREATE TABLE knowledge_base_p{i} PARTITION OF knowledge_base "
+        f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {i})"
+        for i in range(partitions)
+    ]
+    statements += [
+        "ALTER SEQUENCE knowledge_base_id_seq OWNED BY knowledge_base.id",
+        # Генерируемые столбцы вычисляются заново при вставке
+        "INSERT INTO knowledge_base ({columns}) SELECT {columns} FROM {old}".format(
+            columns=", ".join(column.name for column in table.columns if column.computed is None),
+            old=OLD_TABLE,
+        ),
+    ]
+    # Индексы строятся после загрузки данных (быстрее, чем вставка в готовый HNSW);
+    # индекс на секционированной таблице создается в каждой секции
+    statements += [str(CreateIndex(index).compile(dialect=postgresql.dialect())) for index in table.indexes]
+    statements.append("ANALYZE knowledge_base")
+    return statements
+
+
+async def partition(partitions: int):
+    async with session_manager.session() as session:
+        for statement in partition_statements(partitions):
+            print(statement)
+            await session.execute(text(statement))
+        await session.commit()
+
+
+async def _run(partitions: int):
+    try:
+        await partition(partitions)
+    finally:
+        await session_manager.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HASH-секционирование knowledge_base по owner_id")
+    parser.add_argument("--partitions", type=int, default=settings.KB_PARTITIONS or 16)
+    parser.add_argument("--dry-run", action="store_true", help="Только вывести SQL")
+    args = parser.parse_args()
+    if args.dry_run:
+        print(";\n".join(partition_statements(args.partitions)) + ";")
+        return
+    asyncio.run(_run(args.partitions))
+    print(f"Готово. Установите KB_PARTITIONS={args.partitions} и удалите {OLD_TABLE} после проверки.")
+
+
+if __name__ == "__main__":
+    main()
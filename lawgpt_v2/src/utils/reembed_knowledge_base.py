@@ -0,0 +1,151 @@
+# src/utils/reembed_knowledge_base.py
+#
+# Офлайн-переход knowledge_base на другую модель, размерность эмбеддингов или
+# вариант HNSW-индекса (vector / halfvec / binary).
+#
+#   python -m src.utils.reembed_knowledge_base --dimensions 1024 --index halfvec
+#   python -m src.utils.reembed_knowledge_base --dimensions 512 --from-existing
+#   python -m src.utils.reembed_knowledge_base --index binary          # только индекс
+#
+# Новые векторы пишутся в столбец embedding_next пачками с фиксацией каждой
+# пачки, поэтому прерванный запуск продолжается с места остановки. Старый столбец
+# заменяется одной транзакцией в конце. На время перехода загрузку документов
+# лучше остановить: строки, добавленные после замены, получат старую размерность.
+
+import argparse
+import asyncio
+
+from langchain_openai import OpenAIEmbeddings
+from sqlalchemy import text
+
+from src.core.config import settings
+from src.core.embedding_cache import embedding_namespace
+from src.db.knowledge_base import VECTOR_INDEX_KINDS, embedding_index_sql
+from src.db.session import session_manager
+from src.ingestion.embedding_store import load_embeddings, save_embeddings
+from src.ingestion.pipeline import embed_texts
+
+NEXT_COLUMN = "embedding_next"
+
+
+async def current_dimensions(session) -> int:
+    # Для типа vector(n) atttypmod хранит n
+    return (await session.execute(text("""
+        SELECT atttypmod FROM pg_attribute
+        WHERE attrelid = 'knowledge_base'::regclass AND attname = 'embedding'
+    """))).scalar_one()
+
+
+def swap_statements(kind: str, dim: int, reembed: bool) -> list[str]:
+    """Замена столбца (если векторы пересчитаны) и пересборка HNSW-индекса."""
+    statements = ["DROP INDEX IF EXISTS idx_knowledge_base_embedding"]
+    if reembed:
+        statements += [
+            "ALTER TABLE knowledge_base DROP COLUMN embedding",
+            f"ALTER TABLE knowledge_base RENAME COLUMN {NEXT_COLUMN} TO embedding",
+            "ALTER TABLE knowledge_base ALTER COLUMN embedding SET NOT NULL",
+        ]
+    statements += [embedding_index_sql(kind, dim), "ANALYZE knowledge_base"]
+    return statements
+
+
+async def _truncate_existing(dim: int, batch: int) -> int:
+    # text-embedding-3-* обучены так, что первые dim координат, нормированные
+    # заново, эквивалентны запросу с dimensions=dim — API не нужен
+    sql = text(f"""
+        UPDATE knowledge_base SET {NEXT_COLUMN} = l2_normalize(subvector(embedding, 1, :dim))
+        WHERE id IN (SELECT id FROM knowledge_base WHERE {NEXT_COLUMN} IS NULL ORDER BY id LIMIT :batch)
+    """)
+    total = 0
+    while True:
+        async with session_manager.session() as session:
+            updated = (await session.execute(sql, {"dim": dim, "batch": batch})).rowcount
+            await session.commit()
+        if not updated:
+            return total
+        total += updated
+        print(f"  укорочено векторов: {total}")
+
+
+async def _reembed(embedder: OpenAIEmbeddings, batch: int) -> int:
+    model = embedding_namespace(embedder)
+    semaphore = asyncio.Semaphore(settings.INGEST_EMBED_CONCURRENCY)
+    total = 0
+    while True:
+        async with session_manager.session() as session:
+            rows = (await session.execute(text(f"""
+                SELECT id, content, content_hash FROM knowledge_base
+                WHERE {NEXT_COLUMN} IS NULL ORDER BY id LIMIT :batch
+            """), {"batch": batch})).all()
+            if not rows:
+                return total
+            # Векторы новой модели для уже встречавшихся фрагментов берутся из хранилища
+            stored = await load_embeddings(session, model, [row.content_hash for row in rows if row.content_hash])
+            missing = {row.content_hash or f"id:{row.id}": row.content for row in rows
+                       if row.content_hash not in stored}
+            computed = dict(zip(missing, await embed_texts(embedder, list(missing.values()), semaphore)))
+            await save_embeddings(session, model, {key: vector for key, vector in computed.items()
+                                                   if not key.startswith("id:")})
+            vectors = {**stored, **computed}
+            await session.execute(
+                text(f"UPDATE knowledge_base SET {NEXT_COLUMN} = :embedding WHERE id = :id"),
+                [{"id": row.id, "embedding": vectors[row.content_hash or f"id:{row.id}"]} for row in rows],
+            )
+            await session.commit()
+        total += len(rows)
+        print(f"  пересчитано векторов: {total} (из хранилища: {len(stored)} в последней пачке)")
+
+
+async def migrate(model: str, dim: int, kind: str, from_existing: bool, batch: int, dry_run: bool):
+    async with session_manager.session() as session:
+        current = await current_dimensions(session)
+    reembed = model != settings.EMBEDDING_MODEL or dim != current
+    if from_existing and (model != settings.EMBEDDING_MODEL or dim > current):
+        raise SystemExit("--from-existing только укорачивает векторы той же модели")
+
+    statements = swap_statements(kind, dim, reembed)
+    print(f"Сейчас: {settings.EMBEDDING_MODEL}, {current} измерений. Цель: {model}, {dim}, индекс {kind}.")
+    if dry_run:
+        print(";\n".join(statements) + ";")
+        return
+
+    if reembed:
+        async with session_manager.session() as session:
+            await session.execute(
+                text(f"ALTER TABLE knowledge_base ADD COLUMN IF NOT EXISTS {NEXT_COLUMN} vector({dim})")
+            )
+            await session.commit()
+        if from_existing:
+            await _truncate_existing(dim, batch)
+        else:
+            await _reembed(OpenAIEmbeddings(model=model, dimensions=dim, api_key=settings.OPENAI_API_KEY), batch)
+
+    async with session_manager.session() as session:
+        for statement in statements:
+            print(statement)
+            await session.execute(text(statement))
+        await session.commit()
+    print(f"Готово. Установите EMBEDDING_MODEL={model}, EMBEDDING_DIMENSIONS={dim}, KB_VECTOR_INDEX={kind}.")
+
+
+async def _run(args):
+    try:
+        await migrate(args.model, args.dimensions, args.index, args.from_existing, args.batch, args.dry_run)
+    finally:
+        await session_manager.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пересчет эмбеддингов и пересборка HNSW-индекса knowledge_base")
+    parser.add_argument("--model", default=settings.EMBEDDING_MODEL)
+    parser.add_argument("--dimensions", type=int, default=settings.EMBEDDING_DIMENSIONS)
+    parser.add_argument("--index", choices=list(VECTOR_INDEX_KINDS), default=settings.KB_VECTOR_INDEX)
+    parser.add_argument("--from-existing", action="store_true",
+                        help="Укоротить текущие векторы без вызова API (та же модель, меньше измерений)")
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="Только вывести SQL замены")
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
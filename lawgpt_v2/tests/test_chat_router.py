@@ -0,0 +1,98 @@
+# tests/test_chat_router.py
+
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from src.api import chat_router
+
+
+async def test_embedding_failure_is_a_cache_miss(monkeypatch):
+    async def aembed_query(text):
+        raise TimeoutError("модель эмбеддингов недоступна")
+
+    monkeypatch.setattr(chat_router.embeddings_model, "aembed_query", aembed_query)
+
+    assert await chat_router._lookup_cached_answer("вопрос", 1) is None
+
+
+class AnswerGraph:
+    """Граф, который сразу завершает ResponseFinalizerAgent с ответом."""
+
+    def __init__(self, answer: str):
+        self.answer = answer
+
+    async def astream_events(self, initial_state, config, version):
+        yield {
+            "event": "on_chain_end", "name": "ResponseFinalizerAgent", "run_id": "finalizer",
+            "metadata": {"langgraph_node": "ResponseFinalizerAgent"},
+            "data": {"output": {"final_response": self.answer}},
+        }
+
+
+async def test_store_failure_does_not_break_the_chat(monkeypatch, caplog):
+    async def lookup_cached_answer(query, user_id):
+        return SimpleNamespace(hit=False)
+
+    async def store_answer(*args):
+        raise ValueError("размерность вектора не совпала")
+
+    monkeypatch.setattr(chat_router.settings, "ANSWER_CACHE_ENABLED", True)
+    monkeypatch.setattr(chat_router, "_lookup_cached_answer", lookup_cached_answer)
+    monkeypatch.setattr(chat_router, "store_answer", store_answer)
+    monkeypatch.setattr(chat_router, "graph_app", AnswerGraph("Согласно статье 333 ГК РФ"))
+
+    frames = [json.loads(frame[len("data: "):])
+              async for frame in chat_router.event_stream_generator("t1", 1, "вопрос")]
+
+    assert frames == [
+        {"type": "final_response", "content": "Согласно статье 333 ГК РФ"},
+        {"type": "stream_end"},
+    ]
+    assert "Не удалось сохранить ответ в кэш" in caplog.text
+    assert "размерность вектора не совпала" in caplog.text
+
+
+# --- Владелец треда ---
+
+class ThreadsGraph:
+    """Граф, у которого есть только состояния тредов; запуск считается ошибкой."""
+
+    def __init__(self, threads: dict):
+        self.threads = threads
+        self.runs = 0
+
+    async def aget_state(self, config):
+        return SimpleNamespace(values=self.threads.get(config["configurable"]["thread_id"], {}))
+
+    def astream_events(self, initial_state, config, version):
+        self.runs += 1
+        raise AssertionError("граф не должен запускаться")
+
+
+def _user(user_id: int):
+    return SimpleNamespace(id=user_id)
+
+
+@pytest.mark.parametrize("resume", [True, False])
+async def test_foreign_thread_is_not_found(monkeypatch, resume):
+    graph = ThreadsGraph({"thread_1_a": {"user_id": 1, "original_query": "вопрос пользователя A"}})
+    monkeypatch.setattr(chat_router, "graph_app", graph)
+    chat_request = chat_router.ChatRequest(query="", thread_id="thread_1_a", resume=resume)
+
+    with pytest.raises(HTTPException) as error:
+        await chat_router.stream_chat(chat_request, SimpleNamespace(is_disconnected=None), _user(2))
+
+    assert error.value.status_code == 404
+    assert graph.runs == 0
+
+
+async def test_own_and_new_threads_are_streamed(monkeypatch):
+    monkeypatch.setattr(chat_router, "graph_app", ThreadsGraph({"thread_1_a": {"user_id": 1}}))
+
+    for thread_id in ("thread_1_a", "новый-тред"):
+        chat_request = chat_router.ChatRequest(query="вопрос", thread_id=thread_id)
+        response = await chat_router.stream_chat(chat_request, SimpleNamespace(is_disconnected=None), _user(1))
+        assert response.media_type == "text/event-stream"
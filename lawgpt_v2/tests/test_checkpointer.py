@@ -0,0 +1,119 @@
+# tests/test_checkpointer.py
+
+import pytest
+from langgraph.checkpoint.redis.aio import AsyncRedisSaver
+from redis.asyncio import Redis
+
+from src.graph.checkpointer import BLOB_REF, CompactAsyncRedisSaver
+
+
+class _Pipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def expire(self, key, seconds):
+        self.commands.append(lambda: int(key in self.redis.data))
+        return self
+
+    def exists(self, key):
+        return self.expire(key, None)
+
+    def set(self, key, value, ex=None):
+        def run():
+            self.redis.data[key] = value
+            return True
+        self.commands.append(run)
+        return self
+
+    async def execute(self):
+        return [command() for command in self.commands]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+    async def scan_iter(self, match, count=None):
+        prefix = match.rstrip("*")
+        for key in list(self.data):
+            if key.startswith(prefix):
+                yield key
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+
+@pytest.fixture
+def saver(monkeypatch):
+    saved = []
+
+    async def aput(self, config, checkpoint, metadata, new_versions, *args, **kwargs):
+        saved.append(checkpoint)
+        return config
+
+    async def adelete_thread(self, thread_id):
+        pass
+
+    monkeypatch.setattr(AsyncRedisSaver, "aput", aput)
+    monkeypatch.setattr(AsyncRedisSaver, "adelete_thread", adelete_thread)
+    saver = CompactAsyncRedisSaver(Redis.from_url("redis://localhost"), ttl_minutes=10, offload_min_bytes=16)
+    saver._redis = FakeRedis()
+    saver._ready = True
+    saver.saved = saved
+    return saver
+
+
+def _checkpoint(documents: list[str], version: int = 1) -> dict:
+    return {"channel_values": {"documents": documents}, "channel_versions": {"documents": version}}
+
+
+CONFIG = {"configurable": {"thread_id": "t1", "checkpoint_ns": ""}}
+
+
+async def test_cached_reference_rewrites_expired_blob(saver):
+    documents = ["длинный текст документа"] * 10
+    await saver.aput(CONFIG, _checkpoint(documents), {}, {})
+    digest = saver.saved[-1]["channel_values"]["documents"][BLOB_REF]
+    assert len(saver._redis.data) == 1
+
+    # Блоб истек, а ссылка по версии канала осталась в кэше
+    saver._redis.data.clear()
+    await saver.aput(CONFIG, _checkpoint(documents), {}, {})
+
+    assert saver.saved[-1]["channel_values"]["documents"] == {BLOB_REF: digest}
+    assert saver._blob_key("t1", digest) in saver._redis.data
+
+
+async def test_cached_reference_only_extends_existing_blob(saver):
+    documents = ["длинный текст документа"] * 10
+    await saver.aput(CONFIG, _checkpoint(documents), {}, {})
+    key, blob = next(iter(saver._redis.data.items()))
+
+    saver._redis.data[key] = b"marker"
+    await saver.aput(CONFIG, _checkpoint(documents), {}, {})
+
+    assert saver._redis.data[key] == b"marker"
+    assert blob != b"marker"
+
+
+async def test_delete_thread_forgets_cached_references(saver):
+    await saver.aput(CONFIG, _checkpoint(["длинный текст документа"] * 10), {}, {})
+    other = {"configurable": {"thread_id": "t2", "checkpoint_ns": ""}}
+    await saver.aput(other, _checkpoint(["другой текст документа"] * 10), {}, {})
+
+    await saver.adelete_thread("t1")
+
+    assert not any(key.startswith("t1:") for key in saver._refs._data)
+    assert any(key.startswith("t2:") for key in saver._refs._data)
+    assert all(not key.startswith("checkpoint_blob:t1:") for key in saver._redis.data)
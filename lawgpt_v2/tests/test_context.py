@@ -0,0 +1,30 @@
+# tests/test_context.py
+
+from langchain_core.documents import Document
+
+from src.graph.context import rank_facts
+
+
+def test_rank_facts_orders_by_source_and_skips_duplicates():
+    documents = [Document(page_content="ст. 333", metadata={"id": "a"}),
+                 Document(page_content="ст. 395", metadata={"id": "b"})]
+    facts = [
+        {"fact_summary": "Проценты по ст. 395", "source_document_id": " b "},
+        {"fact_summary": "Неустойку можно снизить", "source_document_id": "a"},
+        {"fact_summary": "неустойку  можно снизить", "source_document_id": "b"},
+    ]
+
+    assert [fact["fact_summary"] for fact in rank_facts(facts, documents)] == [
+        "Неустойку можно снизить", "Проценты по ст. 395",
+    ]
+
+
+def test_rank_facts_accepts_null_fields_from_llm():
+    documents = [Document(page_content="ст. 333", metadata={"id": "a"})]
+    facts = [
+        {"fact_summary": "Без источника", "source_document_id": None},
+        {"fact_summary": None, "source_document_id": "a"},
+        {"fact_summary": "Из документа", "source_document_id": "a"},
+    ]
+
+    assert [fact["fact_summary"] for fact in rank_facts(facts, documents)] == ["Из документа", "Без источника"]
@@ -0,0 +1,78 @@
+# tests/test_document_analysis.py
+
+import asyncio
+
+from src.agents.document_analysis import AnalysisResult, batch_documents
+from src.graph import nodes
+
+
+def test_batch_documents_repeats_header_in_continuation_pieces():
+    text = "[Документ 42]\n" + " ".join(f"слово{i}" for i in range(25))
+
+    batches = batch_documents([text], max_tokens=10)
+
+    assert len(batches) > 1
+    for batch in batches:
+        assert batch.startswith("[Документ 42]\n")
+        assert len(batch.split()) <= 10
+
+
+def test_batch_documents_keeps_small_documents_together():
+    texts = ["[Документ 1]\nпервый текст", "[Документ 2]\nвторой текст"]
+
+    assert batch_documents(texts, max_tokens=10) == ["\n\n".join(texts)]
+
+
+class _SlowChain:
+    def __init__(self):
+        self.started = 0
+        self.cancelled = 0
+        self.finished = 0
+
+    async def ainvoke(self, inputs):
+        self.started += 1
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        self.finished += 1
+        return AnalysisResult(facts=[])
+
+
+async def test_cancelling_document_analysis_cancels_batches(monkeypatch):
+    chain = _SlowChain()
+    monkeypatch.setattr(nodes, "analysis_chain", chain)
+    monkeypatch.setattr(nodes.settings, "ANALYSIS_BATCH_TOKENS", 8)
+    monkeypatch.setattr(nodes.settings, "ANALYSIS_MAX_CONCURRENCY", 10)
+    documents = [f"документ номер {i} с текстом" for i in range(3)]
+
+    node = asyncio.create_task(nodes.run_document_analysis({"retrieved_documents": documents}))
+    await asyncio.sleep(0.05)
+    node.cancel()
+    await asyncio.gather(node, return_exceptions=True)
+
+    assert chain.started > 1
+    assert chain.cancelled == chain.started
+    assert chain.finished == 0
+
+
+async def test_failed_batch_cancels_the_others(monkeypatch):
+    chain = _SlowChain()
+
+    async def ainvoke(inputs):
+        if chain.started == 2:
+            raise RuntimeError("ошибка модели")
+        return await _SlowChain.ainvoke(chain, inputs)
+
+    monkeypatch.setattr(chain, "ainvoke", ainvoke)
+    monkeypatch.setattr(nodes, "analysis_chain", chain)
+    monkeypatch.setattr(nodes.settings, "ANALYSIS_BATCH_TOKENS", 8)
+    monkeypatch.setattr(nodes.settings, "ANALYSIS_MAX_CONCURRENCY", 10)
+    documents = [f"документ номер {i} с текстом" for i in range(3)]
+
+    result = await asyncio.gather(nodes.run_document_analysis({"retrieved_documents": documents}),
+                                  return_exceptions=True)
+
+    assert isinstance(result[0], RuntimeError)
+    assert chain.cancelled == 2
@@ -0,0 +1,59 @@
+# tests/test_fts_plan.py
+#
+# План полнотекстовой ветки поиска на живом Postgres: ветка должна идти через
+# GIN-индекс idx_knowledge_base_tsv, а не перебирать строки арендатора.
+# Нужна отдельная тестовая БД с pgvector — ее таблицы пересоздаются:
+#
+#   BENCH_DATABASE_URL=postgresql+asyncpg://... python -m pytest tests/test_fts_plan.py
+
+import json
+import os
+
+import pytest
+from sqlalchemy import text
+
+DB_URL = os.environ.get("BENCH_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(not DB_URL, reason="нужна тестовая БД в BENCH_DATABASE_URL")
+
+OWNER_ID = 1
+TSV_INDEX = "idx_knowledge_base_tsv"
+# Слова нет в словаре синтетических текстов: совпадают только документы ниже
+RARE_QUERY = "эмфитевзис"
+
+
+def _plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+async def test_fts_branch_uses_gin_index():
+    from benchmarks.common import init_benchmark_db, reset_schema, seed_knowledge_base
+    from src.db.knowledge_base import KnowledgeBase
+    from src.graph.tools.kb_search import _document_params, _fts_branch
+
+    manager = init_benchmark_db(DB_URL)
+    try:
+        await reset_schema(manager)
+        await seed_knowledge_base(manager, {OWNER_ID: 20_000, OWNER_ID + 1: 5_000}, KnowledgeBase.embedding.type.dim)
+        async with manager.session() as session:
+            await session.execute(text("""
+                INSERT INTO knowledge_base (owner_id, source_type, content, metadata)
+                SELECT :owner_id, 'synthetic', 'договор эмфитевзиса земельного участка', '{}'::jsonb
+                FROM generate_series(1, 5)
+            """), {"owner_id": OWNER_ID})
+            await session.execute(text("ANALYZE knowledge_base"))
+            await session.commit()
+
+            params = {**_document_params(RARE_QUERY), "user_id": OWNER_ID, "limit": 10}
+            raw = (await session.execute(text(f"EXPLAIN (FORMAT JSON) {_fts_branch()}"), params)).scalar()
+        plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+    finally:
+        await manager.close()
+
+    nodes = list(_plan_nodes(plan))
+    assert any(node["Node Type"] == "Bitmap Index Scan" and node.get("Index Name") == TSV_INDEX
+               for node in nodes), nodes
+    assert not any(node["Node Type"] == "Seq Scan" and node.get("Relation Name") == "knowledge_base"
+                   for node in nodes), nodes
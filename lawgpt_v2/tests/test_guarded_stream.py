@@ -0,0 +1,164 @@
+# tests/test_guarded_stream.py
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.messages import AIMessageChunk
+
+from src.api import chat_router
+from src.api.streaming import ClientDisconnected, DeadlineExceeded, guarded_stream
+
+
+class SlowSource:
+    """Асинхронный генератор, который отдает items и зависает до отмены."""
+
+    def __init__(self, items=()):
+        self.items = list(items)
+        self.cancelled = False
+        self.closed = False
+
+    async def __call__(self):
+        try:
+            for item in self.items:
+                yield item
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        finally:
+            self.closed = True
+
+
+class Disconnect:
+    """is_disconnected, которое начинает возвращать True после after вызовов."""
+
+    def __init__(self, after: int):
+        self.after = after
+        self.calls = 0
+
+    async def __call__(self) -> bool:
+        self.calls += 1
+        return self.calls > self.after
+
+
+async def _never_disconnected() -> bool:
+    return False
+
+
+async def test_disconnect_cancels_the_producer():
+    source = SlowSource(["первое событие"])
+    received = []
+
+    with pytest.raises(ClientDisconnected):
+        async for item in guarded_stream(source(), Disconnect(after=1), timeout=10, poll_interval=0.01):
+            received.append(item)
+
+    assert received == ["первое событие"]
+    assert source.cancelled and source.closed
+
+
+async def test_deadline_cancels_the_producer():
+    source = SlowSource()
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    with pytest.raises(DeadlineExceeded):
+        async for _ in guarded_stream(source(), _never_disconnected, timeout=0.05, poll_interval=1):
+            pass
+
+    assert loop.time() - started < 0.5
+    assert source.cancelled and source.closed
+
+
+async def test_consumer_closing_the_stream_cancels_the_producer():
+    source = SlowSource(["событие"])
+    stream = guarded_stream(source(), _never_disconnected, timeout=10, poll_interval=1)
+
+    assert await anext(stream) == "событие"
+    await stream.aclose()
+
+    assert source.cancelled and source.closed
+
+
+async def test_producer_error_reaches_the_consumer():
+    async def failing():
+        yield "событие"
+        raise ValueError("ошибка графа")
+
+    with pytest.raises(ValueError, match="ошибка графа"):
+        async for _ in guarded_stream(failing(), _never_disconnected, timeout=10, poll_interval=1):
+            pass
+
+
+async def test_stream_ends_with_the_source():
+    async def finite():
+        for i in range(3):
+            await asyncio.sleep(0)
+            yield i
+
+    items = [item async for item in guarded_stream(finite(), _never_disconnected, timeout=10, poll_interval=1)]
+
+    assert items == [0, 1, 2]
+
+
+# --- SSE-события /chat/stream ---
+
+def _token(text: str) -> dict:
+    return {
+        "event": "on_chat_model_stream", "name": "ChatOpenAI", "run_id": "llm",
+        "metadata": {"langgraph_node": "ResponseFinalizerAgent"},
+        "data": {"chunk": AIMessageChunk(content=text)},
+    }
+
+
+class FakeGraph:
+    def __init__(self, source: SlowSource):
+        self.source = source
+
+    def astream_events(self, initial_state, config, version):
+        return self.source()
+
+    async def aget_state(self, config):
+        return SimpleNamespace(values={})
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    source = SlowSource([_token("Согласно"), _token(" статье 333")])
+    monkeypatch.setattr(chat_router, "graph_app", FakeGraph(source))
+    monkeypatch.setattr(chat_router.settings, "SSE_DISCONNECT_POLL_INTERVAL", 0.01)
+    return source
+
+
+async def _frames(stream) -> list[dict]:
+    frames = []
+    async for frame in stream:
+        assert frame.startswith("data: ") and frame.endswith("\n\n")
+        frames.append(json.loads(frame[len("data: "):]))
+    return frames
+
+
+async def test_deadline_sends_partial_answer(graph, monkeypatch):
+    monkeypatch.setattr(chat_router.settings, "CHAT_REQUEST_TIMEOUT", 0.1)
+
+    frames = await _frames(chat_router.event_stream_generator("t1", 1, "вопрос", use_cache=False))
+
+    assert [frame["type"] for frame in frames][-3:] == ["deadline_exceeded", "final_response", "stream_end"]
+    assert frames[-3]["timeout"] == 0.1
+    assert frames[-2] == {"type": "final_response", "content": "Согласно статье 333", "partial": True}
+    assert graph.cancelled
+
+
+async def test_disconnect_ends_stream_without_final_events(graph, monkeypatch):
+    monkeypatch.setattr(chat_router.settings, "CHAT_REQUEST_TIMEOUT", 10)
+
+    frames = await _frames(chat_router.event_stream_generator(
+        "t1", 1, "вопрос", use_cache=False, is_disconnected=Disconnect(after=1),
+    ))
+
+    types = [frame["type"] for frame in frames]
+    assert "stream_end" not in types and "final_response" not in types
+    assert types == ["llm_chunk"] * len(types)
+    assert graph.cancelled
@@ -0,0 +1,153 @@
+# tests/test_history.py
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, SystemMessage, ToolMessage
+
+from src.agents import history
+from src.agents.history import compact_history, history_messages, message_tokens, split_window
+
+
+def _ai_tool_call(id: str) -> AIMessage:
+    return AIMessage(content="", id=id, tool_calls=[
+        {"name": "legal_search", "args": {"query": "неустойка"}, "id": "call-1", "type": "tool_call"},
+    ])
+
+
+def _thread(turns: int, words: int = 10) -> list:
+    messages = []
+    for turn in range(turns):
+        messages.append(HumanMessage(content=" ".join(["вопрос"] * words), id=f"h{turn}"))
+        messages.append(AIMessage(content=" ".join(["ответ"] * words), id=f"a{turn}"))
+    return messages
+
+
+class FakeSummaryChain:
+    def __init__(self, content: str = "новое краткое содержание"):
+        self.content = content
+        self.calls = []
+
+    async def ainvoke(self, inputs: dict) -> AIMessage:
+        self.calls.append(inputs)
+        return AIMessage(content=self.content)
+
+
+@pytest.fixture
+def summary_chain(monkeypatch):
+    chain = FakeSummaryChain()
+    monkeypatch.setattr(history, "summary_chain", chain)
+    monkeypatch.setattr(history.settings, "HISTORY_WINDOW_TOKENS", 30)
+    monkeypatch.setattr(history.settings, "HISTORY_MAX_TOKENS", 60)
+    monkeypatch.setattr(history.settings, "HISTORY_SUMMARY_MAX_TOKENS", 50)
+    return chain
+
+
+def test_empty_history():
+    assert split_window([], 100) == ([], [])
+    assert history_messages({}) == []
+
+
+async def test_empty_history_is_not_compacted(summary_chain):
+    assert await compact_history([], None) == {}
+    assert summary_chain.calls == []
+
+
+def test_window_starts_with_user_question():
+    messages = _thread(3)
+
+    older, window = split_window(messages, 30)
+
+    assert isinstance(window[0], HumanMessage)
+    assert older + window == messages
+    assert sum(message_tokens(message) for message in window) <= 30
+
+
+def test_last_message_always_in_window():
+    messages = _thread(1, words=100)
+
+    older, window = split_window(messages, 10)
+
+    assert window == [messages[-1]]
+    assert older == messages[:-1]
+
+
+def test_tool_result_at_window_edge_keeps_its_tool_call():
+    question = HumanMessage(content="вопрос о неустойке", id="h1")
+    call = _ai_tool_call("a1")
+    result = ToolMessage(content="статья 333 ГК РФ", tool_call_id="call-1", id="t1")
+    messages = _thread(2) + [question, call, result]
+
+    # Бюджет вмещает только результат инструмента
+    older, window = split_window(messages, message_tokens(result))
+
+    assert window == [call, result]
+    assert older == messages[:-2]
+
+
+def test_several_tool_results_stay_with_their_call():
+    call = AIMessage(content="", id="a1", tool_calls=[
+        {"name": "legal_search", "args": {}, "id": "call-1", "type": "tool_call"},
+        {"name": "web_search", "args": {}, "id": "call-2", "type": "tool_call"},
+    ])
+    results = [ToolMessage(content="результат", tool_call_id=f"call-{i}", id=f"t{i}") for i in (1, 2)]
+    messages = _thread(2) + [HumanMessage(content="вопрос", id="h9"), call] + results
+
+    older, window = split_window(messages, message_tokens(results[-1]))
+
+    assert window == [call] + results
+
+
+def test_tool_call_arguments_are_counted():
+    call = _ai_tool_call("a1")
+
+    assert message_tokens(call) > message_tokens(AIMessage(content=""))
+
+
+def test_summary_is_prepended_to_window():
+    messages = _thread(1)
+
+    context = history_messages({"messages": messages, "history_summary": "Спор о поставке"})
+
+    assert isinstance(context[0], SystemMessage)
+    assert "Спор о поставке" in context[0].content
+    assert context[1:] == messages
+
+
+async def test_short_history_is_not_compacted(summary_chain):
+    assert await compact_history(_thread(2), None) == {}
+    assert summary_chain.calls == []
+
+
+async def test_compaction_removes_exactly_the_summarized_messages(summary_chain):
+    messages = _thread(6)
+    older, window = split_window(messages, 30)
+
+    update = await compact_history(messages, None)
+
+    assert all(isinstance(message, RemoveMessage) for message in update["messages"])
+    assert [message.id for message in update["messages"]] == [message.id for message in older]
+    assert not {message.id for message in window} & {message.id for message in update["messages"]}
+    assert update["history_summary"] == "новое краткое содержание"
+    assert summary_chain.calls[0]["summary"] == "(пока нет)"
+
+
+async def test_compaction_extends_existing_summary(summary_chain):
+    messages = _thread(6)
+
+    await compact_history(messages, "Спор о поставке, сумма 1 млн")
+
+    call = summary_chain.calls[0]
+    assert call["summary"] == "Спор о поставке, сумма 1 млн"
+    # В сворачивание идут только вытесненные сообщения (с ограничением длины), не окно
+    older, _ = split_window(messages, 30)
+    assert history.format_history(older).startswith(call["messages"].rstrip())
+
+
+async def test_compaction_keeps_tool_pair_together(summary_chain):
+    call, result = _ai_tool_call("a-call"), ToolMessage(content="статья 333", tool_call_id="call-1", id="t-call")
+    messages = _thread(6) + [HumanMessage(content="вопрос", id="h-last"), call, result]
+    summary_chain.content = "содержание"
+
+    update = await compact_history(messages, None)
+
+    removed = {message.id for message in update["messages"]}
+    assert "a-call" not in removed and "t-call" not in removed
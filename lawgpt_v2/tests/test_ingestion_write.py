@@ -0,0 +1,64 @@
+# tests/test_ingestion_write.py
+#
+# Запись окна загрузки на живом Postgres: две загрузки одного арендатора с
+# одинаковыми фрагментами не должны падать на уникальном индексе
+# (owner_id, content_hash). Нужна тестовая БД с pgvector в BENCH_DATABASE_URL.
+
+import asyncio
+import os
+
+import pytest
+from sqlalchemy import text
+
+DB_URL = os.environ.get("BENCH_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(not DB_URL, reason="нужна тестовая БД в BENCH_DATABASE_URL")
+
+OWNER_ID = 1
+COUNTS = {"chunks_total": 0, "chunks_duplicate": 0, "embeddings_reused": 0, "tokens_embedded": 0, "tokens_saved": 0}
+
+
+async def test_concurrent_windows_with_same_chunks_do_not_conflict():
+    from benchmarks.common import init_benchmark_db, reset_schema
+    from src.db.answer_cache import AnswerCache  # noqa: F401 — таблицы кэша ответов в metadata
+    from src.db.ingestion_job import IngestionJob
+    from src.ingestion import pipeline
+    from src.ingestion.chunking import Chunk
+    from src.ingestion.parsers import Page
+
+    manager = init_benchmark_db(DB_URL)
+    try:
+        await reset_schema(manager)
+        dim = pipeline.settings.EMBEDDING_DIMENSIONS
+        async with manager.session() as session:
+            await session.execute(
+                text("INSERT INTO users (id, username, email, hashed_password) "
+                     "VALUES (:id, 'u', 'u@example.com', 'x')"),
+                {"id": OWNER_ID},
+            )
+            jobs = [IngestionJob(id=f"job-{i}", owner_id=OWNER_ID, source_path=f"/tmp/file-{i}.pdf",
+                                 source_type="pdf", status="running", next_page=0, chunks_ingested=0)
+                    for i in range(2)]
+            session.add_all(jobs)
+            await session.commit()
+
+        chunks = [Chunk(page=0, index=i, text=f"общий фрагмент {i}") for i in range(3)]
+        vectors = [[0.1] * dim for _ in chunks]
+        window = [Page(number=0, text="")]
+        await asyncio.gather(*(
+            pipeline._write_window(job, window, chunks, vectors, {**COUNTS, "chunks_total": len(chunks)})
+            for job in jobs
+        ))
+
+        async with manager.session() as session:
+            rows = (await session.execute(
+                text("SELECT count(*) FROM knowledge_base WHERE owner_id = :owner_id"), {"owner_id": OWNER_ID},
+            )).scalar()
+            ingested = (await session.execute(text(
+                "SELECT sum(chunks_ingested), sum(chunks_duplicate), min(next_page) FROM ingestion_jobs"
+            ))).one()
+    finally:
+        await manager.close()
+
+    assert rows == len(chunks)
+    assert tuple(ingested) == (len(chunks), len(chunks), 1)
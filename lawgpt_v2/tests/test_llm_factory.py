@@ -0,0 +1,37 @@
+# tests/test_llm_factory.py
+
+import asyncio
+
+import httpx
+
+from src.agents.llm_factory import _ConcurrencyLimitedTransport
+
+
+def test_transport_works_in_every_event_loop():
+    created, in_flight, peak = [], 0, 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(200, json={"ok": True})
+
+    def make_transport() -> httpx.AsyncBaseTransport:
+        created.append(asyncio.get_running_loop())
+        return httpx.MockTransport(handler)
+
+    transport = _ConcurrencyLimitedTransport(make_transport, limit=1)
+
+    async def run():
+        client = httpx.AsyncClient(transport=transport)
+        responses = await asyncio.gather(*(client.post("http://llm/v1/chat/completions") for _ in range(3)))
+        return [response.status_code for response in responses]
+
+    # Как задачи Celery: каждый asyncio.run — новый event loop
+    assert asyncio.run(run()) == [200] * 3
+    assert asyncio.run(run()) == [200] * 3
+
+    assert len(created) == 2 and created[0] is not created[1]
+    assert peak == 1
@@ -0,0 +1,163 @@
+# tests/test_llm_scheduler.py
+
+import asyncio
+
+import pytest
+
+from src.agents.llm_scheduler import LLMScheduler, Priority, set_llm_request
+
+
+class FakeBudget:
+    """Корзина токенов в памяти вместо скриптов Redis; gate задерживает ответ «Redis»."""
+
+    def __init__(self, tokens: int):
+        self.tokens = tokens
+        self.gate: asyncio.Event | None = None
+        self.entered = asyncio.Event()
+
+    async def acquire(self, tokens: int) -> float:
+        if self.gate is not None:
+            gate, self.gate = self.gate, None
+            self.entered.set()
+            await gate.wait()
+        if tokens > self.tokens:
+            return 60.0
+        self.tokens -= tokens
+        return 0.0
+
+    async def refund(self, tokens: int):
+        self.tokens += tokens
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = LLMScheduler("test-model", rpm=100, tpm=10_000)
+    scheduler.budget = FakeBudget(0)
+    scheduler._try_acquire = scheduler.budget.acquire
+    scheduler._refund = scheduler.budget.refund
+    yield scheduler
+    if getattr(scheduler, "_dispatcher", None) is not None:
+        scheduler._dispatcher.cancel()
+
+
+def _request(scheduler: LLMScheduler, priority: Priority, user: int, tokens: int) -> asyncio.Task:
+    async def run():
+        set_llm_request(priority, user)
+        await scheduler.acquire(tokens)
+
+    return asyncio.create_task(run())
+
+
+async def _settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+async def test_head_change_during_acquire_refunds_the_debit(scheduler):
+    budget = scheduler.budget
+    background = _request(scheduler, Priority.BACKGROUND, 1, 100)
+    await _settle()
+    # Фоновый запрос в очереди; следующий ответ «Redis» задерживается
+    gate = budget.gate = asyncio.Event()
+    scheduler._wakeup.set()
+    await budget.entered.wait()
+
+    # Пока диспетчер ждет Redis для фонового запроса, вперед встает интерактивный,
+    # которому списанных 100 токенов мало
+    budget.tokens = 1000
+    interactive = _request(scheduler, Priority.INTERACTIVE, 2, 5000)
+    await _settle()
+    gate.set()
+    await _settle()
+
+    assert not interactive.done()
+    assert not background.done()
+    assert budget.tokens == 1000
+
+    interactive.cancel()
+    background.cancel()
+    await asyncio.gather(interactive, background, return_exceptions=True)
+
+
+async def test_head_cancelled_during_acquire_refunds_the_debit(scheduler):
+    budget = scheduler.budget
+    first = _request(scheduler, Priority.BACKGROUND, 1, 300)
+    await _settle()
+    gate = budget.gate = asyncio.Event()
+    scheduler._wakeup.set()
+    await budget.entered.wait()
+
+    budget.tokens = 1000
+    first.cancel()
+    await asyncio.gather(first, return_exceptions=True)
+    gate.set()
+    await _settle()
+
+    assert budget.tokens == 1000
+
+
+async def test_interactive_requests_are_admitted_first(scheduler):
+    budget = scheduler.budget
+    admitted = []
+
+    async def run(priority: Priority, user: int):
+        set_llm_request(priority, user)
+        await scheduler.acquire(100)
+        admitted.append(priority)
+
+    tasks = [asyncio.create_task(run(Priority.BACKGROUND, 1)),
+             asyncio.create_task(run(Priority.INTERACTIVE, 2))]
+    await _settle()
+    budget.tokens = 200
+    scheduler._wakeup.set()
+    await asyncio.wait_for(asyncio.gather(*tasks), 1)
+
+    assert admitted == [Priority.INTERACTIVE, Priority.BACKGROUND]
+
+
+async def test_cancel_right_after_admission_refunds_the_debit(scheduler):
+    budget = scheduler.budget
+    request = _request(scheduler, Priority.INTERACTIVE, 1, 100)
+    await _settle()
+
+    # Запрос отменяется в тот же момент, когда диспетчер его допускает
+    admit = scheduler._admit
+
+    def admit_and_cancel(waiter):
+        admit(waiter)
+        request.cancel()
+
+    scheduler._admit = admit_and_cancel
+    budget.tokens = 100
+    scheduler._wakeup.set()
+    await asyncio.gather(request, return_exceptions=True)
+    await _settle()
+
+    assert request.cancelled()
+    assert budget.tokens == 100
+
+
+async def test_dispatcher_failure_admits_the_queue_and_restarts(scheduler):
+    budget = scheduler.budget
+    first = _request(scheduler, Priority.INTERACTIVE, 1, 100)
+    await _settle()
+
+    async def broken(tokens: int) -> float:
+        raise RuntimeError("сбой диспетчера")
+
+    scheduler._try_acquire = broken
+    scheduler._wakeup.set()
+    await asyncio.wait_for(first, 1)
+
+    assert scheduler._dispatcher is None
+
+    # Следующий запрос в очередь запускает новый диспетчер
+    scheduler._try_acquire = budget.acquire
+    second = _request(scheduler, Priority.INTERACTIVE, 1, 100)
+    await _settle()
+    assert scheduler._dispatcher is not None and not second.done()
+    budget.tokens = 100
+    scheduler._wakeup.set()
+    await asyncio.wait_for(second, 1)
+
+    assert budget.tokens == 0
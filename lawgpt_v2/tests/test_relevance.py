@@ -0,0 +1,89 @@
+# tests/test_relevance.py
+
+import pytest
+from langchain_core.documents import Document
+
+from src.graph import relevance
+from src.graph.relevance import (
+    IRRELEVANT, RELEVANT, HybridRelevanceEvaluator, RelevanceVerdict, parse_llm_verdict,
+)
+
+
+@pytest.mark.parametrize("content, expected", [
+    ("Relevant", RELEVANT),
+    ("relevant.", RELEVANT),
+    ("Irrelevant", IRRELEVANT),
+    ("irrelevant", IRRELEVANT),
+    ("Not relevant", IRRELEVANT),
+    ("The documents are not relevant to the query", IRRELEVANT),
+    ("РЕЛЕВАНТНО", RELEVANT),
+    ("Документы релевантны запросу", RELEVANT),
+    ("нерелевантно", IRRELEVANT),
+    ("Не релевантно", IRRELEVANT),
+    ("", IRRELEVANT),
+])
+def test_parse_llm_verdict(content, expected):
+    assert parse_llm_verdict(content) == expected
+
+
+class FakeLLMEvaluator:
+    def __init__(self, label: str):
+        self.label = label
+        self.calls = 0
+
+    async def evaluate(self, query: str, documents: list) -> RelevanceVerdict:
+        self.calls += 1
+        return RelevanceVerdict(self.label, None, "llm")
+
+
+@pytest.fixture(autouse=True)
+def thresholds(monkeypatch):
+    for name, value in {
+        "RELEVANCE_TOP_N": 3,
+        "RELEVANCE_ACCEPT": 0.6,
+        "RELEVANCE_REJECT": 0.25,
+        "RELEVANCE_SIMILARITY_LOW": 0.2,
+        "RELEVANCE_SIMILARITY_HIGH": 0.5,
+    }.items():
+        monkeypatch.setattr(relevance.settings, name, value)
+
+
+def _documents(similarity: float, count: int = 3) -> list[Document]:
+    return [Document(page_content="текст", metadata={"vector_similarity": similarity}) for _ in range(count)]
+
+
+@pytest.mark.parametrize("similarity, label", [
+    (0.5, RELEVANT),  # оценка 1.0
+    (0.4, RELEVANT),  # 0.67 — выше порога принятия
+    (0.27, IRRELEVANT),  # 0.23 — ниже порога отказа
+    (0.1, IRRELEVANT),  # 0.0
+])
+async def test_hybrid_decides_locally_outside_borderline_band(similarity, label):
+    llm = FakeLLMEvaluator(RELEVANT if label == IRRELEVANT else IRRELEVANT)
+
+    verdict = await HybridRelevanceEvaluator(llm=llm).evaluate("вопрос", _documents(similarity))
+
+    assert verdict.label == label
+    assert verdict.source == "local"
+    assert llm.calls == 0
+
+
+@pytest.mark.parametrize("llm_label", [RELEVANT, IRRELEVANT])
+async def test_hybrid_asks_llm_inside_borderline_band(llm_label):
+    llm = FakeLLMEvaluator(llm_label)
+
+    verdict = await HybridRelevanceEvaluator(llm=llm).evaluate("вопрос", _documents(0.35))
+
+    assert llm.calls == 1
+    assert verdict.label == llm_label
+    assert verdict.source == "llm"
+    assert verdict.score == pytest.approx(0.5)
+
+
+async def test_hybrid_rejects_empty_retrieval_without_llm():
+    llm = FakeLLMEvaluator(RELEVANT)
+
+    verdict = await HybridRelevanceEvaluator(llm=llm).evaluate("вопрос", [])
+
+    assert verdict.label == IRRELEVANT
+    assert llm.calls == 0
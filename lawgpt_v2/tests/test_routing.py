@@ -0,0 +1,39 @@
+# tests/test_routing.py
+
+import pytest
+
+from src.graph.graph import workflow
+from src.graph.nodes import route_after_coordinator, route_after_retrieval_evaluation
+from src.graph.relevance import IRRELEVANT, RELEVANT
+
+
+@pytest.mark.parametrize("plan", [None, [], ["ResponseFinalizerAgent"], ["DocumentAnalysisAgent"]])
+def test_plan_without_retrieval_goes_to_finalizer(plan):
+    assert route_after_coordinator({"plan": plan}) == "ResponseFinalizerAgent"
+
+
+def test_retrieval_steps_run_in_parallel():
+    plan = ["LegalSearchAgent", "WebSearchAgent", "DocumentAnalysisAgent"]
+
+    assert route_after_coordinator({"plan": plan}) == ["LegalSearchAgent", "WebSearchAgent"]
+
+
+def test_coordinator_edges_cover_every_route():
+    ends = workflow.branches["coordinator"]["route_after_coordinator"].ends
+
+    assert ends["ResponseFinalizerAgent"] == "ResponseFinalizerAgent"
+    assert {"LegalSearchAgent", "WebSearchAgent"} <= set(ends)
+
+
+def test_irrelevant_retrieval_is_refined_twice_at_most():
+    state = {"retrieval_relevance": IRRELEVANT, "plan": ["LegalSearchAgent", "ResponseFinalizerAgent"]}
+
+    assert route_after_retrieval_evaluation({**state, "retrieval_attempts": 1}) == "refine"
+    assert route_after_retrieval_evaluation({**state, "retrieval_attempts": 2}) == "ResponseFinalizerAgent"
+
+
+def test_relevant_retrieval_goes_to_next_plan_step():
+    state = {"retrieval_relevance": RELEVANT, "retrieval_attempts": 0,
+             "plan": ["LegalSearchAgent", "DocumentAnalysisAgent", "ResponseFinalizerAgent"]}
+
+    assert route_after_retrieval_evaluation(state) == "DocumentAnalysisAgent"
@@ -0,0 +1,252 @@
+# tests/test_single_flight.py
+
+import asyncio
+
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from src.core import single_flight
+from src.core.single_flight import SingleFlight, normalize_query
+
+
+class Call:
+    """Вызов, который ждет release и считает запуски и отмены."""
+
+    def __init__(self, result="результат"):
+        self.result = result
+        self.release = asyncio.Event()
+        self.started = 0
+        self.cancelled = 0
+
+    async def __call__(self):
+        self.started += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return self.result
+
+
+@pytest.fixture(autouse=True)
+def in_process(monkeypatch):
+    monkeypatch.setattr(single_flight.settings, "SINGLE_FLIGHT_ENABLED", True)
+    monkeypatch.setattr(single_flight.settings, "SINGLE_FLIGHT_REDIS_ENABLED", False)
+
+
+def test_normalize_query():
+    assert normalize_query("  Неустойка   ПО договору ") == "неустойка по договору"
+
+
+async def test_concurrent_calls_share_one_run():
+    flights, call = SingleFlight("test"), Call()
+
+    waiters = [asyncio.create_task(flights.do("key", call)) for _ in range(3)]
+    await asyncio.sleep(0)
+    call.release.set()
+
+    assert await asyncio.gather(*waiters) == ["результат"] * 3
+    assert call.started == 1
+    assert flights._flights == {}
+
+
+async def test_different_keys_run_separately():
+    flights, first, second = SingleFlight("test"), Call("первый"), Call("второй")
+    first.release.set()
+    second.release.set()
+
+    assert await asyncio.gather(flights.do("a", first), flights.do("b", second)) == ["первый", "второй"]
+
+
+async def test_error_reaches_every_waiter_and_is_not_cached():
+    flights = SingleFlight("test")
+    release = asyncio.Event()
+
+    async def failing():
+        await release.wait()
+        raise ValueError("ошибка поиска")
+
+    waiters = [asyncio.create_task(flights.do("key", failing)) for _ in range(2)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in results)
+    call = Call()
+    call.release.set()
+    assert await flights.do("key", call) == "результат"
+
+
+async def test_cancelled_caller_does_not_cancel_shared_run():
+    flights, call = SingleFlight("test"), Call()
+    first = asyncio.create_task(flights.do("key", call))
+    second = asyncio.create_task(flights.do("key", call))
+    await asyncio.sleep(0)
+
+    # Клиент, начавший запрос, отключился
+    first.cancel()
+    await asyncio.gather(first, return_exceptions=True)
+    call.release.set()
+
+    assert await second == "результат"
+    assert call.started == 1 and call.cancelled == 0
+
+
+async def test_run_is_cancelled_when_every_caller_leaves():
+    flights, call = SingleFlight("test"), Call()
+    waiters = [asyncio.create_task(flights.do("key", call)) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    for waiter in waiters:
+        waiter.cancel()
+    await asyncio.gather(*waiters, return_exceptions=True)
+    await asyncio.sleep(0)
+
+    assert call.cancelled == 1
+    assert flights._flights == {}
+
+
+async def test_disabled_runs_every_call(monkeypatch):
+    monkeypatch.setattr(single_flight.settings, "SINGLE_FLIGHT_ENABLED", False)
+    flights, call = SingleFlight("test"), Call()
+    call.release.set()
+
+    await asyncio.gather(flights.do("key", call), flights.do("key", call))
+
+    assert call.started == 2
+
+
+# --- Между воркерами через Redis ---
+
+class _Pipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.keys = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def get(self, key):
+        self.keys.append(key)
+        return self
+
+    async def execute(self):
+        self.redis.check()
+        return [self.redis.data.get(key) for key in self.keys]
+
+
+class FakeRedis:
+    """Строки Redis в памяти: SET NX, GET, конвейер и скрипт снятия блокировки."""
+
+    def __init__(self):
+        self.data = {}
+        self.fail = False
+
+    def check(self):
+        if self.fail:
+            raise RedisConnectionError("Redis недоступен")
+
+    async def set(self, key, value, nx=False, px=None):
+        self.check()
+        if nx and key in self.data:
+            return None
+        self.data[key] = value.encode() if isinstance(value, str) else value
+        return True
+
+    async def get(self, key):
+        self.check()
+        return self.data.get(key)
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+    def register_script(self, script):
+        async def release(keys, args):
+            if self.data.get(keys[0]) == args[0].encode():
+                del self.data[keys[0]]
+                return 1
+            return 0
+
+        release.registered_client = self
+        return release
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(single_flight, "get_redis", lambda: redis)
+    monkeypatch.setattr(single_flight.settings, "SINGLE_FLIGHT_REDIS_ENABLED", True)
+    monkeypatch.setattr(single_flight.settings, "SINGLE_FLIGHT_LOCK_TTL", 0.2)
+    monkeypatch.setattr(single_flight.settings, "SINGLE_FLIGHT_POLL_INTERVAL", 0.01)
+    return redis
+
+
+async def test_leader_publishes_result_and_releases_lock(redis):
+    flights, call = SingleFlight("test"), Call({"documents": ["ст. 333 ГК РФ"]})
+    call.release.set()
+
+    assert await flights.do("key", call) == {"documents": ["ст. 333 ГК РФ"]}
+
+    lock_key = flights._lock_key("key")
+    assert lock_key not in redis.data
+    assert [key for key in redis.data if key.startswith(f"{lock_key}:")]
+
+
+async def test_follower_takes_result_from_other_worker(redis):
+    leader, follower = SingleFlight("test"), SingleFlight("test")
+    leader_call, follower_call = Call({"documents": ["ст. 333 ГК РФ"]}), Call()
+    # Ведущий — в «другом воркере»: свой экземпляр SingleFlight
+    leading = asyncio.create_task(leader.do("key", leader_call))
+    await asyncio.sleep(0)
+    following = asyncio.create_task(follower.do("key", follower_call))
+    await asyncio.sleep(0.03)
+    leader_call.release.set()
+
+    assert await leading == await following == {"documents": ["ст. 333 ГК РФ"]}
+    assert follower_call.started == 0
+
+
+async def test_follower_runs_itself_when_handoff_times_out(redis):
+    flights, call = SingleFlight("test"), Call("свой результат")
+    # Ведущий из другого воркера завис: блокировка есть, результата нет
+    redis.data[flights._lock_key("key")] = b"stuck-flight"
+    call.release.set()
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    assert await flights.do("key", call) == "свой результат"
+    assert call.started == 1
+    assert 0.2 <= loop.time() - started < 1
+
+
+async def test_follower_runs_itself_when_leader_fails(redis):
+    leader, follower = SingleFlight("test"), SingleFlight("test")
+    release = asyncio.Event()
+
+    async def failing():
+        await release.wait()
+        raise ValueError("ошибка поиска")
+
+    leading = asyncio.create_task(leader.do("key", failing))
+    await asyncio.sleep(0)
+    call = Call("свой результат")
+    call.release.set()
+    following = asyncio.create_task(follower.do("key", call))
+    await asyncio.sleep(0.03)
+    release.set()
+
+    with pytest.raises(ValueError):
+        await leading
+    assert await following == "свой результат"
+
+
+async def test_redis_failure_falls_back_to_local_call(redis):
+    redis.fail = True
+    flights, call = SingleFlight("test"), Call()
+    call.release.set()
+
+    assert await flights.do("key", call) == "результат"
+    assert call.started == 1
@@ -0,0 +1,112 @@
+# tests/test_streaming.py
+
+import asyncio
+
+import pytest
+
+from src.api import streaming
+from src.api.streaming import IDLE, ChunkCoalescer, guarded_stream
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(streaming, "time", clock)
+    return clock
+
+
+def _contents(events: list[dict]) -> list[str]:
+    return [event["content"] for event in events]
+
+
+def test_first_token_of_each_node_is_sent_at_once(clock):
+    chunks = ChunkCoalescer(max_chars=100, max_delay=1.0)
+
+    assert _contents(chunks.add("ResponseFinalizerAgent", "Согласно")) == ["Согласно"]
+    assert _contents(chunks.add("CaseLawSynthesisAgent", "Суд")) == ["Суд"]
+    assert chunks.add("ResponseFinalizerAgent", " статье") == []
+
+
+def test_batch_is_sent_when_size_limit_is_reached(clock):
+    chunks = ChunkCoalescer(max_chars=10, max_delay=60.0)
+    chunks.add("node", "Первый")
+
+    assert chunks.add("node", " токен") == []
+    assert _contents(chunks.add("node", " ответа")) == [" токен ответа"]
+    assert chunks.flush_in() is None
+
+
+def test_batch_is_sent_on_next_token_after_delay(clock):
+    chunks = ChunkCoalescer(max_chars=100, max_delay=0.5)
+    chunks.add("node", "Первый")
+    chunks.add("node", " токен")
+
+    clock.now += 0.5
+
+    assert _contents(chunks.add("node", " ответа")) == [" токен ответа"]
+
+
+def test_delay_is_checked_without_new_tokens(clock):
+    chunks = ChunkCoalescer(max_chars=100, max_delay=0.5)
+    chunks.add("first", "Первый")
+    chunks.add("first", " токен")
+    clock.now += 0.3
+    chunks.add("second", "Другой")
+    chunks.add("second", " узел")
+
+    assert chunks.flush_in() == pytest.approx(0.2)
+    assert chunks.flush_due() == []
+
+    clock.now += 0.2
+
+    assert chunks.flush_in() == 0
+    assert _contents(chunks.flush_due()) == [" токен"]
+    assert chunks.flush_in() == pytest.approx(0.3)
+
+
+def test_flush_sends_every_buffer(clock):
+    chunks = ChunkCoalescer(max_chars=100, max_delay=60.0)
+    for node in ("first", "second"):
+        chunks.add(node, "Начало")
+        chunks.add(node, " ответа")
+
+    assert [(event["node"], event["content"]) for event in chunks.flush()] == [
+        ("first", " ответа"), ("second", " ответа"),
+    ]
+    assert chunks.flush() == []
+    assert chunks.streamed("first") == "Начало ответа"
+
+
+async def _never_disconnected() -> bool:
+    return False
+
+
+async def test_guarded_stream_wakes_consumer_when_model_stalls():
+    chunks = ChunkCoalescer(max_chars=1000, max_delay=0.05)
+    resume = asyncio.Event()
+
+    async def tokens():
+        yield "Первый"
+        yield " токен"
+        # Модель думает дольше срока пачки
+        await resume.wait()
+        yield " ответа"
+
+    sent = []
+    async for item in guarded_stream(tokens(), _never_disconnected, 5, 1, wake_in=chunks.flush_in):
+        if item is IDLE:
+            sent.extend(_contents(chunks.flush_due()))
+            resume.set()
+            continue
+        sent.extend(_contents(chunks.add("node", item)))
+    sent.extend(_contents(chunks.flush()))
+
+    assert sent == ["Первый", " токен", " ответа"]